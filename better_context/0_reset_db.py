@@ -1,7 +1,18 @@
+import os
 import weaviate
 
+from docs_index import CHUNKS_COLLECTION, chunks_versions
+from manifest import MANIFEST_PATH
+
 client = weaviate.connect_to_local()
 
-client.collections.delete("Chunks")
+# Chunks is an alias over versioned collections (Chunks_v1, ...), or a plain collection if created before aliases
+if client.alias.get(alias_name=CHUNKS_COLLECTION) is not None:
+    client.alias.delete(alias_name=CHUNKS_COLLECTION)
+client.collections.delete([CHUNKS_COLLECTION, *chunks_versions(client), "IndexGeneration"])
 
 client.close()
+
+# The incremental index manifest describes the collection we just deleted
+if os.path.exists(MANIFEST_PATH):
+    os.remove(MANIFEST_PATH)
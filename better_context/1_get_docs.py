@@ -1,23 +1,18 @@
+import argparse
 import asyncio
-from crawl4ai import AsyncWebCrawler, CrawlerRunConfig, BFSDeepCrawlStrategy, LXMLWebScrapingStrategy, URLPatternFilter, DomainFilter, FilterChain, CacheMode
+from crawl4ai import AsyncWebCrawler
 import json
 
-async def main():
+from corpus import CRAWL_JSON_PATH, CRAWL_JSONL_PATH, CRAWL_SHARDED_PATH, open_sink
+from crawl_checkpoint import CHECKPOINT_PATH, checkpointed_crawl
+from crawling import MAX_DEPTH, START_URL, make_crawl_config, stream_pages
+
+
+async def crawl_to_json(start_url: str = START_URL, max_depth: int = MAX_DEPTH):
     results_md = {}
 
-    domain_filter = DomainFilter(allowed_domains=["docs.weaviate.io"])
-    config = CrawlerRunConfig(
-            deep_crawl_strategy=BFSDeepCrawlStrategy(
-                max_depth=4,
-                include_external=False,
-                filter_chain=FilterChain([domain_filter]),
-            ),
-            scraping_strategy=LXMLWebScrapingStrategy(),
-            verbose=True,
-            cache_mode=CacheMode.ENABLED
-        )
     async with AsyncWebCrawler() as crawler:
-        results = await crawler.arun("https://docs.weaviate.io/weaviate", config=config)
+        results = await crawler.arun(start_url, config=make_crawl_config(max_depth=max_depth))
 
         print(f"Crawled {len(results)} pages in total")
 
@@ -25,8 +20,68 @@ async def main():
         for result in results:
             results_md[result.url] = result.markdown
 
-    with open("./output/weaviate_docs_crawl4ai.json", "w") as f:
+    with open(CRAWL_JSON_PATH, "w") as f:
         json.dump(results_md, f)
 
+
+async def crawl_to_sink(path: str, start_url: str = START_URL, max_depth: int = MAX_DEPTH):
+    # Pages are written as they arrive, so memory stays flat and a partial crawl is still usable
+    failed = set()
+    with open_sink(path) as sink:
+        async for url, markdown in stream_pages(start_url, max_depth, failed):
+            sink.write(url, markdown)
+
+        print(f"Crawled {sink.count} pages in total" + (f", {len(failed)} failed" if failed else ""))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Crawl the Weaviate docs to markdown")
+    parser.add_argument(
+        "--format",
+        choices=["json", "jsonl", "sharded"],
+        default="json",
+        help=(
+            f"json: one file at the end ({CRAWL_JSON_PATH}). "
+            f"jsonl: streamed, one line per page ({CRAWL_JSONL_PATH}). "
+            f"sharded: streamed into memory-mappable shards with an offset index ({CRAWL_SHARDED_PATH})"
+        ),
+    )
+    parser.add_argument(
+        "--checkpoint",
+        action="store_true",
+        help="Run our own BFS with the frontier checkpointed to --checkpoint-path (jsonl/sharded only)",
+    )
+    parser.add_argument("--resume", action="store_true", help="Continue a checkpointed crawl (implies --checkpoint)")
+    parser.add_argument("--checkpoint-path", default=CHECKPOINT_PATH)
+    parser.add_argument("--start-url", default=START_URL)
+    parser.add_argument("--max-depth", type=int, default=MAX_DEPTH)
+    parser.add_argument("--concurrency", type=int, default=8, help="Pages crawled at once (checkpointed crawl)")
+    parser.add_argument(
+        "--delay",
+        default="0.5,1.5",
+        help="Per-host delay range in seconds between requests, e.g. 0.5,1.5 (checkpointed crawl)",
+    )
+    args = parser.parse_args()
+
+    if args.checkpoint or args.resume:
+        if args.format == "json":
+            parser.error("--checkpoint needs --format jsonl or sharded, which are written as pages arrive")
+        low, high = (float(v) for v in args.delay.split(","))
+        await checkpointed_crawl(
+            args.start_url,
+            CRAWL_JSONL_PATH if args.format == "jsonl" else CRAWL_SHARDED_PATH,
+            checkpoint_path=args.checkpoint_path,
+            resume=args.resume,
+            max_depth=args.max_depth,
+            concurrency=args.concurrency,
+            delay=(low, high),
+        )
+    elif args.format == "jsonl":
+        await crawl_to_sink(CRAWL_JSONL_PATH, args.start_url, args.max_depth)
+    elif args.format == "sharded":
+        await crawl_to_sink(CRAWL_SHARDED_PATH, args.start_url, args.max_depth)
+    else:
+        await crawl_to_json(args.start_url, args.max_depth)
+
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,62 +1,229 @@
 import weaviate
-from weaviate.classes.config import Configure, Property, DataType, Tokenization
-from weaviate.util import generate_uuid5
+import argparse
 import json
-from chonkie import NeuralChunker, TokenChunker
 import os
 from tqdm import tqdm
 
+from adaptive_batch import FAILURE_REPORT_PATH, AdaptiveIngestor, clear_failure_report, replay_failures
+from chunking import ParallelChunker
+from corpus import CRAWL_JSON_PATH, iter_pages
+from dedupe import BoilerplateStripper, ChunkDeduplicator, dedupe_summary, write_alt_paths
+from docs_index import (
+    CHUNKS_COLLECTION,
+    DOCS_PATH_FILTER,
+    ChunkIndexer,
+    bump_generation,
+    ensure_alt_paths_property,
+    ensure_chunks_collection,
+    vectorized_text,
+)
+from embedding_cache import EmbeddingCache, make_embedder
+from index_profiles import DEFAULT_PROFILE, IndexProfile, profile_names
+from manifest import IndexManifest, content_hash
+import tracing
 
-# chunker = NeuralChunker(
-#     model="mirth/chonky_modernbert_base_1",  # Default model
-#     device_map="cpu",                        # Device to run the model on ('cpu', 'cuda', etc.)
-#     min_characters_per_chunk=10,             # Minimum characters for a chunk
-# )
 
+def make_writer(chunks, mode: str):
+    if mode == "adaptive":
+        clear_failure_report()
+        return AdaptiveIngestor(chunks)
+    return chunks.batch.fixed_size(batch_size=50)
 
-chunker = TokenChunker(
-    tokenizer="word", # Default tokenizer (or use "gpt2", etc.)
-    chunk_size=512, # Maximum tokens per chunk
-    chunk_overlap=128 # Overlap between chunks
-)
 
+def resume_failed(client, chunks, manifest: IndexManifest):
+    if not os.path.exists(FAILURE_REPORT_PATH):
+        print("No failure report to replay")
+        return
+
+    # Move the report aside so objects that fail again land in a fresh one
+    replaying_path = f"{FAILURE_REPORT_PATH}.replaying"
+    os.replace(FAILURE_REPORT_PATH, replaying_path)
+
+    replayed = []
+    stale = 0
+    with AdaptiveIngestor(chunks) as writer:
+        for obj in replay_failures(replaying_path):
+            properties = obj["properties"]
+            # Skip chunks a later run has rewritten, trimmed or deleted since they failed
+            if not manifest.is_failed(properties["path"], properties["chunk_no"], content_hash(properties["chunk"])):
+                stale += 1
+                continue
+            writer.add_object(**obj)
+            replayed.append((properties["path"], properties["chunk_no"]))
+
+    failed_again = {(f.object_.properties["path"], f.object_.properties["chunk_no"]) for f in writer.failed_objects}
+    for path, chunk_no in replayed:
+        if (path, chunk_no) not in failed_again:
+            manifest.clear_failed(path, chunk_no)
+    manifest.save()
+
+    os.remove(replaying_path)
+    print(f"Replayed {writer.written} objects, {len(writer.failed_objects)} still failing, skipped {stale} superseded since")
+    if writer.written:
+        bump_generation(client)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk crawled docs and index them into Weaviate")
+    parser.add_argument("--input", default=CRAWL_JSON_PATH, help="Crawl dump (.json, .jsonl or a sharded corpus directory)")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Skip pages and chunks whose content hash is unchanged since the last run",
+    )
+    parser.add_argument("--chunker", choices=["token", "neural"], default="token")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Chunking processes (0 = one per core). Worth raising for --chunker neural",
+    )
+    parser.add_argument("--chunk-batch-size", type=int, default=16, help="Pages sent to a chunking worker at a time")
+    parser.add_argument(
+        "--embedding-cache",
+        help="Directory of a local embedding cache. Chunks are embedded here and inserted with their vectors",
+    )
+    parser.add_argument(
+        "--embedder",
+        choices=["cohere", "hash"],
+        default="cohere",
+        help="Embedder behind --embedding-cache. 'hash' is a deterministic offline stand-in for testing only",
+    )
+    parser.add_argument(
+        "--ingest",
+        choices=["fixed", "adaptive"],
+        default="fixed",
+        help="'adaptive' sizes batches and concurrency from latency and 429s, retries failures and reports throughput",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help=f"Only replay objects from the failure report ({FAILURE_REPORT_PATH}) left by an adaptive run",
+    )
+    parser.add_argument(
+        "--changes",
+        help="Changes file from recrawl.py: index only its changed/added pages and delete its removed ones",
+    )
+    parser.add_argument(
+        "--dedupe",
+        action="store_true",
+        help="Strip boilerplate blocks repeated across pages and index near-duplicate chunks once, with alt_paths",
+    )
+    parser.add_argument("--dedupe-threshold", type=float, default=0.85, help="Estimated Jaccard similarity for near-duplicate chunks")
+    parser.add_argument(
+        "--boilerplate-fraction",
+        type=float,
+        default=0.2,
+        help="Blocks found on at least this fraction of pages are stripped as boilerplate",
+    )
+    parser.add_argument(
+        "--profile",
+        default=DEFAULT_PROFILE,
+        help=f"Vector index profile when the collection is created ({', '.join(profile_names())}). "
+        "Use migrate_index.py to change an existing one",
+    )
+    parser.add_argument("--rescore-limit", type=int, help="Candidates rescored with full vectors (bq, sq and rq profiles)")
+    args = parser.parse_args()
+    try:
+        profile = IndexProfile.parse(args.profile, args.rescore_limit)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.dedupe and (args.incremental or args.changes):
+        # Duplicates are found against the chunks written in the same run, so it must see every page
+        parser.error("--dedupe rebuilds the whole index; it can't be combined with --incremental or --changes")
+
+    chunker = ParallelChunker(kind=args.chunker, workers=args.workers, batch_size=args.chunk_batch_size)
+
+    client = weaviate.connect_to_local(
+        headers={
+            "X-Cohere-Api-Key": os.getenv("COHERE_API_KEY")
+        },
+    )
+
+    manifest = IndexManifest()
+    if ensure_chunks_collection(client, profile):
+        # A fresh collection holds nothing the manifest describes
+        manifest.clear()
+
+    chunks = client.collections.use(CHUNKS_COLLECTION)
+
+    if args.resume:
+        resume_failed(client, chunks, manifest)
+        client.close()
+        return
+
+    changes = None
+    if args.changes:
+        with open(args.changes, "r") as f:
+            changes = json.load(f)
+        wanted = set(changes["changed"]) | set(changes["added"])
+        print(f"Applying {args.changes}: {len(wanted)} changed/added, {len(changes['removed'])} removed pages")
+
+    # Chunks of a changed page are still compared with the manifest, so only edited chunks are re-sent
+    indexer = ChunkIndexer(chunks, manifest, incremental=args.incremental or changes is not None)
+
+    # Filter and skip unchanged pages before they are shipped to a chunking worker.
+    # With a sharded corpus the URL filter runs on the index, so other pages are never read.
+    pages = (
+        (path, text) for path, text in iter_pages(args.input, url_filter=DOCS_PATH_FILTER)
+        if (changes is None or path in wanted) and not indexer.is_unchanged(path, text)
+    )
+
+    stripper = deduplicator = None
+    if args.dedupe:
+        ensure_alt_paths_property(client)
+        stripper = BoilerplateStripper(min_fraction=args.boilerplate_fraction)
+        with tracing.span("dedupe.boilerplate"):
+            # First pass over the corpus: which blocks repeat across pages
+            stripper.fit(iter_pages(args.input, url_filter=DOCS_PATH_FILTER))
+        deduplicator = ChunkDeduplicator(threshold=args.dedupe_threshold)
+        pages = stripper.strip_pages(pages)
+
+    embedding_cache = None
+    if args.embedding_cache:
+        embedding_cache = EmbeddingCache(args.embedding_cache, make_embedder(args.embedder))
+
+    with tracing.span("index.write", ingest=args.ingest) as attrs, make_writer(chunks, args.ingest) as batch:
+        attrs["pages"] = attrs["objects"] = 0
+        for path, text, chunk_texts in tqdm(chunker.chunk_pages(pages)):
+            objects = indexer.objects_for_page(path, text, chunk_texts)
+            if deduplicator:
+                objects, duplicates = deduplicator.filter(objects)
+                indexer.skip_chunks(path, [obj["properties"]["chunk_no"] for obj in duplicates])
+            if embedding_cache and objects:
+                # Bring our own vectors, so Weaviate skips the Cohere call for these objects
+                vectors = embedding_cache.embed([vectorized_text(obj["properties"]) for obj in objects])
+                for obj, vector in zip(objects, vectors):
+                    obj["vector"] = vector
+            for obj in objects:
+                batch.add_object(**obj)
+            attrs["pages"] += 1
+            attrs["objects"] += len(objects)
+
+    if embedding_cache:
+        print(f"Embedding cache: {embedding_cache.stats()}")
+        embedding_cache.close()
+
+    if deduplicator:
+        write_alt_paths(chunks, deduplicator)
+        print(dedupe_summary(stripper, deduplicator))
+
+    failed_objects = batch.failed_objects if args.ingest == "adaptive" else chunks.batch.failed_objects
+    if changes is not None:
+        # Only part of the corpus was read, so pages not seen this run are not missing
+        indexer.remove_pages(path for path in changes["removed"] if manifest.page(path))
+        changed = indexer.finish(failed_objects, remove_missing=False)
+    else:
+        changed = indexer.finish(failed_objects)
+    tracing.count("index.failed_objects", len(failed_objects))
+    print(indexer.summary())
+
+    if changed:
+        # Tell running MCP servers to drop cached search results
+        bump_generation(client)
+
+    client.close()
 
-client = weaviate.connect_to_local(
-    headers={
-        "X-Cohere-Api-Key": os.getenv("COHERE_API_KEY")
-    },
-)
 
-if not client.collections.exists("Chunks"):
-    client.collections.create(
-        name="Chunks",
-        properties=[
-            Property(name="chunk", data_type=DataType.TEXT),
-            Property(name="chunk_no", data_type=DataType.INT),
-            Property(name="path", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
-        ],
-        vector_config=Configure.Vectors.text2vec_cohere(
-            model="embed-v4.0",
-            source_properties=["chunk", "path"]
-        )
-    )
-
-chunks = client.collections.use("Chunks")
-
-with open("./output/weaviate_docs_crawl4ai.json", "r") as f:
-    data = json.load(f)
-
-with chunks.batch.fixed_size(batch_size=50) as batch:
-    for path, text in tqdm(data.items()):
-        if "docs.weaviate.io/weaviate" in path:
-            for i, chunk in enumerate(chunker.chunk(text)):
-                batch.add_object(
-                    properties={
-                        "chunk": chunk.text,
-                        "chunk_no": i,
-                        "path": path
-                    },
-                    uuid=generate_uuid5("Chunks", f"{path}-{i}")
-                )
-
-client.close()
+if __name__ == "__main__":
+    main()
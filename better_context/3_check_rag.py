@@ -1,31 +1,121 @@
+import argparse
 import os
+import time
 import weaviate
 from weaviate.classes.generate import GenerativeConfig
+from weaviate.classes.query import Filter
 
+from answer_cache import ANSWER_CACHE_PATH, AnswerCache
+from docs_index import CHUNKS_COLLECTION
+from embedding_cache import make_embedder
+from manifest import content_hash
+import tracing
 
-client = weaviate.connect_to_local(
-    headers={
-        "X-Cohere-Api-Key": os.getenv("COHERE_API_KEY"),
-        "X-Anthropic-Api-Key": os.getenv("ANTHROPIC_API_KEY"),
-    },
-)
 
-chunks = client.collections.use("Chunks")
+DEFAULT_QUESTION = "How do I use collection aliases in Weaviate? Can you show me a Python example?"
+DEFAULT_QUERY = "collection aliases in Weaviate Python"
+TASK_TEMPLATE = "{question} Cite the source URLs please."
 
-rag_config = GenerativeConfig.anthropic(
-    model="claude-3-5-haiku-latest"
-)
 
-response = chunks.generate.hybrid(
-    query="collection aliases in Weaviate Python",
-    limit=5,
-    grouped_task="How do I use collection aliases in Weaviate? Can you show me a Python example? Cite the source URLs please.",
-    generative_provider=rag_config
-)
+def main():
+    parser = argparse.ArgumentParser(description="Answer a question from the Chunks collection with RAG")
+    parser.add_argument("question", nargs="?", default=DEFAULT_QUESTION)
+    parser.add_argument("--query", help="Search query (default: the question, or the built-in example's query)")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--answer-cache", action="store_true", help="Reuse answers to similar questions whose sources are unchanged")
+    parser.add_argument("--cache-path", default=ANSWER_CACHE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.9, help="Cosine similarity between questions for a cache hit")
+    parser.add_argument("--min-overlap", type=float, default=0.6, help="Jaccard overlap of retrieved and cached chunks for a hit")
+    parser.add_argument("--ttl-hours", type=float, default=24 * 7)
+    parser.add_argument("--max-entries", type=int, default=1000)
+    parser.add_argument("--embedder", choices=["cohere", "hash"], default="cohere", help="Question embedder for the cache")
+    args = parser.parse_args()
 
-print(response.generative.text)
+    query = args.query or (DEFAULT_QUERY if args.question == DEFAULT_QUESTION else args.question)
+    task = TASK_TEMPLATE.format(question=args.question)
 
-for o in response.objects:
-    print(o.properties["path"])
+    client = weaviate.connect_to_local(
+        headers={
+            "X-Cohere-Api-Key": os.getenv("COHERE_API_KEY"),
+            "X-Anthropic-Api-Key": os.getenv("ANTHROPIC_API_KEY"),
+        },
+    )
 
-client.close()
+    chunks = client.collections.use(CHUNKS_COLLECTION)
+
+    rag_config = GenerativeConfig.anthropic(
+        model="claude-3-5-haiku-latest"
+    )
+
+    if not args.answer_cache:
+        with tracing.span("query.generate", limit=args.limit):
+            response = chunks.generate.hybrid(
+                query=query,
+                limit=args.limit,
+                grouped_task=task,
+                generative_provider=rag_config
+            )
+
+        print(response.generative.text)
+
+        for o in response.objects:
+            print(o.properties["path"])
+
+        client.close()
+        return
+
+    cache = AnswerCache(args.cache_path, args.threshold, args.min_overlap, args.ttl_hours * 3600, args.max_entries)
+    embedder = make_embedder(args.embedder, **({"input_type": "search_query"} if args.embedder == "cohere" else {}))
+
+    # Retrieval is cheap; it decides whether a cached answer still fits, and feeds generation on a miss
+    with tracing.span("query.hybrid", limit=args.limit):
+        retrieved = chunks.query.hybrid(query=query, limit=args.limit).objects
+    retrieved_hashes = {str(o.uuid): content_hash(o.properties["chunk"]) for o in retrieved}
+
+    def fetch_hashes(uuids: list[str]) -> dict[str, str]:
+        current = chunks.query.fetch_objects(
+            filters=Filter.by_id().contains_any(uuids), limit=len(uuids), return_properties=["chunk"]
+        )
+        return {str(o.uuid): content_hash(o.properties["chunk"]) for o in current.objects}
+
+    vector = embedder.embed([args.question])[0]
+    entry, similarity = cache.lookup(vector, TASK_TEMPLATE, retrieved_hashes, fetch_hashes)
+
+    if entry is not None:
+        print(entry.answer)
+        for path in entry.paths:
+            print(path)
+        print(f"\n(cached answer to \"{entry.question}\", similarity {similarity:.3f})")
+    elif retrieved:
+        # Generate from the chunks just retrieved, rather than running the search again
+        started = time.perf_counter()
+        with tracing.span("query.generate", limit=args.limit):
+            response = chunks.generate.fetch_objects(
+                filters=Filter.by_id().contains_any(list(retrieved_hashes)),
+                limit=len(retrieved_hashes),
+                grouped_task=task,
+                generative_provider=rag_config
+            )
+        generate_seconds = time.perf_counter() - started
+        paths = [o.properties["path"] for o in retrieved]
+
+        print(response.generative.text)
+        for path in paths:
+            print(path)
+
+        cache.put(args.question, TASK_TEMPLATE, vector, retrieved_hashes, paths, response.generative.text, generate_seconds)
+    else:
+        print("No matching chunks")
+
+    cache.save()
+    stats = cache.stats()
+    print(
+        f"Answer cache: {stats['hits']} hits, {stats['misses']} misses (hit rate {stats['hit_rate']:.0%}), "
+        f"{stats['stale']} invalidated, {stats['entries']} entries, ~{stats['seconds_saved']}s of generation saved"
+    )
+
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,104 @@
+import argparse
+import importlib
+import json
 import os
+import sys
+import time
 import asyncio
-import weaviate
-from weaviate.classes.generate import GenerativeConfig
 from mcp.server import Server
 from mcp.types import Tool, TextContent
-from mcp.server.stdio import stdio_server
+
+from query_cache import QueryCache
+from result_format import format_results
+import tracing
+
+# The Weaviate client (via client_pool / docs_index) and the transport modules are
+# imported lazily: in stdio mode that keeps them off the path to the MCP handshake.
 
 
 app = Server("weaviate-docs")
 
+# Created on first use and shared by all tool calls (and, over HTTP, by all agents)
+weaviate_pool = None
+
+query_cache = QueryCache(
+    max_entries=int(os.getenv("DOCS_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("DOCS_CACHE_TTL", "600")),
+)
+# How often (seconds) to re-read the index generation stamp written by 2_index_docs.py
+GENERATION_CHECK_INTERVAL = float(os.getenv("DOCS_GENERATION_CHECK_INTERVAL", "5"))
+_generation_checked_at = 0.0
+
+# Default token budget for a tool response; callers can pass max_tokens
+DEFAULT_MAX_TOKENS = int(os.getenv("DOCS_MAX_TOKENS", "2000"))
+format_stats = {"responses": 0, "tokens": 0, "tokens_saved": 0}
+
+# search_weaviate_docs_batch: most queries per call, and how many run against Weaviate at once
+MAX_BATCH_QUERIES = int(os.getenv("DOCS_MAX_BATCH_QUERIES", "10"))
+BATCH_CONCURRENCY = int(os.getenv("DOCS_BATCH_CONCURRENCY", "8"))
+
+
+def get_pool():
+    global weaviate_pool
+    if weaviate_pool is None:
+        from client_pool import SharedAsyncClient
+        weaviate_pool = SharedAsyncClient()
+    return weaviate_pool
+
+
+async def warm_up():
+    """Import the Weaviate client off the event loop, then open the shared connection"""
+    await asyncio.to_thread(importlib.import_module, "docs_index")
+    await get_pool().connect()
+
+
+async def refresh_cache_generation():
+    from docs_index import get_generation
+
+    global _generation_checked_at
+    if time.monotonic() - _generation_checked_at < GENERATION_CHECK_INTERVAL:
+        return
+    _generation_checked_at = time.monotonic()
+    query_cache.set_generation(await get_pool().run(get_generation))
+
+
+async def search_docs(query: str, limit: int) -> list[dict]:
+    from docs_index import CHUNKS_COLLECTION
+
+    await refresh_cache_generation()
+    # The result is only cached if no reindex has been noticed while it was fetched
+    generation = query_cache.generation
+
+    cached = query_cache.get(query, limit)
+    tracing.count("query.cache", result="miss" if cached is None else "hit")
+    if cached is not None:
+        return cached
+
+    async def search(client):
+        chunks = client.collections.use(CHUNKS_COLLECTION)
+        return await chunks.query.hybrid(
+            query=query,
+            limit=limit,
+        )
+
+    with tracing.span("query.hybrid", limit=limit) as attrs:
+        response = await get_pool().run(search)
+        attrs["hits"] = len(response.objects)
+
+    objs = [o.properties for o in response.objects]
+    query_cache.put(query, limit, objs, generation)
+    return objs
+
 
 @app.list_tools()
 async def list_tools() -> list[Tool]:
     return [
         Tool(
             name="search_weaviate_docs",
-            description="Search Weaviate documentation and get chunks of relevant text",
+            description=(
+                "Search Weaviate documentation. Returns JSON: relevant passages grouped by page, "
+                "with overlapping chunks merged, trimmed to max_tokens"
+            ),
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -27,54 +110,192 @@ async def list_tools() -> list[Tool]:
                         "type": "integer",
                         "description": "Number of chunks to retrieve (default: 5)",
                         "default": 5
+                    },
+                    "max_tokens": {
+                        "type": "integer",
+                        "description": f"Approximate token budget for the response (default: {DEFAULT_MAX_TOKENS})",
+                        "default": DEFAULT_MAX_TOKENS
                     }
                 },
                 "required": ["query"]
             }
+        ),
+        Tool(
+            name="search_weaviate_docs_batch",
+            description=(
+                "Search Weaviate documentation for several queries at once, e.g. the parts of a multi-part "
+                "question. Queries run concurrently; returns JSON with passages grouped per query. A chunk "
+                "found by an earlier query is not repeated for later ones"
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "queries": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": f"Search queries about Weaviate (at most {MAX_BATCH_QUERIES})",
+                        "maxItems": MAX_BATCH_QUERIES
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Number of chunks to retrieve per query (default: 5)",
+                        "default": 5
+                    },
+                    "max_tokens": {
+                        "type": "integer",
+                        "description": f"Approximate token budget for the whole response, split across queries (default: {DEFAULT_MAX_TOKENS * 2})",
+                        "default": DEFAULT_MAX_TOKENS * 2
+                    }
+                },
+                "required": ["queries"]
+            }
         )
     ]
 
 
+async def search_docs_batch(queries: list[str], limit: int, max_tokens: int) -> dict:
+    from docs_index import chunk_uuid
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def one(query: str) -> list[dict]:
+        async with semaphore:
+            return await search_docs(query, limit)
+
+    results = await asyncio.gather(*(one(query) for query in queries))
+
+    # Dedupe by object uuid (derived from path and chunk_no), keeping each chunk under the first query that found it
+    seen = set()
+    grouped = []
+    for query, objs in zip(queries, results):
+        unique = []
+        for obj in objs:
+            uuid = chunk_uuid(obj["path"], obj["chunk_no"])
+            if uuid not in seen:
+                seen.add(uuid)
+                unique.append(obj)
+        formatted = format_results(unique, max_tokens=max_tokens // len(queries))
+        format_stats["tokens"] += formatted.tokens
+        format_stats["tokens_saved"] += formatted.tokens_saved
+        grouped.append({
+            "query": query,
+            **formatted.to_dict(),
+            **({"duplicates_of_earlier_queries": len(objs) - len(unique)} if len(unique) < len(objs) else {}),
+        })
+    format_stats["responses"] += 1
+    return {"queries": grouped}
+
+
 @app.call_tool()
 async def call_tool(name: str, arguments: dict) -> list[TextContent]:
+    if name == "search_weaviate_docs_batch":
+        queries = [q for q in arguments["queries"] if q.strip()][:MAX_BATCH_QUERIES]
+        if not queries:
+            raise ValueError("queries must contain at least one query")
+        batch = await search_docs_batch(
+            queries,
+            arguments.get("limit", 5),
+            arguments.get("max_tokens", DEFAULT_MAX_TOKENS * 2),
+        )
+        return [TextContent(
+            type="text",
+            text=json.dumps(batch, ensure_ascii=False)
+        )]
+
     if name != "search_weaviate_docs":
         raise ValueError(f"Unknown tool: {name}")
 
     query = arguments["query"]
     limit = arguments.get("limit", 5)
 
-    client = weaviate.connect_to_local(
-        headers={
-            "X-Cohere-Api-Key": os.getenv("COHERE_API_KEY")
-        },
-    )
+    objs = await search_docs(query, limit)
+    formatted = format_results(objs, max_tokens=arguments.get("max_tokens", DEFAULT_MAX_TOKENS))
+    format_stats["responses"] += 1
+    format_stats["tokens"] += formatted.tokens
+    format_stats["tokens_saved"] += formatted.tokens_saved
 
-    try:
-        chunks = client.collections.use("Chunks")
+    return [TextContent(
+        type="text",
+        text=formatted.to_json()
+    )]
 
-        response = chunks.query.hybrid(
-            query=query,
-            limit=limit,
-        )
 
-        objs = [o.properties for o in response.objects]
+def log_stats():
+    print(f"Query cache: {query_cache.stats()}", file=sys.stderr)
+    print(f"Responses: {format_stats}", file=sys.stderr)
 
-        return [TextContent(
-            type="text",
-            text=str(objs)
-        )]
 
+async def serve_stdio():
+    from mcp.server.stdio import stdio_server
+
+    # Connect in the background, so the client's initialize isn't held up by it;
+    # a tool call arriving first simply connects on demand.
+    warm_up_task = asyncio.create_task(warm_up())
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await app.run(
+                read_stream,
+                write_stream,
+                app.create_initialization_options()
+            )
     finally:
-        client.close()
+        await asyncio.gather(warm_up_task, return_exceptions=True)
+        log_stats()
+        await get_pool().close()
+
+
+async def serve_http(host: str, port: int):
+    """One long-lived server for many agents, with a warm connection and cache shared between them"""
+    import contextlib
+    import uvicorn
+    from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse
+    from starlette.routing import Mount, Route
+
+    # Stateless: any request can be served without session affinity, so agents come and go freely
+    session_manager = StreamableHTTPSessionManager(app=app, stateless=True)
+
+    async def handle_mcp(scope, receive, send):
+        await session_manager.handle_request(scope, receive, send)
+
+    async def health(request):
+        return JSONResponse({"status": "ok", "query_cache": query_cache.stats(), "responses": format_stats})
+
+    @contextlib.asynccontextmanager
+    async def lifespan(_):
+        await warm_up()
+        async with session_manager.run():
+            try:
+                yield
+            finally:
+                log_stats()
+                await get_pool().close()
+
+    starlette_app = Starlette(
+        routes=[Route("/health", health), Mount("/mcp", app=handle_mcp)],
+        lifespan=lifespan,
+    )
+    print(f"Serving MCP over streamable HTTP at http://{host}:{port}/mcp", file=sys.stderr)
+    await uvicorn.Server(uvicorn.Config(starlette_app, host=host, port=port, log_level="warning")).serve()
 
 
 async def main():
-    async with stdio_server() as (read_stream, write_stream):
-        await app.run(
-            read_stream,
-            write_stream,
-            app.create_initialization_options()
-        )
+    parser = argparse.ArgumentParser(description="Weaviate docs MCP server")
+    parser.add_argument(
+        "--transport",
+        choices=["stdio", "http"],
+        default=os.getenv("DOCS_MCP_TRANSPORT", "stdio"),
+        help="stdio: one server per agent process. http: one shared streamable-HTTP server at /mcp",
+    )
+    parser.add_argument("--host", default=os.getenv("DOCS_MCP_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("DOCS_MCP_PORT", "8000")))
+    args = parser.parse_args()
+
+    if args.transport == "http":
+        await serve_http(args.host, args.port)
+    else:
+        await serve_stdio()
 
 
 if __name__ == "__main__":
@@ -1,16 +1,20 @@
 # Reference: https://ai.pydantic.dev/agents/
 from pydantic_ai import Agent
 from pathlib import Path
-from pydantic_ai.mcp import MCPServerStdio
+from pydantic_ai.mcp import MCPServerStdio, MCPServerStreamableHTTP
 import os
 import json
 
-weaviate_docs_mcp_directory = Path.home() / "code" / "wkend_projects/better_context"
-weaviate_docs_mcp_server = MCPServerStdio(
-    command="uv",
-    args=["--directory", str(weaviate_docs_mcp_directory), "run", "python", "4_build_mcp.py"],
-    env=os.environ.copy(),
-)
+if os.getenv("DOCS_MCP_URL"):
+    # A shared, already-running server: python 4_build_mcp.py --transport http
+    weaviate_docs_mcp_server = MCPServerStreamableHTTP(os.environ["DOCS_MCP_URL"])
+else:
+    weaviate_docs_mcp_directory = Path.home() / "code" / "wkend_projects/better_context"
+    weaviate_docs_mcp_server = MCPServerStdio(
+        command="uv",
+        args=["--directory", str(weaviate_docs_mcp_directory), "run", "python", "4_build_mcp.py"],
+        env=os.environ.copy(),
+    )
 
 basic_agent = Agent(
     model="anthropic:claude-3-5-haiku-latest",
@@ -33,6 +37,9 @@ def set_system_prompt() -> str:
     This is true for something as basic as connecting to a Weaviate server.
 
     The syntax may have changed, so look up the latest syntax using the provided tools.
+
+    When a question has several parts (e.g. configuration, ingestion and querying),
+    search for all of them in one call with search_weaviate_docs_batch.
     """
 
 
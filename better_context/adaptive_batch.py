@@ -0,0 +1,209 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from weaviate.classes.data import DataObject
+
+import tracing
+
+
+FAILURE_REPORT_PATH = "./output/ingest_failures.jsonl"
+
+
+def is_rate_limited(message: str) -> bool:
+    message = message.lower()
+    return "429" in message or "rate limit" in message or "too many requests" in message
+
+
+def approx_embed_tokens(obj: DataObject) -> int:
+    """Rough token count Weaviate will send to the embedding model (0 if we brought a vector)."""
+    if obj.vector is not None:
+        return 0
+    text = " ".join(str(v) for v in obj.properties.values() if isinstance(v, str))
+    return len(text) // 4
+
+
+@dataclass
+class FailedObject:
+    object_: DataObject
+    message: str
+
+
+class AdaptiveIngestor:
+    """Batch writer that sizes batches and concurrency from observed latency and rate limits.
+
+    Drop-in for `collection.batch.fixed_size()` in the indexer: use it as a context
+    manager, call `add_object()`, and read `failed_objects` afterwards.
+
+    Batch size and concurrency grow additively while requests come back under
+    `target_latency` and are halved on a 429 / rate-limit error. Failed objects are
+    retried with exponential backoff; whatever still fails is appended to a JSONL
+    failure report that `replay_failures()` can feed back in on a resume run.
+    """
+
+    def __init__(
+        self,
+        collection,
+        initial_batch_size: int = 50,
+        min_batch_size: int = 10,
+        max_batch_size: int = 500,
+        max_concurrency: int = 8,
+        target_latency: float = 2.0,
+        max_retries: int = 5,
+        failure_report: str = FAILURE_REPORT_PATH,
+        report_interval: float = 10.0,
+    ):
+        self.collection = collection
+        self.batch_size = initial_batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.concurrency = 2
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.failure_report = failure_report
+        self.report_interval = report_interval
+
+        self.failed_objects: list[FailedObject] = []
+        self.written = 0
+        self.embed_tokens = 0
+        self.rate_limited = 0
+
+        self._buffer: list[DataObject] = []
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._stats_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._futures = []
+        self._started_at = time.monotonic()
+        self._reported_at = self._started_at
+
+    def add_object(self, properties: dict, uuid=None, vector=None):
+        self._buffer.append(DataObject(properties=properties, uuid=uuid, vector=vector))
+        if len(self._buffer) >= self.batch_size:
+            self._submit()
+
+    def _submit(self):
+        objects, self._buffer = self._buffer, []
+        with self._cond:
+            while self._in_flight >= self.concurrency:
+                self._cond.wait()
+            self._in_flight += 1
+        self._futures.append(self._executor.submit(self._send, objects))
+
+    def _send(self, objects: list[DataObject]):
+        try:
+            for attempt in range(self.max_retries + 1):
+                start = time.monotonic()
+                with tracing.span("batch.insert", objects=len(objects), attempt=attempt) as attrs:
+                    try:
+                        result = self.collection.data.insert_many(objects)
+                        errors = {i: e.message for i, e in result.errors.items()}
+                    except Exception as e:
+                        # The whole request failed (timeout, 429 on the request itself, ...)
+                        errors = {i: str(e) for i in range(len(objects))}
+                    attrs["failed"] = len(errors)
+                latency = time.monotonic() - start
+
+                rate_limited = any(is_rate_limited(message) for message in errors.values())
+                self._adjust(latency, rate_limited)
+
+                succeeded = [obj for i, obj in enumerate(objects) if i not in errors]
+                self._record_success(succeeded)
+
+                if not errors:
+                    return
+                if attempt == self.max_retries:
+                    self._record_failures([(objects[i], message) for i, message in errors.items()], attempt)
+                    return
+
+                objects = [objects[i] for i in errors]
+                time.sleep(min(60.0, 2 ** attempt) * (0.5 + random.random()))
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def _adjust(self, latency: float, rate_limited: bool):
+        with self._cond:
+            if rate_limited:
+                self.rate_limited += 1
+                self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+                self.concurrency = max(1, self.concurrency // 2)
+            elif latency < self.target_latency:
+                self.batch_size = min(self.max_batch_size, self.batch_size + 10)
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+            elif latency > self.target_latency * 1.5:
+                self.batch_size = max(self.min_batch_size, int(self.batch_size * 0.75))
+            self._cond.notify_all()
+
+    def _record_success(self, objects: list[DataObject]):
+        with self._stats_lock:
+            self.written += len(objects)
+            self.embed_tokens += sum(approx_embed_tokens(obj) for obj in objects)
+            now = time.monotonic()
+            if now - self._reported_at >= self.report_interval:
+                self._reported_at = now
+                print(self.progress())
+
+    def _record_failures(self, failures: list[tuple[DataObject, str]], attempts: int):
+        with self._stats_lock:
+            os.makedirs(os.path.dirname(self.failure_report) or ".", exist_ok=True)
+            with open(self.failure_report, "a") as f:
+                for obj, message in failures:
+                    self.failed_objects.append(FailedObject(object_=obj, message=message))
+                    f.write(json.dumps({
+                        "uuid": str(obj.uuid) if obj.uuid else None,
+                        "properties": obj.properties,
+                        "vector": obj.vector,
+                        "message": message,
+                        "attempts": attempts + 1,
+                    }) + "\n")
+
+    def progress(self) -> str:
+        elapsed = time.monotonic() - self._started_at
+        return (
+            f"{self.written} objects, {self.written / elapsed:.1f} obj/s, "
+            f"{self.embed_tokens / elapsed:.0f} embed tokens/s, "
+            f"batch={self.batch_size} concurrency={self.concurrency} "
+            f"rate_limited={self.rate_limited} failed={len(self.failed_objects)}"
+        )
+
+    def flush(self):
+        if self._buffer:
+            self._submit()
+        for future in self._futures:
+            future.result()
+        self._futures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+        self._executor.shutdown()
+        print(self.progress())
+
+
+def clear_failure_report(path: str = FAILURE_REPORT_PATH):
+    """Start a run with an empty report. Chunks that failed in earlier runs are marked in the
+    manifest, so this run re-sends them; replaying their old objects could overwrite newer ones."""
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def replay_failures(path: str = FAILURE_REPORT_PATH):
+    """Yield add_object() kwargs for every object in a failure report."""
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                failure = json.loads(line)
+                yield {
+                    "properties": failure["properties"],
+                    "uuid": failure["uuid"],
+                    "vector": failure["vector"],
+                }
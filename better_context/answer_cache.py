@@ -0,0 +1,181 @@
+# Semantic cache for generative RAG answers (used by 3_check_rag.py --answer-cache).
+#
+# Retrieval is cheap and generation is not, so retrieval always runs. A cached answer is
+# reused when the question embedding is close to a cached one (same task template), the
+# chunks retrieved now overlap the ones the answer was generated from, and none of those
+# source chunks has changed since (content hash) or disappeared.
+#   python answer_cache.py stats
+#   python answer_cache.py clear
+import argparse
+import json
+import os
+import time
+from dataclasses import asdict, dataclass
+
+import tracing
+
+
+ANSWER_CACHE_PATH = "./output/answer_cache.json"
+
+
+def normalize(vector: list[float]) -> list[float]:
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+
+def dot(a: list[float], b: list[float]) -> float:
+    return sum(x * y for x, y in zip(a, b))
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    task: str
+    vector: list[float]  # normalized question embedding
+    sources: dict[str, str]  # chunk uuid -> content hash of the chunk the answer was generated from
+    paths: list[str]
+    answer: str
+    generate_seconds: float
+    created_at: float
+    last_used: float
+    hits: int = 0
+
+
+class AnswerCache:
+    """Answers keyed by question embedding, validated against the chunks they were generated from.
+
+    Entries expire after `ttl` seconds; beyond `max_entries` the least recently used are evicted.
+    Stats are kept in the cache file, so the hit rate covers every run that used it.
+    """
+
+    def __init__(
+        self,
+        path: str = ANSWER_CACHE_PATH,
+        threshold: float = 0.9,
+        min_overlap: float = 0.6,
+        ttl: float = 7 * 24 * 3600,
+        max_entries: int = 1000,
+    ):
+        self.path = path
+        self.threshold = threshold
+        self.min_overlap = min_overlap
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self.entries: list[CachedAnswer] = []
+        self.counters = {
+            "hits": 0, "misses": 0, "stale": 0, "retrieval_changed": 0,
+            "expired": 0, "evictions": 0, "seconds_saved": 0.0,
+        }
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                data = json.load(f)
+            self.entries = [CachedAnswer(**entry) for entry in data["entries"]]
+            self.counters.update(data["stats"])
+
+    def _expire(self):
+        now = time.time()
+        fresh = [e for e in self.entries if now - e.created_at <= self.ttl]
+        self.counters["expired"] += len(self.entries) - len(fresh)
+        self.entries = fresh
+
+    def lookup(self, vector: list[float], task: str, retrieved: dict[str, str], fetch_hashes) -> tuple[CachedAnswer | None, float]:
+        """Best valid cached answer for a question, and its similarity.
+
+        `retrieved` maps the uuids of the chunks retrieved for this question to their content
+        hashes; `fetch_hashes(uuids)` returns the current hashes of other chunks (missing = deleted).
+        """
+        self._expire()
+        vector = normalize(vector)
+        candidates = sorted(
+            ((dot(vector, e.vector), e) for e in self.entries if e.task == task),
+            key=lambda pair: pair[0],
+            reverse=True,
+        )
+
+        for similarity, entry in candidates:
+            if similarity < self.threshold:
+                break
+            overlap = len(retrieved.keys() & entry.sources.keys()) / len(retrieved.keys() | entry.sources.keys())
+            if overlap < self.min_overlap:
+                # A paraphrase that retrieves different chunks may need a different answer
+                self.counters["retrieval_changed"] += 1
+                continue
+
+            current = dict(retrieved)
+            not_retrieved = [uuid for uuid in entry.sources if uuid not in current]
+            if not_retrieved:
+                current.update(fetch_hashes(not_retrieved))
+            if any(current.get(uuid) != source_hash for uuid, source_hash in entry.sources.items()):
+                # A source chunk changed or was removed since the answer was generated
+                self.entries.remove(entry)
+                self.counters["stale"] += 1
+                tracing.count("answer_cache", result="stale")
+                continue
+
+            entry.hits += 1
+            entry.last_used = time.time()
+            self.counters["hits"] += 1
+            self.counters["seconds_saved"] += entry.generate_seconds
+            tracing.count("answer_cache", result="hit")
+            return entry, similarity
+
+        self.counters["misses"] += 1
+        tracing.count("answer_cache", result="miss")
+        return None, candidates[0][0] if candidates else 0.0
+
+    def put(self, question: str, task: str, vector: list[float], sources: dict[str, str], paths: list[str], answer: str, generate_seconds: float):
+        now = time.time()
+        self.entries.append(CachedAnswer(
+            question=question,
+            task=task,
+            vector=normalize(vector),
+            sources=sources,
+            paths=paths,
+            answer=answer,
+            generate_seconds=generate_seconds,
+            created_at=now,
+            last_used=now,
+        ))
+        if len(self.entries) > self.max_entries:
+            self.entries.sort(key=lambda e: e.last_used)
+            evicted = len(self.entries) - self.max_entries
+            self.entries = self.entries[evicted:]
+            self.counters["evictions"] += evicted
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            "entries": len(self.entries),
+            **self.counters,
+            "seconds_saved": round(self.counters["seconds_saved"], 1),
+            "hit_rate": self.counters["hits"] / lookups if lookups else 0.0,
+        }
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.tmp", "w") as f:
+            json.dump({"entries": [asdict(e) for e in self.entries], "stats": self.counters}, f)
+        os.replace(f"{self.path}.tmp", self.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the RAG answer cache")
+    parser.add_argument("command", choices=["stats", "clear"])
+    parser.add_argument("--path", default=ANSWER_CACHE_PATH)
+    args = parser.parse_args()
+
+    if args.command == "clear":
+        if os.path.exists(args.path):
+            os.remove(args.path)
+        print(f"Cleared {args.path}")
+        return
+
+    cache = AnswerCache(args.path)
+    print(json.dumps(cache.stats(), indent=2))
+    for entry in sorted(cache.entries, key=lambda e: e.hits, reverse=True)[:10]:
+        print(f"{entry.hits:>5} hits  {entry.question}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# Memory, recall and latency of vector index profiles for the Chunks index.
+#
+# Indexes the corpus once per profile (same chunks, same local embedder, as bench_retrieval.py)
+# and reports, per profile:
+#   - estimated resident memory of the vector index (vectors or codes + HNSW links)
+#   - vector recall@k against exact search (the uncompressed flat profile, always built)
+#   - page recall@k and MRR of hybrid search on the golden set
+#   - near-vector latency p50/p95/p99 and QPS
+#
+#   python bench_index_profiles.py --profiles hnsw,hnsw-rq,hnsw-rq1,hnsw-bq,hnsw-sq,hnsw-pq,flat-bq --rescore-limit 200
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import weaviate
+from weaviate.exceptions import WeaviateBaseError
+
+from bench_retrieval import BENCH_DIR, GOLDEN_PATH, index_corpus, load_or_build_golden_set, make_query_embedder, parse_list, run_queries
+from bench_utils import summarize_latencies
+from corpus import CRAWL_JSON_PATH
+from embedding_cache import make_embedder
+from index_profiles import IndexProfile, profile_names, wait_for_indexing
+
+
+def run_vector_queries(collection, query_vectors: list[list[float]], k: int, concurrency: int) -> tuple[dict, list[list[str]]]:
+    def one(vector):
+        start = time.perf_counter()
+        response = collection.query.near_vector(near_vector=vector, limit=k, return_properties=[])
+        return time.perf_counter() - start, [str(o.uuid) for o in response.objects]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one, query_vectors))
+    wall_time = time.perf_counter() - start
+    return summarize_latencies([latency for latency, _ in results], wall_time), [uuids for _, uuids in results]
+
+
+def vector_recall(results: list[list[str]], exact: list[list[str]], k: int) -> float:
+    return sum(len(set(got) & set(expected)) for got, expected in zip(results, exact)) / (k * len(exact))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory, recall and latency per vector index profile")
+    parser.add_argument("--corpus", default=CRAWL_JSON_PATH, help="Crawl dump (.json, .jsonl or sharded directory)")
+    parser.add_argument("--profiles", default="hnsw,hnsw-rq,hnsw-rq1,hnsw-bq,hnsw-sq,hnsw-pq,flat-bq", help=f"Comma-separated: {', '.join(profile_names())}")
+    parser.add_argument("--rescore-limit", type=int, help="Applied to the bq, sq and rq profiles")
+    parser.add_argument("--queries", type=int, default=200, help="Golden set size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-pages", type=int, default=None, help="Cap on pages indexed per profile")
+    parser.add_argument("--chunk-size", type=int, default=512)
+    parser.add_argument("--chunk-overlap", type=int, default=128)
+    parser.add_argument("--alpha", type=float, default=0.5, help="Hybrid alpha for the page recall")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--embedder", choices=["hash", "cohere"], default="hash")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark collections afterwards")
+    args = parser.parse_args()
+
+    # Exact search first: the ground truth for vector recall
+    profiles = [IndexProfile.parse("flat")]
+    for name in parse_list(args.profiles, str):
+        try:
+            profile = IndexProfile.parse(name)
+        except ValueError as e:
+            parser.error(str(e))
+        if profile.quantizer not in (None, "pq"):
+            profile.rescore_limit = args.rescore_limit
+        if profile.name != "flat":
+            profiles.append(profile)
+
+    golden = load_or_build_golden_set(args.corpus, args.queries, args.seed)
+    print(f"Golden set: {len(golden)} queries ({GOLDEN_PATH})")
+    embedder = make_embedder(args.embedder)
+    query_embedder = make_query_embedder(args.embedder)
+    query_vectors = query_embedder.embed([item["query"] for item in golden])
+    dims = len(query_vectors[0])
+
+    results = []
+    exact = None
+    with weaviate.connect_to_local() as client:
+        for profile in profiles:
+            name = f"BenchProfile_{profile.name.replace('-', '_')}"
+            print(f"Indexing {name}")
+            try:
+                collection = index_corpus(
+                    client, name, args.corpus, embedder, args.chunk_size, args.chunk_overlap,
+                    args.max_pages, {item["expected_path"] for item in golden},
+                    vector_index_config=profile.vector_index_config(),
+                )
+            except WeaviateBaseError as e:
+                # e.g. dynamic indexes without ASYNC_INDEXING=true on the server
+                print(f"  skipped: {e}")
+                continue
+            indexed = wait_for_indexing(client, name)
+
+            summary, uuids = run_vector_queries(collection, query_vectors, args.k, args.concurrency)
+            if exact is None:
+                exact = uuids
+            hybrid = run_queries(collection, golden, query_embedder, args.alpha, args.k, args.concurrency)
+            result = {
+                "profile": profile.name,
+                "rescore_limit": profile.rescore_limit,
+                "objects": indexed["objects"],
+                "compressed": indexed["compressed"],
+                "memory_mib": profile.estimated_memory(indexed["objects"], dims) / 2**20,
+                f"vector_recall@{args.k}": vector_recall(uuids, exact, args.k),
+                f"page_recall@{args.k}": hybrid[f"recall@{args.k}"],
+                "mrr": hybrid["mrr"],
+                **summary,
+            }
+            results.append(result)
+            print(
+                f"  {profile.name:<11} memory~{result['memory_mib']:8.1f}MiB "
+                f"vector recall@{args.k}={result[f'vector_recall@{args.k}']:.3f} "
+                f"page recall@{args.k}={result[f'page_recall@{args.k}']:.3f} mrr={result['mrr']:.3f} "
+                f"p50={summary['p50_ms']:.1f}ms p95={summary['p95_ms']:.1f}ms qps={summary['qps']:.1f}"
+                + ("" if indexed["compressed"] or not profile.quantizer else "  (not compressed yet: below training limit?)")
+            )
+
+            if not args.keep:
+                client.collections.delete(name)
+
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    out_path = os.path.join(BENCH_DIR, f"profiles-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(out_path, "w") as f:
+        json.dump(
+            {
+                "embedder": embedder.model,
+                "dims": dims,
+                "k": args.k,
+                "alpha": args.alpha,
+                "queries": len(golden),
+                "max_pages": args.max_pages,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"\nResults written to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Time from "agent starts" to "first search result" for the docs MCP server:
+#   stdio: every agent spawns its own server (optionally through uv, like 5_agent_example.py)
+#   http:  agents connect to one long-lived server, started once (or given with --url)
+import argparse
+import asyncio
+import subprocess
+import sys
+import time
+
+import httpx
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
+
+from bench_utils import percentile
+
+
+QUERY = "vector compression methods"
+
+
+async def time_session(session_cm) -> tuple[float, float]:
+    """Seconds until initialize returns and until the first tool call returns, from opening the session"""
+    start = time.perf_counter()
+    async with session_cm as streams:
+        read_stream, write_stream = streams[0], streams[1]
+        async with ClientSession(read_stream, write_stream) as session:
+            await session.initialize()
+            initialized = time.perf_counter() - start
+            await session.call_tool("search_weaviate_docs", {"query": QUERY, "limit": 5})
+            first_result = time.perf_counter() - start
+    return initialized, first_result
+
+
+async def bench_stdio(runs: int, use_uv: bool) -> list[tuple[float, float]]:
+    if use_uv:
+        params = StdioServerParameters(command="uv", args=["--directory", ".", "run", "python", "4_build_mcp.py"])
+    else:
+        params = StdioServerParameters(command=sys.executable, args=["4_build_mcp.py"])
+    return [await time_session(stdio_client(params)) for _ in range(runs)]
+
+
+async def wait_ready(base_url: str, timeout: float = 60) -> float:
+    start = time.perf_counter()
+    async with httpx.AsyncClient() as http:
+        while time.perf_counter() - start < timeout:
+            try:
+                if (await http.get(f"{base_url}/health")).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.05)
+    raise TimeoutError(f"Server at {base_url} not ready after {timeout}s")
+
+
+async def bench_http(runs: int, url: str | None, port: int) -> tuple[float | None, list[tuple[float, float]]]:
+    server = None
+    server_ready = None
+    if url is None:
+        server = subprocess.Popen([sys.executable, "4_build_mcp.py", "--transport", "http", "--port", str(port)])
+        url = f"http://127.0.0.1:{port}/mcp"
+        server_ready = await wait_ready(url.rsplit("/mcp", 1)[0])
+    try:
+        return server_ready, [await time_session(streamablehttp_client(url)) for _ in range(runs)]
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+def report(label: str, timings: list[tuple[float, float]]):
+    initialized = [t for t, _ in timings]
+    first_result = [t for _, t in timings]
+    print(
+        f"{label:<14} runs={len(timings):<3} "
+        f"initialize p50={percentile(initialized, 50) * 1000:8.1f}ms p95={percentile(initialized, 95) * 1000:8.1f}ms  "
+        f"first result p50={percentile(first_result, 50) * 1000:8.1f}ms p95={percentile(first_result, 95) * 1000:8.1f}ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Startup latency of the docs MCP server, stdio vs. shared HTTP")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modes", default="stdio,http", help="Comma-separated: stdio, uv, http")
+    parser.add_argument("--url", help="Existing HTTP server (e.g. http://127.0.0.1:8000/mcp); default: start one")
+    parser.add_argument("--port", type=int, default=8123, help="Port for the HTTP server this benchmark starts")
+    args = parser.parse_args()
+
+    modes = args.modes.split(",")
+    if "stdio" in modes:
+        report("stdio", await bench_stdio(args.runs, use_uv=False))
+    if "uv" in modes:
+        report("stdio via uv", await bench_stdio(args.runs, use_uv=True))
+    if "http" in modes:
+        server_ready, timings = await bench_http(args.runs, args.url, args.port)
+        if server_ready is not None:
+            print(f"{'http server':<14} ready after {server_ready * 1000:.1f}ms (paid once, not per agent)")
+        report("http", timings)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,310 @@
+# Offline retrieval benchmark for the Chunks index.
+#
+# Builds a golden query -> expected page set from the crawl corpus, indexes the corpus into throwaway
+# collections with a deterministic local embedder, and sweeps chunking and hybrid
+# alpha settings. Reports recall@k, MRR, latency percentiles and QPS, and writes the
+# results as JSON so runs can be compared for regressions.
+#
+# Page titles make poor queries: they are repeated in the page's chunks, so BM25 finds them
+# trivially and every alpha looks alike. Queries are instead:
+#   heading    an H2/H3 section heading found on one page only
+#   sentence   a sentence from the page body with the page title's and its section heading's
+#              words taken out, a stand-in for a question asked in other words
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import weaviate
+from weaviate.classes.config import Configure, Property, DataType, Tokenization
+
+from bench_utils import summarize_latencies
+from chunking import make_chunker, chunk_text
+from corpus import CRAWL_JSON_PATH, INDEX_FILE, iter_pages
+from docs_index import DOCS_PATH_FILTER, chunk_uuid, vectorized_text
+from embedding_cache import make_embedder
+
+
+BENCH_DIR = "./output/bench"
+GOLDEN_PATH = os.path.join(BENCH_DIR, "golden.json")
+
+
+# Bump when the golden set construction changes, so cached sets are rebuilt
+GOLDEN_VERSION = 2
+QUERY_KINDS = ["heading", "sentence"]
+
+
+def clean_heading(heading: str) -> str:
+    # Drop markdown links / anchors left in headings by the crawler
+    return re.sub(r"\[([^\]]*)\]\([^)]*\)", r"\1", heading).strip(" #\u200b")
+
+
+def page_title(markdown: str) -> str | None:
+    match = re.search(r"^#\s+(.+)$", markdown, flags=re.MULTILINE)
+    if not match:
+        return None
+    return clean_heading(match.group(1)) or None
+
+
+def page_sections(markdown: str) -> list[tuple[str, str]]:
+    """(H2/H3 heading, prose under it) pairs, with code blocks and link targets removed"""
+    markdown = re.sub(r"```.*?```", "", markdown, flags=re.DOTALL)
+    markdown = re.sub(r"\[([^\]]*)\]\([^)]*\)", r"\1", markdown)
+    sections = []
+    for part in re.split(r"^(?=#{2,3}\s)", markdown, flags=re.MULTILINE)[1:]:
+        heading, _, body = part.partition("\n")
+        sections.append((clean_heading(heading), body))
+    return sections
+
+
+def sentences(text: str) -> list[str]:
+    return [s.strip() for s in re.findall(r"[^.!?\n]+[.!?]", text) if 8 <= len(s.split()) <= 30]
+
+
+def words(text: str) -> set[str]:
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def reworded_query(sentence: str, known_words: set[str]) -> str | None:
+    """`sentence` without the words a title or heading would give away, or None if too little is left"""
+    kept = [word for word in re.findall(r"\w+", sentence) if word.lower() not in known_words]
+    return " ".join(kept) if len(kept) >= 5 else None
+
+
+def build_golden_set(corpus_path: str, size: int, seed: int, kinds: list[str] = QUERY_KINDS) -> list[dict]:
+    rng = random.Random(seed)
+    candidates = {kind: [] for kind in kinds}
+    heading_pages: dict[str, tuple[str, set[str]]] = {}
+    sentence_pages: dict[str, set[str]] = {}
+    for url, markdown in iter_pages(corpus_path, url_filter=DOCS_PATH_FILTER):
+        title_words = words(page_title(markdown) or "")
+        page_sentences = []
+        for heading, body in page_sections(markdown):
+            if len(heading.split()) >= 2:
+                heading_pages.setdefault(heading.lower(), (heading, set()))[1].add(url)
+            for sentence in sentences(body):
+                sentence_pages.setdefault(sentence.lower(), set()).add(url)
+                page_sentences.append((sentence, heading))
+        if "sentence" in kinds and page_sentences:
+            sentence, heading = rng.choice(page_sentences)
+            query = reworded_query(sentence, title_words | words(heading))
+            if query:
+                candidates["sentence"].append({"kind": "sentence", "query": query, "source": sentence, "expected_path": url})
+
+    # A heading or sentence found on several pages ("Overview", shared notes) has no single right answer
+    if "heading" in kinds:
+        candidates["heading"] = [
+            {"kind": "heading", "query": heading, "expected_path": next(iter(urls))}
+            for heading, urls in heading_pages.values() if len(urls) == 1
+        ]
+    if "sentence" in kinds:
+        query_counts = Counter(item["query"].lower() for item in candidates["sentence"])
+        candidates["sentence"] = [
+            item for item in candidates["sentence"]
+            if len(sentence_pages[item["source"].lower()]) == 1 and query_counts[item["query"].lower()] == 1
+        ]
+
+    golden = []
+    for kind in kinds:
+        items = sorted(candidates[kind], key=lambda item: (item["expected_path"], item["query"]))
+        rng.shuffle(items)
+        golden.extend(items[:size // len(kinds)])
+    return golden
+
+
+def corpus_fingerprint(corpus_path: str) -> dict:
+    # A sharded corpus changes whenever its index does
+    path = os.path.join(corpus_path, INDEX_FILE) if os.path.isdir(corpus_path) else corpus_path
+    stat = os.stat(path)
+    return {"corpus": os.path.abspath(corpus_path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def load_or_build_golden_set(corpus_path: str, size: int, seed: int, kinds: list[str] = QUERY_KINDS) -> list[dict]:
+    """The cached golden set if it was built from the same corpus and arguments, else a new one"""
+    key = {"version": GOLDEN_VERSION, **corpus_fingerprint(corpus_path), "queries": size, "seed": seed, "kinds": kinds}
+    key_hash = hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+    if os.path.exists(GOLDEN_PATH):
+        with open(GOLDEN_PATH, "r") as f:
+            cached = json.load(f)
+        if isinstance(cached, dict) and cached.get("key_hash") == key_hash:
+            return cached["items"]
+        print(f"Corpus or golden set arguments changed; rebuilding {GOLDEN_PATH}")
+    golden = build_golden_set(corpus_path, size, seed, kinds)
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    with open(GOLDEN_PATH, "w") as f:
+        json.dump({"key": key, "key_hash": key_hash, "items": golden}, f, indent=2)
+    return golden
+
+
+def make_query_embedder(name: str):
+    # Cohere embeds queries and documents differently
+    return make_embedder(name, **({"input_type": "search_query"} if name == "cohere" else {}))
+
+
+def index_corpus(client, name: str, corpus_path: str, embedder, chunk_size: int, chunk_overlap: int,
+                 max_pages: int | None, golden_paths: set[str], vector_index_config=None):
+    client.collections.delete(name)
+    collection = client.collections.create(
+        name=name,
+        properties=[
+            Property(name="chunk", data_type=DataType.TEXT),
+            Property(name="chunk_no", data_type=DataType.INT),
+            Property(name="path", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
+        ],
+        vector_config=Configure.Vectors.self_provided(vector_index_config=vector_index_config),
+    )
+
+    chunker = make_chunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    with collection.batch.fixed_size(batch_size=200) as batch:
+        for n, (path, text) in enumerate(iter_pages(corpus_path, url_filter=DOCS_PATH_FILTER)):
+            # Past the cap, still index the golden pages so every query has its answer
+            if max_pages and n >= max_pages and path not in golden_paths:
+                continue
+            objects = [
+                {"chunk": chunk, "chunk_no": i, "path": path}
+                for i, chunk in enumerate(chunk_text(chunker, text))
+            ]
+            if not objects:
+                continue
+            vectors = embedder.embed([vectorized_text(properties) for properties in objects])
+            for properties, vector in zip(objects, vectors):
+                batch.add_object(properties=properties, uuid=chunk_uuid(path, properties["chunk_no"]), vector=vector)
+
+    if collection.batch.failed_objects:
+        print(f"  {len(collection.batch.failed_objects)} chunks failed to insert")
+    return collection
+
+
+def run_queries(collection, golden: list[dict], query_embedder, alpha: float, k: int, concurrency: int) -> dict:
+    query_vectors = query_embedder.embed([item["query"] for item in golden])
+
+    def one(item, vector):
+        start = time.perf_counter()
+        response = collection.query.hybrid(query=item["query"], vector=vector, alpha=alpha, limit=k)
+        latency = time.perf_counter() - start
+        paths = [o.properties["path"] for o in response.objects]
+        rank = paths.index(item["expected_path"]) + 1 if item["expected_path"] in paths else None
+        return latency, rank
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one, golden, query_vectors))
+    wall_time = time.perf_counter() - start
+
+    latencies = [latency for latency, _ in results]
+    ranks = [rank for _, rank in results]
+    summary = summarize_latencies(latencies, wall_time)
+    summary[f"recall@{k}"] = sum(rank is not None for rank in ranks) / len(ranks)
+    summary["mrr"] = sum(1 / rank for rank in ranks if rank) / len(ranks)
+    for kind in sorted({item.get("kind", "heading") for item in golden}):
+        kind_ranks = [rank for item, rank in zip(golden, ranks) if item.get("kind", "heading") == kind]
+        summary[f"recall@{k}_{kind}"] = sum(rank is not None for rank in kind_ranks) / len(kind_ranks)
+    return summary
+
+
+def compare(previous_path: str, results: list[dict], k: int):
+    with open(previous_path, "r") as f:
+        previous = {
+            (r["chunk_size"], r["chunk_overlap"], r["alpha"]): r for r in json.load(f)["results"]
+        }
+
+    print(f"\nCompared with {previous_path}:")
+    for r in results:
+        old = previous.get((r["chunk_size"], r["chunk_overlap"], r["alpha"]))
+        if old is None:
+            continue
+        print(
+            f"  size={r['chunk_size']:<4} overlap={r['chunk_overlap']:<4} alpha={r['alpha']:<5} "
+            f"recall@{k} {r[f'recall@{k}'] - old[f'recall@{k}']:+.3f}  "
+            f"mrr {r['mrr'] - old['mrr']:+.3f}  "
+            f"p95 {r['p95_ms'] - old['p95_ms']:+.1f}ms  "
+            f"qps {r['qps'] - old['qps']:+.1f}"
+        )
+
+
+def parse_list(value: str, cast):
+    return [cast(v) for v in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline retrieval benchmark for the Chunks index")
+    parser.add_argument("--corpus", default=CRAWL_JSON_PATH, help="Crawl dump (.json, .jsonl or sharded directory)")
+    parser.add_argument("--queries", type=int, default=200, help="Golden set size")
+    parser.add_argument("--query-kinds", default=",".join(QUERY_KINDS), help=f"Comma-separated: {', '.join(QUERY_KINDS)}")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-pages", type=int, default=None, help="Cap on pages indexed per configuration")
+    parser.add_argument("--chunk-sizes", default="512", help="Comma-separated, e.g. 256,512")
+    parser.add_argument("--chunk-overlaps", default="128", help="Comma-separated, e.g. 64,128")
+    parser.add_argument("--alphas", default="0.25,0.5,0.75", help="Comma-separated hybrid alpha values")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--embedder", choices=["hash", "cohere"], default="hash")
+    parser.add_argument("--compare", help="Previous results JSON to diff against")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark collections afterwards")
+    args = parser.parse_args()
+    kinds = parse_list(args.query_kinds, str)
+    if set(kinds) - set(QUERY_KINDS):
+        parser.error(f"--query-kinds must be among {', '.join(QUERY_KINDS)}")
+
+    golden = load_or_build_golden_set(args.corpus, args.queries, args.seed, kinds)
+    print(f"Golden set: {len(golden)} queries ({GOLDEN_PATH})")
+    embedder = make_embedder(args.embedder)
+    query_embedder = make_query_embedder(args.embedder)
+
+    results = []
+    with weaviate.connect_to_local() as client:
+        for chunk_size in parse_list(args.chunk_sizes, int):
+            for chunk_overlap in parse_list(args.chunk_overlaps, int):
+                if chunk_overlap >= chunk_size:
+                    continue
+                name = f"BenchChunks_{chunk_size}_{chunk_overlap}"
+                print(f"Indexing {name}")
+                collection = index_corpus(
+                    client, name, args.corpus, embedder, chunk_size, chunk_overlap,
+                    args.max_pages, {item["expected_path"] for item in golden},
+                )
+
+                for alpha in parse_list(args.alphas, float):
+                    summary = run_queries(collection, golden, query_embedder, alpha, args.k, args.concurrency)
+                    results.append({"chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "alpha": alpha, **summary})
+                    print(
+                        f"  alpha={alpha:<5} recall@{args.k}={summary[f'recall@{args.k}']:.3f} ("
+                        + ", ".join(f"{kind} {summary[f'recall@{args.k}_{kind}']:.3f}" for kind in kinds)
+                        + f") "
+                        f"mrr={summary['mrr']:.3f} p50={summary['p50_ms']:.1f}ms "
+                        f"p95={summary['p95_ms']:.1f}ms p99={summary['p99_ms']:.1f}ms qps={summary['qps']:.1f}"
+                    )
+
+                if not args.keep:
+                    client.collections.delete(name)
+
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    out_path = os.path.join(BENCH_DIR, f"retrieval-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(out_path, "w") as f:
+        json.dump(
+            {
+                "embedder": embedder.model,
+                "k": args.k,
+                "concurrency": args.concurrency,
+                "queries": len(golden),
+                "query_kinds": kinds,
+                "max_pages": args.max_pages,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"\nResults written to {out_path}")
+
+    if args.compare:
+        compare(args.compare, results, args.k)
+
+
+if __name__ == "__main__":
+    main()
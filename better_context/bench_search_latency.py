@@ -0,0 +1,95 @@
+# Compares per-call latency of the MCP search path:
+#   before: new sync client per call, blocking the event loop (the old call_tool)
+#   after:  one shared async client, calls run concurrently
+import argparse
+import asyncio
+import os
+import time
+
+import weaviate
+
+from bench_utils import print_summary, summarize_latencies
+from client_pool import SharedAsyncClient
+
+
+QUERIES = [
+    "collection aliases in Weaviate Python",
+    "vector compression methods",
+    "how to configure backups",
+    "hybrid search alpha parameter",
+    "batch import with the Python client",
+    "multi-tenancy tenant activity status",
+]
+
+
+def search_per_call_client(query: str, limit: int):
+    client = weaviate.connect_to_local(
+        headers={
+            "X-Cohere-Api-Key": os.getenv("COHERE_API_KEY")
+        },
+    )
+    try:
+        chunks = client.collections.use("Chunks")
+        return chunks.query.hybrid(query=query, limit=limit)
+    finally:
+        client.close()
+
+
+async def bench_before(calls: int, concurrency: int, limit: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            # Blocking call inside a coroutine, exactly like the old handler
+            search_per_call_client(QUERIES[i % len(QUERIES)], limit)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return summarize_latencies(latencies, time.perf_counter() - start)
+
+
+async def bench_after(calls: int, concurrency: int, limit: int) -> dict:
+    pool = SharedAsyncClient()
+    await pool.connect()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        query = QUERIES[i % len(QUERIES)]
+
+        async def search(client):
+            chunks = client.collections.use("Chunks")
+            return await chunks.query.hybrid(query=query, limit=limit)
+
+        async with semaphore:
+            start = time.perf_counter()
+            await pool.run(search)
+            latencies.append(time.perf_counter() - start)
+
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(calls)))
+        return summarize_latencies(latencies, time.perf_counter() - start)
+    finally:
+        await pool.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark search_weaviate_docs latency before/after client pooling")
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    before = await bench_before(args.calls, args.concurrency, args.limit)
+    after = await bench_after(args.calls, args.concurrency, args.limit)
+
+    print_summary("before (client per call)", before)
+    print_summary("after (shared async)", after)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
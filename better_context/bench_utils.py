@@ -0,0 +1,30 @@
+import math
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of `values` (pct in 0-100)."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize_latencies(latencies: list[float], wall_time: float) -> dict:
+    """Summarize per-call latencies (seconds) into milliseconds plus throughput."""
+    return {
+        "calls": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "wall_s": wall_time,
+        "qps": len(latencies) / wall_time if wall_time else float("nan"),
+    }
+
+
+def print_summary(label: str, summary: dict):
+    print(
+        f"{label:<24} calls={summary['calls']:<5} "
+        f"p50={summary['p50_ms']:8.1f}ms  p95={summary['p95_ms']:8.1f}ms  "
+        f"p99={summary['p99_ms']:8.1f}ms  qps={summary['qps']:7.1f}"
+    )
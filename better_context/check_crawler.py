@@ -0,0 +1,230 @@
+# End-to-end checks of the checkpointed crawler against the local test site, without network access.
+#
+# Each check generates a fresh site under a temporary directory and serves it from a background
+# thread (serve_test_site.py), then asserts on what the crawl wrote:
+#   resume    a crawl "crashes" after a checkpoint and is resumed; every page is written exactly once
+#   backoff   the site answers 503 to some first requests and 429 above a request rate; every page
+#             still arrives, with no error page written in its place
+#   recrawl   recrawl.py after a full crawl: unchanged pages are skipped on 304 (or on an identical
+#             body hash when the site sends no validators) without rendering, and after editing,
+#             adding and removing pages exactly those are reported
+#
+#   python check_crawler.py --checks resume,backoff,recrawl --pages 60
+#
+# Exits non-zero if any check fails.
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import Counter
+
+from corpus import iter_pages
+from crawl_checkpoint import checkpointed_crawl
+from recrawl import recrawl
+from serve_test_site import DocSiteHandler, generate_site, mutate_site, page_path, start_server
+
+
+def site_url(server, path: str) -> str:
+    return f"http://127.0.0.1:{server.server_port}/{path}"
+
+
+def written_pages(sink_path: str) -> Counter:
+    """How often each URL was written to a JSONL sink"""
+    if not os.path.exists(sink_path):
+        return Counter()
+    return Counter(url for url, _ in iter_pages(sink_path))
+
+
+def completeness_problems(written: Counter, expected: set[str]) -> list[str]:
+    problems = []
+    duplicates = sorted(url for url, n in written.items() if n > 1)
+    missing = sorted(expected - set(written))
+    if duplicates:
+        problems.append(f"{len(duplicates)} pages written more than once, e.g. {duplicates[0]}")
+    if missing:
+        problems.append(f"{len(missing)} of {len(expected)} pages never written, e.g. {missing[0]}")
+    return problems
+
+
+async def check_resume(workdir: str, pages: int) -> list[str]:
+    paths = generate_site(os.path.join(workdir, "site"), pages)
+    # A little latency, so the crawl is still running when it is interrupted
+    server = start_server(os.path.join(workdir, "site"), port=0, latency=0.05)
+    sink_path = os.path.join(workdir, "pages.jsonl")
+    checkpoint_path = os.path.join(workdir, "checkpoint.json")
+    try:
+        crawl = asyncio.create_task(checkpointed_crawl(
+            site_url(server, page_path(0)), sink_path, checkpoint_path,
+            concurrency=4, delay=(0.0, 0.05), checkpoint_every=5,
+        ))
+        # Keep the last periodic checkpoint, and interrupt once pages have been written after it
+        saved = None
+        while not crawl.done():
+            await asyncio.sleep(0.05)
+            if os.path.exists(checkpoint_path):
+                with open(checkpoint_path, "r") as f:
+                    saved = f.read()
+                if sum(written_pages(sink_path).values()) > json.loads(saved)["crawled"] and len(written_pages(sink_path)) >= pages // 3:
+                    break
+        if crawl.done():
+            return [f"the crawl finished before it could be interrupted ({pages} pages); try more --pages"]
+        crawl.cancel()
+        try:
+            await crawl
+        except asyncio.CancelledError:
+            pass
+        # A crash skips the save on exit: the checkpoint on disk is older than the sink
+        with open(checkpoint_path, "w") as f:
+            f.write(saved)
+        interrupted_at = len(written_pages(sink_path))
+
+        await checkpointed_crawl(
+            site_url(server, page_path(0)), sink_path, checkpoint_path, resume=True,
+            concurrency=4, delay=(0.0, 0.05), checkpoint_every=5,
+        )
+        print(f"  interrupted after {interrupted_at} pages, resumed to {len(written_pages(sink_path))}")
+        return completeness_problems(written_pages(sink_path), {site_url(server, path) for path in paths})
+    finally:
+        server.shutdown()
+
+
+class FlakyHandler(DocSiteHandler):
+    """Answers 503 to the first request for every fifth page, and counts the errors sent"""
+
+    requested: set = set()
+    errors: Counter = Counter()
+    _flaky_lock = threading.Lock()
+
+    def do_GET(self):
+        path = self.path.lstrip("/")
+        with self._flaky_lock:
+            flaky = path not in self.requested and len(self.requested) % 5 == 0
+            self.requested.add(path)
+        if flaky:
+            self.send_error(503, "Service Unavailable")
+            return
+        super().do_GET()
+
+    def send_error(self, code, message=None, explain=None):
+        with self._flaky_lock:
+            self.errors[code] += 1
+        super().send_error(code, message, explain)
+
+
+async def check_backoff(workdir: str, pages: int) -> list[str]:
+    FlakyHandler.requested.clear()
+    FlakyHandler.errors.clear()
+    paths = generate_site(os.path.join(workdir, "site"), pages)
+    server = start_server(os.path.join(workdir, "site"), port=0, max_rps=10, handler=FlakyHandler)
+    sink_path = os.path.join(workdir, "pages.jsonl")
+    try:
+        await checkpointed_crawl(
+            site_url(server, page_path(0)), sink_path, os.path.join(workdir, "checkpoint.json"),
+            concurrency=8, delay=(0.05, 0.1), max_delay=10,
+        )
+    finally:
+        server.shutdown()
+
+    print(f"  server sent {FlakyHandler.errors[503]} x 503, {FlakyHandler.errors[429]} x 429")
+    problems = completeness_problems(written_pages(sink_path), {site_url(server, path) for path in paths})
+    error_pages = [url for url, markdown in iter_pages(sink_path) if "Service Unavailable" in markdown or "Too Many Requests" in markdown]
+    if error_pages:
+        problems.append(f"{len(error_pages)} error responses written as pages, e.g. {error_pages[0]}")
+    if not FlakyHandler.errors[503] or not FlakyHandler.errors[429]:
+        problems.append("the server never answered 503 and 429, so backoff was not exercised")
+    return problems
+
+
+async def check_recrawl(workdir: str, pages: int) -> list[str]:
+    site_dir = os.path.join(workdir, "site")
+    generate_site(site_dir, pages)
+    server = start_server(site_dir, port=0)
+    corpus_path = os.path.join(workdir, "pages.jsonl")
+    validators_path = os.path.join(workdir, "validators.json")
+    changes_path = os.path.join(workdir, "changes.json")
+    problems = []
+
+    def expect(what: str, got, expected):
+        if got != expected:
+            problems.append(f"{what}: expected {expected}, got {got}")
+
+    try:
+        await checkpointed_crawl(
+            site_url(server, page_path(0)), corpus_path, os.path.join(workdir, "checkpoint.json"), delay=(0.0, 0.0)
+        )
+        crawled = len(written_pages(corpus_path))
+
+        # No validators saved yet: everything is fetched and rendered, and nothing has changed
+        changes = await recrawl(corpus_path, validators_path, changes_path)
+        expect("first recrawl: rendered", changes["stats"]["rendered"], crawled)
+        expect("first recrawl: changed + added + removed", len(changes["changed"] + changes["added"] + changes["removed"]), 0)
+
+        changes = await recrawl(corpus_path, validators_path, changes_path)
+        expect("unchanged site: 304s", changes["stats"]["not_modified"], crawled)
+        expect("unchanged site: rendered", changes["stats"]["rendered"], 0)
+
+        server.handler.validators = "none"
+        changes = await recrawl(corpus_path, validators_path, changes_path)
+        expect("no validators: identical bodies", changes["stats"]["same_body"], crawled)
+        expect("no validators: rendered", changes["stats"]["rendered"], 0)
+
+        server.handler.validators = "both"
+        touched = mutate_site(site_dir, change=3, add=1, remove=1)
+        changes = await recrawl(corpus_path, validators_path, changes_path)
+        for kind in ("changed", "added", "removed"):
+            expect(f"after mutate_site: {kind}", changes[kind], sorted(site_url(server, path) for path in touched[kind]))
+        expect("after mutate_site: rendered", changes["stats"]["rendered"], len(touched["changed"]) + len(touched["added"]))
+        corpus = set(written_pages(corpus_path))
+        if not set(changes["added"]) <= corpus or set(changes["removed"]) & corpus:
+            problems.append("the corpus was not updated with the added and removed pages")
+        print(f"  {crawled} pages; then {len(touched['changed'])} changed, {len(touched['added'])} added, {len(touched['removed'])} removed")
+    finally:
+        server.shutdown()
+    return problems
+
+
+CHECKS = {
+    "resume": check_resume,
+    "backoff": check_backoff,
+    "recrawl": check_recrawl,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the crawler against a locally served test site")
+    parser.add_argument("--checks", default=",".join(CHECKS), help=f"Comma-separated: {', '.join(CHECKS)}")
+    parser.add_argument("--pages", type=int, default=60, help="Pages in each generated site")
+    parser.add_argument("--keep", action="store_true", help="Keep the working directory for inspection")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.checks.split(",") if name.strip()]
+    unknown = [name for name in names if name not in CHECKS]
+    if unknown:
+        parser.error(f"unknown checks: {', '.join(unknown)}")
+
+    workdir = tempfile.mkdtemp(prefix="check_crawler_")
+    failures = 0
+    try:
+        for name in names:
+            print(f"{name}:")
+            problems = asyncio.run(CHECKS[name](os.path.join(workdir, name), args.pages))
+            for problem in problems:
+                print(f"  FAIL {problem}")
+            if not problems:
+                print("  ok")
+            failures += bool(problems)
+    finally:
+        if args.keep:
+            print(f"Working directory kept: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{len(names) - failures}/{len(names)} checks passed")
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
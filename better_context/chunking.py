@@ -0,0 +1,124 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from chonkie import NeuralChunker, TokenChunker
+
+import tracing
+
+
+def make_chunker(kind: str = "token", chunk_size: int = 512, chunk_overlap: int = 128):
+    if kind == "neural":
+        return NeuralChunker(
+            model="mirth/chonky_modernbert_base_1",  # Default model
+            device_map="cpu",                        # Device to run the model on ('cpu', 'cuda', etc.)
+            min_characters_per_chunk=10,             # Minimum characters for a chunk
+        )
+
+    return TokenChunker(
+        tokenizer="word", # Default tokenizer (or use "gpt2", etc.)
+        chunk_size=chunk_size, # Maximum tokens per chunk
+        chunk_overlap=chunk_overlap # Overlap between chunks
+    )
+
+
+def chunk_text(chunker, text: str) -> list[str]:
+    with tracing.span("chunk.page") as attrs:
+        chunks = [chunk.text for chunk in chunker.chunk(text)]
+        attrs["chunks"] = len(chunks)
+    return chunks
+
+
+def split_at_spans(text: str, spans: list[dict], min_characters: int) -> list[str]:
+    """Cut `text` after each predicted split point, as NeuralChunker.chunk does.
+
+    Split points closer than `min_characters` to the previous one replace it, so no chunk is tiny.
+    """
+    ends = []
+    for span in spans:
+        if ends and span["start"] - ends[-1] < min_characters:
+            ends[-1] = span["end"]
+        else:
+            ends.append(span["end"])
+    chunks, current = [], 0
+    for end in ends:
+        chunks.append(text[current:end])
+        current = end
+    if current < len(text):
+        chunks.append(text[current:])
+    return chunks
+
+
+def chunk_texts(chunker, texts: list[str]) -> list[list[str]]:
+    """Chunk several pages. NeuralChunker's model sees all of them in batched pipeline calls."""
+    if not isinstance(chunker, NeuralChunker):
+        return [chunk_text(chunker, text) for text in texts]
+
+    with tracing.span("chunk.batch", pages=len(texts)) as attrs:
+        # chonkie runs the pipeline once per text, even from chunk_batch; batching it is up to us
+        non_empty = [text for text in texts if text.strip()]
+        all_spans = iter(chunker.pipe(non_empty, batch_size=len(non_empty)) if non_empty else [])
+        results = [
+            split_at_spans(text, next(all_spans), chunker.min_characters_per_chunk) if text.strip() else []
+            for text in texts
+        ]
+        attrs["chunks"] = sum(len(chunks) for chunks in results)
+    return results
+
+
+# Each pool worker builds its chunker once, in _init_worker
+_worker_chunker = None
+
+
+def _init_worker(kind: str):
+    global _worker_chunker
+    _worker_chunker = make_chunker(kind)
+
+
+def _chunk_batch(texts: list[str]) -> list[list[str]]:
+    return chunk_texts(_worker_chunker, texts)
+
+
+class ParallelChunker:
+    """Chunks pages across a process pool and yields results in input order.
+
+    Pages are sent to workers `batch_size` at a time, and at most `max_pending`
+    batches are in flight so memory stays bounded on large corpora.
+    With `workers=1` batches are chunked in-process.
+    """
+
+    def __init__(self, kind: str = "token", workers: int = 1, batch_size: int = 16, max_pending: int | None = None):
+        self.kind = kind
+        self.workers = workers or os.cpu_count()
+        self.batch_size = batch_size
+        self.max_pending = max_pending or self.workers * 2
+
+    def chunk_pages(self, pages):
+        """Yield (path, text, chunk_texts) for each (path, text) in `pages`."""
+        pages = iter(pages)
+        if self.workers == 1:
+            chunker = make_chunker(self.kind)
+            while batch := list(islice(pages, self.batch_size)):
+                for (path, text), chunks in zip(batch, chunk_texts(chunker, [text for _, text in batch])):
+                    yield path, text, chunks
+            return
+
+        pending = deque()
+        with ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker, initargs=(self.kind,)
+        ) as executor:
+            while True:
+                batch = list(islice(pages, self.batch_size))
+                if batch:
+                    future = executor.submit(_chunk_batch, [text for _, text in batch])
+                    pending.append((batch, future))
+
+                # Drain the oldest batch when the window is full, or everything once input runs out
+                while pending and (len(pending) >= self.max_pending or not batch):
+                    done_batch, future = pending.popleft()
+                    for (path, text), chunk_texts in zip(done_batch, future.result()):
+                        yield path, text, chunk_texts
+
+                if not batch:
+                    break
@@ -0,0 +1,106 @@
+import asyncio
+import os
+import sys
+import time
+
+import weaviate
+from weaviate.exceptions import (
+    WeaviateClosedClientError,
+    WeaviateConnectionError,
+    WeaviateGRPCUnavailableError,
+)
+
+CONNECTION_ERRORS = (
+    WeaviateClosedClientError,
+    WeaviateConnectionError,
+    WeaviateGRPCUnavailableError,
+)
+
+
+class SharedAsyncClient:
+    """One async Weaviate client shared by every tool call for the lifetime of the server.
+
+    The client is opened once, health-checked at most every `health_check_interval`
+    seconds, and replaced if the check (or a call) fails with a connection error.
+    """
+
+    def __init__(self, health_check_interval: float = 30.0):
+        self.health_check_interval = health_check_interval
+        self._client: weaviate.WeaviateAsyncClient | None = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _make_client(self) -> weaviate.WeaviateAsyncClient:
+        return weaviate.use_async_with_local(
+            headers={
+                "X-Cohere-Api-Key": os.getenv("COHERE_API_KEY")
+            },
+        )
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._client is not None
+            and time.monotonic() - self._checked_at < self.health_check_interval
+        )
+
+    async def connect(self):
+        """Open the client at startup. A failure here is logged and retried lazily on first use."""
+        try:
+            await self.get()
+        except CONNECTION_ERRORS as e:
+            print(f"Weaviate not reachable at startup, will retry on first call: {e}", file=sys.stderr)
+
+    async def get(self) -> weaviate.WeaviateAsyncClient:
+        if self._is_fresh():
+            return self._client
+
+        async with self._lock:
+            # Another caller may have reconnected while we waited for the lock
+            if self._is_fresh():
+                return self._client
+
+            if self._client is not None and await self._healthy(self._client):
+                self._checked_at = time.monotonic()
+                return self._client
+
+            await self._reconnect()
+            return self._client
+
+    async def _healthy(self, client: weaviate.WeaviateAsyncClient) -> bool:
+        try:
+            return client.is_connected() and await client.is_ready()
+        except CONNECTION_ERRORS:
+            return False
+
+    async def _reconnect(self):
+        if self._client is not None:
+            try:
+                await self._client.close()
+            except Exception:
+                pass
+            self._client = None
+
+        client = self._make_client()
+        await client.connect()
+        self._client = client
+        self._checked_at = time.monotonic()
+
+    def mark_unhealthy(self):
+        """Force a health check on the next `get()`."""
+        self._checked_at = 0.0
+
+    async def run(self, fn):
+        """Await `fn(client)`, reconnecting and retrying once on a connection error."""
+        client = await self.get()
+        try:
+            return await fn(client)
+        except CONNECTION_ERRORS:
+            self.mark_unhealthy()
+            client = await self.get()
+            return await fn(client)
+
+    async def close(self):
+        async with self._lock:
+            if self._client is not None:
+                await self._client.close()
+                self._client = None
@@ -0,0 +1,246 @@
+import argparse
+import json
+import mmap
+import os
+import shutil
+
+
+CRAWL_JSON_PATH = "./output/weaviate_docs_crawl4ai.json"
+CRAWL_JSONL_PATH = "./output/weaviate_docs_crawl4ai.jsonl"
+CRAWL_SHARDED_PATH = "./output/weaviate_docs_corpus"
+
+
+def iter_pages(path: str, url_filter: str | None = None):
+    """Yield (url, markdown) pairs from a crawl dump, optionally only URLs containing `url_filter`.
+
+    A directory is read as a sharded corpus, where the filter is applied to the
+    index so skipped pages are never read. `.jsonl` dumps are read one line at a
+    time; `.json` dumps (a single url -> markdown object) have to be loaded whole.
+    """
+    if os.path.isdir(path):
+        with ShardedCorpus(path) as corpus:
+            yield from corpus.iter_pages(url_filter)
+        return
+
+    if path.endswith(".jsonl"):
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    page = json.loads(line)
+                    if url_filter is None or url_filter in page["url"]:
+                        yield page["url"], page["markdown"]
+    else:
+        with open(path, "r") as f:
+            for url, markdown in json.load(f).items():
+                if url_filter is None or url_filter in url:
+                    yield url, markdown
+
+
+def sink_urls(path: str) -> set[str]:
+    """URLs already written to a JSONL or sharded sink, without reading the markdown of sharded ones."""
+    if not os.path.exists(path):
+        return set()
+    if os.path.isdir(path):
+        if not os.path.exists(os.path.join(path, INDEX_FILE)):
+            return set()
+        with ShardedCorpus(path) as corpus:
+            return set(corpus.urls())
+    return {url for url, _ in iter_pages(path)}
+
+
+def open_sink(path: str, append: bool = False):
+    """A page writer for `path`: JSONL for `.jsonl` files, otherwise a sharded corpus directory."""
+    if path.endswith(".jsonl"):
+        return JsonlSink(path, append=append)
+    return ShardedCorpusWriter(path, append=append)
+
+
+class JsonlSink:
+    """Append-only JSONL writer, flushed per page so a crash loses at most one line."""
+
+    def __init__(self, path: str, append: bool = False):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._f = open(path, "a" if append else "w")
+        self.count = 0
+
+    def write(self, url: str, markdown: str):
+        self._f.write(json.dumps({"url": url, "markdown": markdown}) + "\n")
+        self._f.flush()
+        self.count += 1
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Sharded corpus layout:
+#   index.jsonl        one {"url", "shard", "offset", "length"} line per page
+#   shard-00000.md     page markdown, utf-8, concatenated back to back
+# Readers load only the index and memory-map shards, so a page is sliced out
+# on demand instead of parsing the whole crawl.
+INDEX_FILE = "index.jsonl"
+
+
+def _shard_path(directory: str, shard: int) -> str:
+    return os.path.join(directory, f"shard-{shard:05d}.md")
+
+
+class ShardedCorpusWriter:
+    """Streams pages into size-bounded shards plus an offset index."""
+
+    def __init__(self, directory: str, shard_size: int = 64 * 1024 * 1024, append: bool = False):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.shard_size = shard_size
+        self.count = 0
+
+        index_path = os.path.join(directory, INDEX_FILE)
+        self.shard = 0
+        if append and os.path.exists(index_path):
+            with open(index_path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        self.shard = max(self.shard, json.loads(line)["shard"])
+        else:
+            for name in os.listdir(directory):
+                if name.startswith("shard-") or name == INDEX_FILE:
+                    os.remove(os.path.join(directory, name))
+
+        self._index = open(index_path, "a")
+        self._shard_f = open(_shard_path(directory, self.shard), "ab")
+
+    def write(self, url: str, markdown: str):
+        data = markdown.encode("utf-8")
+        if self._shard_f.tell() and self._shard_f.tell() + len(data) > self.shard_size:
+            self._shard_f.close()
+            self.shard += 1
+            self._shard_f = open(_shard_path(self.directory, self.shard), "ab")
+
+        offset = self._shard_f.tell()
+        self._shard_f.write(data)
+        self._shard_f.flush()
+        # Index line goes last, so a crash never leaves an entry pointing past the shard end
+        self._index.write(json.dumps({"url": url, "shard": self.shard, "offset": offset, "length": len(data)}) + "\n")
+        self._index.flush()
+        self.count += 1
+
+    def close(self):
+        self._shard_f.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ShardedCorpus:
+    """Lazy, random-access reader for a sharded corpus directory."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._entries: dict[str, tuple[int, int, int]] = {}
+        with open(os.path.join(directory, INDEX_FILE), "r") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    # Later writes of the same URL win
+                    self._entries[entry["url"]] = (entry["shard"], entry["offset"], entry["length"])
+        self._files = {}
+        self._maps = {}
+
+    def _map(self, shard: int) -> mmap.mmap:
+        if shard not in self._maps:
+            f = open(_shard_path(self.directory, shard), "rb")
+            self._files[shard] = f
+            self._maps[shard] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._maps[shard]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._entries
+
+    def __getitem__(self, url: str) -> str:
+        shard, offset, length = self._entries[url]
+        if length == 0:
+            return ""
+        return self._map(shard)[offset:offset + length].decode("utf-8")
+
+    def urls(self, url_filter: str | None = None, prefix: str | None = None) -> list[str]:
+        return [
+            url for url in self._entries
+            if (url_filter is None or url_filter in url) and (prefix is None or url.startswith(prefix))
+        ]
+
+    def iter_pages(self, url_filter: str | None = None, prefix: str | None = None):
+        for url in self.urls(url_filter, prefix):
+            yield url, self[url]
+
+    def close(self):
+        for m in self._maps.values():
+            m.close()
+        for f in self._files.values():
+            f.close()
+        self._maps, self._files = {}, {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def update_corpus(path: str, updates: dict[str, str], removed: set[str]):
+    """Rewrite a crawl dump with pages replaced or added from `updates` and `removed` pages dropped."""
+    if not os.path.isdir(path) and not path.endswith(".jsonl"):
+        with open(path, "r") as f:
+            pages = json.load(f)
+        for url in removed:
+            pages.pop(url, None)
+        pages.update(updates)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(pages, f)
+        os.replace(f"{path}.tmp", path)
+        return
+
+    tmp_path = f"{path.rstrip('/')}.tmp" + (".jsonl" if path.endswith(".jsonl") else "")
+    with open_sink(tmp_path) as sink:
+        for url, markdown in iter_pages(path):
+            if url not in removed and url not in updates:
+                sink.write(url, markdown)
+        for url, markdown in updates.items():
+            sink.write(url, markdown)
+
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+
+
+def convert(source: str, destination: str, shard_size: int):
+    """Rewrite any crawl dump (.json, .jsonl or sharded) as a sharded corpus."""
+    with ShardedCorpusWriter(destination, shard_size=shard_size) as writer:
+        for url, markdown in iter_pages(source):
+            writer.write(url, markdown)
+    print(f"Wrote {writer.count} pages to {destination} ({writer.shard + 1} shards)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl corpus tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = subparsers.add_parser("convert", help="Convert a JSON/JSONL crawl dump into a sharded corpus")
+    convert_parser.add_argument("source", nargs="?", default=CRAWL_JSON_PATH)
+    convert_parser.add_argument("destination", nargs="?", default=CRAWL_SHARDED_PATH)
+    convert_parser.add_argument("--shard-size-mb", type=int, default=64)
+
+    args = parser.parse_args()
+    if args.command == "convert":
+        convert(args.source, args.destination, args.shard_size_mb * 1024 * 1024)
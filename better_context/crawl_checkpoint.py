@@ -0,0 +1,167 @@
+import json
+import os
+import time
+from collections import deque
+from urllib.parse import urldefrag, urlparse
+
+from crawl4ai import AsyncWebCrawler, RateLimiter, SemaphoreDispatcher
+
+from corpus import open_sink, sink_urls
+from crawling import make_page_config
+import tracing
+
+
+CHECKPOINT_PATH = "./output/crawl_checkpoint.json"
+
+
+def normalize_url(url: str) -> str:
+    return urldefrag(url)[0]
+
+
+class CrawlCheckpoint:
+    """BFS crawl state: the frontier still to crawl and every URL ever queued.
+
+    URLs being crawled are saved as part of the frontier, so a crash re-crawls
+    at most the pages since the last save and never loses links discovered
+    from them.
+    """
+
+    def __init__(self, path: str = CHECKPOINT_PATH):
+        self.path = path
+        self.start_url: str | None = None
+        self.frontier: deque[tuple[str, int]] = deque()  # (url, depth)
+        self.in_flight: dict[str, int] = {}  # url -> depth, for the BFS level being crawled
+        self.seen: set[str] = set()
+        self.crawled = 0
+        self.failed: dict[str, str] = {}
+
+    @classmethod
+    def load(cls, path: str = CHECKPOINT_PATH) -> "CrawlCheckpoint":
+        checkpoint = cls(path)
+        with open(path, "r") as f:
+            data = json.load(f)
+        checkpoint.start_url = data["start_url"]
+        checkpoint.frontier = deque((url, depth) for url, depth in data["frontier"])
+        checkpoint.seen = set(data["seen"])
+        checkpoint.crawled = data["crawled"]
+        checkpoint.failed = data["failed"]
+        return checkpoint
+
+    def start(self, start_url: str):
+        self.start_url = start_url
+        self.frontier = deque([(normalize_url(start_url), 0)])
+        self.seen = {normalize_url(start_url)}
+
+    def enqueue(self, url: str, depth: int) -> bool:
+        url = normalize_url(url)
+        if url in self.seen:
+            return False
+        self.seen.add(url)
+        self.frontier.append((url, depth))
+        return True
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "start_url": self.start_url,
+                "frontier": list(self.in_flight.items()) + list(self.frontier),
+                "seen": sorted(self.seen),
+                "crawled": self.crawled,
+                "failed": self.failed,
+            }, f)
+        os.replace(tmp_path, self.path)
+
+
+def internal_links(result, allowed_domains: list[str]) -> list[str]:
+    links = []
+    for link in (result.links or {}).get("internal", []):
+        href = link.get("href") if isinstance(link, dict) else link
+        if href and urlparse(href).scheme in ("http", "https") and urlparse(href).hostname in allowed_domains:
+            links.append(href)
+    return links
+
+
+async def checkpointed_crawl(
+    start_url: str,
+    sink_path: str,
+    checkpoint_path: str = CHECKPOINT_PATH,
+    resume: bool = False,
+    allowed_domains: list[str] | None = None,
+    max_depth: int = 4,
+    concurrency: int = 8,
+    delay: tuple[float, float] = (0.5, 1.5),
+    max_delay: float = 60.0,
+    checkpoint_every: int = 25,
+):
+    """BFS crawl that writes pages as they arrive and checkpoints the frontier to disk.
+
+    Runs one BFS level at a time through crawl4ai's dispatcher: `concurrency` pages
+    in flight, and a per-host RateLimiter waiting `delay` seconds (random in range)
+    between requests to a host, backing off up to `max_delay` on 429/503.
+    """
+    allowed_domains = allowed_domains or [urlparse(start_url).hostname]
+    if resume and os.path.exists(checkpoint_path):
+        checkpoint = CrawlCheckpoint.load(checkpoint_path)
+        # Pages crawled after the last save are in the sink already; they are re-crawled for their links only
+        written = sink_urls(sink_path)
+        print(f"Resuming: {checkpoint.crawled} pages done, {len(checkpoint.frontier)} queued, {len(written)} in {sink_path}")
+    else:
+        checkpoint = CrawlCheckpoint(checkpoint_path)
+        checkpoint.start(start_url)
+        written = set()
+
+    dispatcher = SemaphoreDispatcher(
+        semaphore_count=concurrency,
+        rate_limiter=RateLimiter(base_delay=delay, max_delay=max_delay, max_retries=3, rate_limit_codes=[429, 503]),
+    )
+    started = time.monotonic()
+    crawled_this_run = 0
+    since_save = 0
+
+    with open_sink(sink_path, append=bool(written)) as sink:
+        async with AsyncWebCrawler() as crawler:
+            try:
+                while checkpoint.frontier:
+                    # Crawl the current BFS level; links found go to the (now empty) frontier
+                    checkpoint.in_flight = dict(checkpoint.frontier)
+                    checkpoint.frontier.clear()
+                    with tracing.span("crawl.level", pages=len(checkpoint.in_flight)):
+                        async for result in await crawler.arun_many(
+                            list(checkpoint.in_flight), config=make_page_config(stream=True), dispatcher=dispatcher
+                        ):
+                            tracing.count("crawl.pages", result="ok" if result.success else "failed")
+                            url = normalize_url(result.url)
+                            depth = checkpoint.in_flight.pop(url, max_depth)
+                            if result.success:
+                                if url not in written:
+                                    sink.write(url, str(result.markdown))
+                                    written.add(url)
+                                if depth < max_depth:
+                                    for link in internal_links(result, allowed_domains):
+                                        checkpoint.enqueue(link, depth + 1)
+                            else:
+                                checkpoint.failed[url] = result.error_message or f"status {result.status_code}"
+
+                            checkpoint.crawled += 1
+                            crawled_this_run += 1
+                            since_save += 1
+                            if since_save >= checkpoint_every:
+                                checkpoint.save()
+                                since_save = 0
+                                print(
+                                    f"{checkpoint.crawled} pages crawled, "
+                                    f"{len(checkpoint.in_flight) + len(checkpoint.frontier)} queued, "
+                                    f"{len(checkpoint.failed)} failed, "
+                                    f"{crawled_this_run / (time.monotonic() - started):.1f} pages/s"
+                                )
+
+                    # Anything the dispatcher never returned a result for is not retried forever
+                    for url in checkpoint.in_flight:
+                        checkpoint.failed[url] = "no result"
+                    checkpoint.in_flight = {}
+            finally:
+                checkpoint.save()
+
+    print(f"Crawled {checkpoint.crawled} pages ({len(written)} written, {len(checkpoint.failed)} failed); checkpoint {checkpoint_path}")
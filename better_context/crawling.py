@@ -0,0 +1,49 @@
+from crawl4ai import AsyncWebCrawler, CrawlerRunConfig, BFSDeepCrawlStrategy, LXMLWebScrapingStrategy, DomainFilter, FilterChain, CacheMode
+
+import tracing
+
+
+START_URL = "https://docs.weaviate.io/weaviate"
+ALLOWED_DOMAINS = ["docs.weaviate.io"]
+
+
+MAX_DEPTH = 4
+
+
+def make_crawl_config(stream: bool = False, max_depth: int = MAX_DEPTH) -> CrawlerRunConfig:
+    domain_filter = DomainFilter(allowed_domains=ALLOWED_DOMAINS)
+    return CrawlerRunConfig(
+        deep_crawl_strategy=BFSDeepCrawlStrategy(
+            max_depth=max_depth,
+            include_external=False,
+            filter_chain=FilterChain([domain_filter]),
+        ),
+        scraping_strategy=LXMLWebScrapingStrategy(),
+        verbose=True,
+        cache_mode=CacheMode.ENABLED,
+        stream=stream,
+    )
+
+
+def make_page_config(stream: bool = True, cache_mode: CacheMode = CacheMode.ENABLED) -> CrawlerRunConfig:
+    """Same scraping settings as the deep crawl, for crawling explicit URL lists"""
+    return CrawlerRunConfig(
+        scraping_strategy=LXMLWebScrapingStrategy(),
+        verbose=False,
+        cache_mode=cache_mode,
+        stream=stream,
+    )
+
+
+async def stream_pages(start_url: str = START_URL, max_depth: int = MAX_DEPTH, failed: set | None = None):
+    """Yield (url, markdown) for each page as soon as the deep crawl produces it.
+
+    URLs that could not be crawled are added to `failed`, if given.
+    """
+    async with AsyncWebCrawler() as crawler:
+        async for result in await crawler.arun(start_url, config=make_crawl_config(stream=True, max_depth=max_depth)):
+            tracing.count("crawl.pages", result="ok" if result.success else "failed")
+            if result.success:
+                yield result.url, str(result.markdown)
+            elif failed is not None:
+                failed.add(result.url)
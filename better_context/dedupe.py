@@ -0,0 +1,191 @@
+# Pre-index deduplication for `2_index_docs.py --dedupe`.
+#
+# 1. Boilerplate: markdown blocks (paragraphs, lists, code fences, ...) that appear on
+#    many pages - navigation, sidebars, footers, "see also" boxes - are stripped from
+#    every page before chunking.
+# 2. Near-duplicate chunks: each chunk gets a MinHash signature over word shingles,
+#    and LSH banding finds earlier chunks it likely overlaps. A chunk whose estimated
+#    Jaccard similarity with an indexed chunk reaches the threshold is not indexed;
+#    its page is recorded in that chunk's `alt_paths` instead.
+import hashlib
+import re
+import zlib
+from collections import Counter, defaultdict
+
+import numpy as np
+from weaviate.classes.query import Filter
+
+from result_format import approx_tokens
+
+
+def split_blocks(text: str) -> list[str]:
+    """Blank-line separated blocks, keeping fenced code blocks whole"""
+    blocks, current, in_fence = [], [], False
+    for line in text.split("\n"):
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        if not line.strip() and not in_fence:
+            if current:
+                blocks.append("\n".join(current))
+                current = []
+            continue
+        current.append(line)
+    if current:
+        blocks.append("\n".join(current))
+    return blocks
+
+
+def block_key(block: str) -> bytes:
+    return hashlib.blake2b(" ".join(block.split()).lower().encode("utf-8"), digest_size=8).digest()
+
+
+class BoilerplateStripper:
+    """Finds blocks repeated across pages in a first pass over the corpus, then strips them.
+
+    A block is boilerplate if it occurs on at least `min_fraction` of pages (and on at
+    least `min_pages` pages, so small corpora keep their content).
+    """
+
+    def __init__(self, min_fraction: float = 0.2, min_pages: int = 5):
+        self.min_fraction = min_fraction
+        self.min_pages = min_pages
+        self.boilerplate: set[bytes] = set()
+        self.pages_seen = 0
+        self.blocks_stripped = 0
+        self.tokens_stripped = 0
+
+    def fit(self, pages) -> int:
+        """Count in how many pages each block occurs. Returns the number of boilerplate blocks."""
+        counts = Counter()
+        for _, text in pages:
+            self.pages_seen += 1
+            counts.update({block_key(block) for block in split_blocks(text)})
+        cutoff = max(self.min_pages, self.min_fraction * self.pages_seen)
+        self.boilerplate = {key for key, n in counts.items() if n >= cutoff}
+        return len(self.boilerplate)
+
+    def strip(self, text: str) -> str:
+        kept = []
+        for block in split_blocks(text):
+            if block_key(block) in self.boilerplate:
+                self.blocks_stripped += 1
+                self.tokens_stripped += approx_tokens(block)
+            else:
+                kept.append(block)
+        return "\n\n".join(kept)
+
+    def strip_pages(self, pages):
+        for path, text in pages:
+            yield path, self.strip(text)
+
+
+# A prime above 2**32, so (a * h + b) with 32-bit shingle hashes and a < 2**31 fits in uint64
+_PRIME = np.uint64(4294967311)
+
+
+class NearDuplicateIndex:
+    """MinHash + LSH over word shingles; the first chunk of each near-duplicate group is canonical.
+
+    With `bands` x `rows` = `num_perm`, pairs above roughly (1/bands) ** (1/rows) Jaccard
+    become candidates; candidates are then confirmed by signature agreement >= `threshold`.
+    """
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 64, bands: int = 16, shingle_size: int = 5, seed: int = 1):
+        assert num_perm % bands == 0, "num_perm must be a multiple of bands"
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2**31, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 2**32, size=num_perm, dtype=np.uint64)
+        self._buckets: list[dict[bytes, list]] = [defaultdict(list) for _ in range(bands)]
+        self._signatures: dict = {}
+
+    def signature(self, text: str) -> np.ndarray:
+        words = re.findall(r"\w+", text.lower())
+        n = self.shingle_size
+        shingles = {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        return ((np.outer(hashes, self._a) + self._b) % _PRIME).min(axis=0)
+
+    def find_or_add(self, key, text: str):
+        """Key of an indexed near-duplicate of `text`, or None after adding it as a new canonical chunk"""
+        signature = self.signature(text)
+        band_keys = [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+        checked = set()
+        for band, band_key in enumerate(band_keys):
+            for candidate in self._buckets[band].get(band_key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                if np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                    return candidate
+
+        self._signatures[key] = signature
+        for band, band_key in enumerate(band_keys):
+            self._buckets[band][band_key].append(key)
+        return None
+
+
+class ChunkDeduplicator:
+    """Drops near-duplicate chunk objects before they are embedded and inserted.
+
+    `filter()` takes the objects for one page and returns the ones to index; the
+    paths of dropped duplicates are collected per canonical chunk uuid in `alt_paths`.
+    """
+
+    def __init__(self, threshold: float = 0.85):
+        self.index = NearDuplicateIndex(threshold=threshold)
+        self.alt_paths: dict = defaultdict(list)  # canonical uuid -> other paths with the same chunk
+        self.canonical_paths = {}
+        self.dropped_uuids = []
+        self.chunks_seen = 0
+        self.chunks_dropped = 0
+        self.tokens_dropped = 0
+
+    def filter(self, objects: list[dict]) -> tuple[list[dict], list[dict]]:
+        """Split one page's objects into (to index, dropped as duplicates)"""
+        kept, dropped = [], []
+        for obj in objects:
+            self.chunks_seen += 1
+            properties = obj["properties"]
+            canonical = self.index.find_or_add(obj["uuid"], properties["chunk"])
+            if canonical is None:
+                self.canonical_paths[obj["uuid"]] = properties["path"]
+                kept.append(obj)
+                continue
+            if properties["path"] not in (self.canonical_paths[canonical], *self.alt_paths.get(canonical, ())):
+                self.alt_paths[canonical].append(properties["path"])
+            self.dropped_uuids.append(obj["uuid"])
+            self.chunks_dropped += 1
+            self.tokens_dropped += approx_tokens(properties["chunk"])
+            dropped.append(obj)
+        return kept, dropped
+
+
+def write_alt_paths(chunks, deduplicator: ChunkDeduplicator, batch_size: int = 1000) -> int:
+    """Record duplicate paths on their canonical chunks, and delete duplicates left by earlier runs.
+    Returns the number of canonical chunks that could not be updated."""
+    for start in range(0, len(deduplicator.dropped_uuids), batch_size):
+        chunks.data.delete_many(where=Filter.by_id().contains_any(deduplicator.dropped_uuids[start:start + batch_size]))
+
+    failed = 0
+    for uuid, paths in deduplicator.alt_paths.items():
+        try:
+            chunks.data.update(uuid=uuid, properties={"alt_paths": paths})
+        except Exception as e:
+            # e.g. the canonical chunk itself failed to insert
+            print(f"Could not record alt_paths on {uuid}: {e}")
+            failed += 1
+    return failed
+
+
+def dedupe_summary(stripper: BoilerplateStripper, deduplicator: ChunkDeduplicator) -> str:
+    return (
+        f"Dedupe: {len(stripper.boilerplate)} boilerplate blocks (on >= {stripper.min_fraction:.0%} of "
+        f"{stripper.pages_seen} pages) stripped {stripper.blocks_stripped} times, ~{stripper.tokens_stripped} tokens; "
+        f"{deduplicator.chunks_dropped} of {deduplicator.chunks_seen} chunks were near-duplicates, "
+        f"~{deduplicator.tokens_dropped} tokens not embedded, recorded as alt_paths on {len(deduplicator.alt_paths)} chunks"
+    )
@@ -0,0 +1,259 @@
+import re
+from datetime import datetime, timezone
+
+import weaviate
+from weaviate.classes.config import Configure, Property, DataType, Tokenization
+from weaviate.classes.query import Filter
+from weaviate.exceptions import WeaviateBaseError
+from weaviate.util import generate_uuid5
+
+from index_profiles import DEFAULT_PROFILE, IndexProfile
+from manifest import IndexManifest, content_hash
+
+
+CHUNKS_COLLECTION = "Chunks"
+
+# Properties Weaviate vectorizes for each chunk, also used to build cache keys for precomputed vectors
+VECTORIZED_PROPERTIES = ["chunk", "path"]
+
+# Only pages under this URL part are indexed
+DOCS_PATH_FILTER = "docs.weaviate.io/weaviate"
+
+# One object per indexed collection, bumped whenever the indexer writes to it
+GENERATION_COLLECTION = "IndexGeneration"
+GENERATION_UUID = generate_uuid5(GENERATION_COLLECTION, CHUNKS_COLLECTION)
+
+
+def _ensure_generation_collection(client: weaviate.WeaviateClient):
+    if not client.collections.exists(GENERATION_COLLECTION):
+        client.collections.create(
+            name=GENERATION_COLLECTION,
+            properties=[
+                Property(name="collection", data_type=DataType.TEXT),
+                Property(name="generation", data_type=DataType.INT),
+                Property(name="updated_at", data_type=DataType.DATE),
+            ],
+            vector_config=Configure.Vectors.self_provided(),
+        )
+    return client.collections.use(GENERATION_COLLECTION)
+
+
+def bump_generation(client: weaviate.WeaviateClient) -> int:
+    """Record that a new generation of the Chunks index has been written."""
+    generations = _ensure_generation_collection(client)
+
+    current = generations.query.fetch_object_by_id(GENERATION_UUID)
+    generation = (current.properties["generation"] + 1) if current else 1
+
+    properties = {
+        "collection": CHUNKS_COLLECTION,
+        "generation": generation,
+        "updated_at": datetime.now(timezone.utc),
+    }
+    if current:
+        generations.data.replace(uuid=GENERATION_UUID, properties=properties)
+    else:
+        generations.data.insert(properties=properties, uuid=GENERATION_UUID)
+    return generation
+
+
+async def get_generation(client: weaviate.WeaviateAsyncClient) -> int | None:
+    """Current generation of the Chunks index, or None if it has never been stamped."""
+    if not await client.collections.exists(GENERATION_COLLECTION):
+        return None
+    generations = client.collections.use(GENERATION_COLLECTION)
+    current = await generations.query.fetch_object_by_id(GENERATION_UUID)
+    return current.properties["generation"] if current else None
+
+
+def chunks_target(client: weaviate.WeaviateClient) -> str | None:
+    """Collection behind the Chunks alias; "Chunks" itself for a collection created before aliases; None if neither exists."""
+    alias = client.alias.get(alias_name=CHUNKS_COLLECTION)
+    if alias is not None:
+        return alias.collection
+    return CHUNKS_COLLECTION if client.collections.exists(CHUNKS_COLLECTION) else None
+
+
+def chunks_versions(client: weaviate.WeaviateClient) -> list[str]:
+    """Versioned Chunks collections (Chunks_v1, Chunks_v2, ...), oldest first"""
+    versions = [name for name in client.collections.list_all(simple=True) if re.fullmatch(rf"{CHUNKS_COLLECTION}_v\d+", name)]
+    return sorted(versions, key=lambda name: int(name.rsplit("_v", 1)[1]))
+
+
+def next_chunks_version(client: weaviate.WeaviateClient) -> str:
+    versions = chunks_versions(client)
+    return f"{CHUNKS_COLLECTION}_v{int(versions[-1].rsplit('_v', 1)[1]) + 1 if versions else 1}"
+
+
+def ensure_chunks_collection(client: weaviate.WeaviateClient, profile: IndexProfile | None = None) -> bool:
+    """Create the Chunks collection if needed. Returns True if it was just created.
+
+    It is created as a versioned collection behind a "Chunks" alias, so migrate_index.py
+    can later switch the alias to a rebuilt collection without downtime.
+    """
+    if chunks_target(client) is not None:
+        return False
+
+    name = next_chunks_version(client)
+    create_chunks_collection(client, name, profile or IndexProfile.parse(DEFAULT_PROFILE))
+    client.alias.create(alias_name=CHUNKS_COLLECTION, target_collection=name)
+    return True
+
+
+def create_chunks_collection(client: weaviate.WeaviateClient, name: str, profile: IndexProfile):
+    try:
+        return _create_chunks_collection(client, name, profile)
+    except WeaviateBaseError as e:
+        if profile.index != "dynamic":
+            raise
+        raise RuntimeError(
+            f"Could not create {name} with the {profile.name} profile: dynamic indexes need ASYNC_INDEXING=true "
+            f"on the Weaviate server (set in docker-compose.yml). Server said: {e}"
+        ) from e
+
+
+def _create_chunks_collection(client: weaviate.WeaviateClient, name: str, profile: IndexProfile):
+    return client.collections.create(
+        name=name,
+        properties=[
+            Property(name="chunk", data_type=DataType.TEXT),
+            Property(name="chunk_no", data_type=DataType.INT),
+            Property(name="path", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
+            # Other pages with a near-duplicate of this chunk, which is indexed once (2_index_docs.py --dedupe)
+            Property(name="alt_paths", data_type=DataType.TEXT_ARRAY, tokenization=Tokenization.FIELD),
+        ],
+        vector_config=Configure.Vectors.text2vec_cohere(
+            model="embed-v4.0",
+            source_properties=VECTORIZED_PROPERTIES,
+            vector_index_config=profile.vector_index_config(),
+        )
+    )
+
+
+def ensure_alt_paths_property(client: weaviate.WeaviateClient):
+    """Add `alt_paths` to a Chunks collection created before deduplication existed"""
+    # Schema changes go to the collection itself, not the alias
+    chunks = client.collections.use(chunks_target(client))
+    if not any(p.name == "alt_paths" for p in chunks.config.get().properties):
+        chunks.config.add_property(
+            Property(name="alt_paths", data_type=DataType.TEXT_ARRAY, tokenization=Tokenization.FIELD)
+        )
+
+
+def chunk_uuid(path: str, chunk_no: int):
+    return generate_uuid5(CHUNKS_COLLECTION, f"{path}-{chunk_no}")
+
+
+def vectorized_text(properties: dict) -> str:
+    return "\n".join(str(properties[name]) for name in VECTORIZED_PROPERTIES)
+
+
+def delete_chunks(chunks, path: str, from_chunk_no: int = 0):
+    where = Filter.by_property("path").equal(path)
+    if from_chunk_no:
+        where = where & Filter.by_property("chunk_no").greater_or_equal(from_chunk_no)
+    chunks.data.delete_many(where=where)
+
+
+class ChunkIndexer:
+    """Decides which chunks of each page need writing, and cleans up after a run.
+
+    Callers check `is_unchanged()` before chunking a page, send the objects from
+    `objects_for_page()` to a batcher, then call `finish()` once the batcher is done.
+    """
+
+    def __init__(self, chunks, manifest: IndexManifest, incremental: bool = False):
+        self.chunks = chunks
+        self.manifest = manifest
+        self.incremental = incremental
+        self.seen_paths = set()
+        self.shrunk_pages = {}  # path -> first chunk_no that no longer exists
+        self.removed_paths = set()
+        self.stats = {"pages_skipped": 0, "pages_indexed": 0, "chunks_sent": 0, "chunks_skipped": 0, "chunks_deduped": 0}
+
+    def is_unchanged(self, path: str, text: str) -> bool:
+        self.seen_paths.add(path)
+        previous = self.manifest.page(path)
+        if self.incremental and previous and previous["hash"] == content_hash(text) and not previous.get("failed"):
+            self.stats["pages_skipped"] += 1
+            return True
+        return False
+
+    def objects_for_page(self, path: str, text: str, chunk_texts: list[str]) -> list[dict]:
+        chunk_hashes = [content_hash(chunk_text) for chunk_text in chunk_texts]
+        previous = self.manifest.page(path)
+        previous_hashes = previous["chunks"] if previous else []
+        previous_failed = previous.get("failed", ()) if previous else ()
+
+        objects = []
+        for i, chunk_text in enumerate(chunk_texts):
+            # Same path and chunk_no means same uuid, so an unchanged chunk is already in place
+            if self.incremental and i < len(previous_hashes) and previous_hashes[i] == chunk_hashes[i] and i not in previous_failed:
+                self.stats["chunks_skipped"] += 1
+                continue
+            objects.append({
+                "properties": {
+                    "chunk": chunk_text,
+                    "chunk_no": i,
+                    "path": path
+                },
+                "uuid": chunk_uuid(path, i),
+            })
+
+        if len(chunk_texts) < len(previous_hashes):
+            self.shrunk_pages[path] = len(chunk_texts)
+        self.manifest.set_page(path, content_hash(text), chunk_hashes)
+        self.stats["pages_indexed"] += 1
+        self.stats["chunks_sent"] += len(objects)
+        return objects
+
+    def skip_chunks(self, path: str, chunk_nos: list[int]):
+        """Chunks of a page that were not written (near-duplicates indexed under another page).
+
+        The manifest only describes what is in the collection, so their hashes and the page
+        hash are cleared: a later run without --dedupe re-chunks the page and writes them.
+        """
+        if not chunk_nos:
+            return
+        page = self.manifest.page(path)
+        page["hash"] = ""
+        for chunk_no in chunk_nos:
+            page["chunks"][chunk_no] = ""
+        self.stats["chunks_sent"] -= len(chunk_nos)
+        self.stats["chunks_deduped"] += len(chunk_nos)
+
+    def keep_pages(self, paths):
+        """Pages that could not be read this run: not treated as missing, their chunks stay as they are"""
+        self.seen_paths.update(paths)
+
+    def remove_pages(self, paths):
+        """Delete every chunk of pages that no longer exist"""
+        for path in paths:
+            delete_chunks(self.chunks, path)
+            self.manifest.remove(path)
+            self.removed_paths.add(path)
+
+    def finish(self, failed_objects, remove_missing: bool = True) -> bool:
+        """Trim shrunk pages, drop removed pages and save the manifest. Returns True if the index changed."""
+        # Mark chunks that failed to insert, so the next run or a --resume replay writes them
+        for failed in failed_objects:
+            self.manifest.mark_failed(failed.object_.properties["path"], failed.object_.properties["chunk_no"])
+        if failed_objects:
+            print(f"{len(failed_objects)} chunks failed to insert")
+
+        for path, first_orphan in self.shrunk_pages.items():
+            delete_chunks(self.chunks, path, from_chunk_no=first_orphan)
+
+        if remove_missing:
+            self.remove_pages(self.manifest.paths() - self.seen_paths)
+
+        self.manifest.save()
+        return bool(self.stats["chunks_sent"] or self.shrunk_pages or self.removed_paths)
+
+    def summary(self) -> str:
+        return (
+            f"Indexed {self.stats['pages_indexed']} pages ({self.stats['chunks_sent']} chunks sent, "
+            f"{self.stats['chunks_skipped']} unchanged), skipped {self.stats['pages_skipped']} unchanged pages, "
+            f"trimmed {len(self.shrunk_pages)} pages, removed {len(self.removed_paths)} pages"
+            + (f", {self.stats['chunks_deduped']} near-duplicate chunks not written" if self.stats["chunks_deduped"] else "")
+        )
@@ -0,0 +1,251 @@
+import array
+import hashlib
+import json
+import mmap
+import os
+import re
+
+import httpx
+
+import tracing
+
+
+class CohereEmbedder:
+    """Calls the Cohere embed API directly, so vectors can be computed (and cached) before insert."""
+
+    def __init__(self, model: str = "embed-v4.0", input_type: str = "search_document", batch_size: int = 96):
+        self.model = model
+        self.input_type = input_type
+        self.batch_size = batch_size
+        self._http = httpx.Client(
+            base_url="https://api.cohere.com",
+            headers={"Authorization": f"Bearer {os.getenv('COHERE_API_KEY')}"},
+            timeout=60.0,
+        )
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            with tracing.span("embed.request", model=self.model, texts=len(texts[start:start + self.batch_size])):
+                response = self._http.post(
+                    "/v2/embed",
+                    json={
+                        "model": self.model,
+                        "texts": texts[start:start + self.batch_size],
+                        "input_type": self.input_type,
+                        "embedding_types": ["float"],
+                    },
+                )
+                response.raise_for_status()
+            vectors.extend(response.json()["embeddings"]["float"])
+        return vectors
+
+
+class HashEmbedder:
+    """Deterministic local stand-in for tests and benchmarks: hashed bag of words, L2-normalised.
+
+    Similar texts share tokens and so get similar vectors, which is enough to exercise
+    retrieval end to end without an API key. Not a substitute for a real model.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.model = f"hash-{dim}"
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        vectors = []
+        for text in texts:
+            vector = [0.0] * self.dim
+            for token in re.findall(r"\w+", text.lower()):
+                digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                vector[value % self.dim] += 1.0 if (value >> 63) else -1.0
+            norm = sum(v * v for v in vector) ** 0.5 or 1.0
+            vectors.append([v / norm for v in vector])
+        return vectors
+
+
+def make_embedder(name: str, **kwargs):
+    if name == "hash":
+        return HashEmbedder(**kwargs)
+    return CohereEmbedder(**kwargs)
+
+
+class EmbeddingCache:
+    """Content-addressed on-disk embedding cache in front of an embedder.
+
+    Entries are keyed by (model, sha256 of the vectorized text). Vectors live as
+    records in a memory-mapped file, one fixed-size slot per entry, with a small JSON
+    index mapping keys to slots. When `max_entries` is reached the least recently used
+    tenth of the slots is evicted and reused.
+
+    Each record starts with the first bytes of its key's hash, checked on every read: the
+    index is only written by flush(), so after a crash it can still map an evicted key to
+    a slot that was since reused, and that must be a miss rather than someone else's vector.
+    """
+
+    FORMAT = 2
+    KEY_BYTES = 16
+
+    def __init__(self, directory: str, embedder, max_entries: int = 200_000):
+        self.embedder = embedder
+        self.max_entries = max_entries
+        self.directory = os.path.join(directory, re.sub(r"[^\w.-]", "_", embedder.model))
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._index_path = os.path.join(self.directory, "index.json")
+        self._vectors_path = os.path.join(self.directory, "vectors.f32")
+
+        self.dim = None
+        self._slots: dict[str, list[int]] = {}  # key -> [slot, last_used]
+        self._free: list[int] = []
+        self._next_slot = 0
+        self._tick = 0
+        index = None
+        if os.path.exists(self._index_path):
+            with open(self._index_path, "r") as f:
+                index = json.load(f)
+            if index.get("format") != self.FORMAT:
+                # Records without a key check; start over rather than trust them
+                index = None
+                if os.path.exists(self._vectors_path):
+                    os.remove(self._vectors_path)
+        if index is not None:
+            self.dim = index["dim"]
+            self._slots = index["slots"]
+            self._free = index["free"]
+            self._next_slot = index["next_slot"]
+            self._tick = index["tick"]
+
+        if not os.path.exists(self._vectors_path):
+            open(self._vectors_path, "wb").close()
+        self._f = open(self._vectors_path, "r+b")
+        self._mm = None
+        self._remap()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _remap(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if os.fstat(self._f.fileno()).st_size:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _record_size(self) -> int:
+        return self.KEY_BYTES + self.dim * 4
+
+    def _read(self, slot: int, key: str) -> list[float] | None:
+        """The vector in `slot`, or None if the slot doesn't hold `key`"""
+        record = self._record_size()
+        start = slot * record
+        if self._mm is None or start + record > len(self._mm):
+            return None
+        if self._mm[start:start + self.KEY_BYTES] != bytes.fromhex(key)[:self.KEY_BYTES]:
+            return None
+        vector = array.array("f")
+        vector.frombytes(self._mm[start + self.KEY_BYTES:start + record])
+        return vector.tolist()
+
+    def _write(self, slot: int, key: str, vector: list[float]):
+        self._f.seek(slot * self._record_size())
+        self._f.write(bytes.fromhex(key)[:self.KEY_BYTES] + array.array("f", vector).tobytes())
+
+    def _evict(self):
+        by_age = sorted(self._slots.items(), key=lambda item: item[1][1])
+        for key, (slot, _) in by_age[:max(1, self.max_entries // 10)]:
+            del self._slots[key]
+            self._free.append(slot)
+            self.evictions += 1
+
+    def _allocate(self) -> int:
+        if not self._free and len(self._slots) >= self.max_entries:
+            self._evict()
+        if self._free:
+            return self._free.pop()
+        self._next_slot += 1
+        return self._next_slot - 1
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        """Vectors for `texts`, computing only the ones not already cached, in one bulk call."""
+        keys = [self.key(text) for text in texts]
+        vectors: dict[str, list[float]] = {}
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key in vectors or key in missing:
+                continue
+            entry = self._slots.get(key)
+            vector = self._read(entry[0], key) if entry is not None else None
+            if vector is not None:
+                self._tick += 1
+                entry[1] = self._tick
+                vectors[key] = vector
+                self.hits += 1
+            else:
+                if entry is not None:
+                    # Slot reused after a crash left a stale index; its slot now belongs to another key
+                    del self._slots[key]
+                missing[key] = text
+                self.misses += 1
+
+        tracing.count("embed.cache", len(texts) - len(missing), result="hit")
+        tracing.count("embed.cache", len(missing), result="miss")
+        if missing:
+            computed = self.embedder.embed(list(missing.values()))
+            if self.dim is None:
+                self.dim = len(computed[0])
+            for key, vector in zip(missing, computed):
+                slot = self._allocate()
+                self._write(slot, key, vector)
+                self._tick += 1
+                self._slots[key] = [slot, self._tick]
+                vectors[key] = vector
+            self._f.flush()
+            self._remap()
+
+        return [vectors[key] for key in keys]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._slots),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def flush(self):
+        tmp_path = f"{self._index_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "format": self.FORMAT,
+                    "dim": self.dim,
+                    "slots": self._slots,
+                    "free": self._free,
+                    "next_slot": self._next_slot,
+                    "tick": self._tick,
+                },
+                f,
+            )
+        os.replace(tmp_path, self._index_path)
+
+    def close(self):
+        self.flush()
+        if self._mm is not None:
+            self._mm.close()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
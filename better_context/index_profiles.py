@@ -0,0 +1,108 @@
+# Vector index profiles for the Chunks collection: index type x compression.
+#
+#   hnsw, hnsw-pq, hnsw-bq, hnsw-sq, hnsw-rq, hnsw-rq1   HNSW graph, optionally quantized
+#   flat, flat-bq                                         brute force (exact unless quantized)
+#   dynamic, dynamic-<quantizer>                          flat until DYNAMIC_THRESHOLD objects, then HNSW;
+#                                                         needs ASYNC_INDEXING=true on the server
+#
+# rq is 8-bit rotational quantization (4x smaller), rq1 the 1-bit variant (32x). BQ, SQ and
+# RQ take a rescore limit: that many candidates are re-ranked with the full vectors from disk.
+import time
+from dataclasses import dataclass
+
+from weaviate.classes.config import Configure
+
+
+INDEX_QUANTIZERS = {
+    "hnsw": [None, "pq", "bq", "sq", "rq", "rq1"],
+    "flat": [None, "bq"],
+    "dynamic": [None, "pq", "bq", "sq", "rq", "rq1"],
+}
+DEFAULT_PROFILE = "hnsw"
+
+# PQ and SQ only compress once trained on this many vectors. Weaviate's default (100k) is
+# more than the docs corpus has, which would leave those profiles uncompressed.
+TRAINING_LIMIT = 10_000
+# Objects at which a dynamic index switches from flat to HNSW
+DYNAMIC_THRESHOLD = 10_000
+# HNSW default; layer 0 keeps up to twice this many links per node
+MAX_CONNECTIONS = 32
+
+# Resident bytes per vector dimension, by quantizer
+BYTES_PER_DIM = {None: 4, "pq": 0.25, "bq": 1 / 8, "sq": 1, "rq": 1, "rq1": 1 / 8}
+
+
+def profile_names() -> list[str]:
+    return [index + (f"-{quantizer}" if quantizer else "") for index, quantizers in INDEX_QUANTIZERS.items() for quantizer in quantizers]
+
+
+@dataclass
+class IndexProfile:
+    index: str
+    quantizer: str | None = None
+    rescore_limit: int | None = None
+
+    @property
+    def name(self) -> str:
+        return self.index + (f"-{self.quantizer}" if self.quantizer else "")
+
+    @classmethod
+    def parse(cls, name: str, rescore_limit: int | None = None) -> "IndexProfile":
+        index, _, quantizer = name.partition("-")
+        quantizer = quantizer or None
+        if quantizer not in INDEX_QUANTIZERS.get(index, []):
+            raise ValueError(f"Unknown index profile {name!r}; choose from {', '.join(profile_names())}")
+        if rescore_limit is not None and quantizer in (None, "pq"):
+            raise ValueError(f"Profile {name!r} has no rescore limit (only bq, sq and rq rescore)")
+        return cls(index, quantizer, rescore_limit)
+
+    def _quantizer(self):
+        quantizer = Configure.VectorIndex.Quantizer
+        if self.quantizer == "pq":
+            return quantizer.pq(training_limit=TRAINING_LIMIT)
+        if self.quantizer == "bq":
+            # Flat indexes only keep BQ codes in memory with the cache on
+            return quantizer.bq(rescore_limit=self.rescore_limit, cache=True if self.index == "flat" else None)
+        if self.quantizer == "sq":
+            return quantizer.sq(rescore_limit=self.rescore_limit, training_limit=TRAINING_LIMIT)
+        if self.quantizer in ("rq", "rq1"):
+            return quantizer.rq(bits=1 if self.quantizer == "rq1" else 8, rescore_limit=self.rescore_limit)
+        return None
+
+    def vector_index_config(self):
+        if self.index == "flat":
+            return Configure.VectorIndex.flat(quantizer=self._quantizer())
+        if self.index == "dynamic":
+            flat_quantizer = Configure.VectorIndex.Quantizer.bq(rescore_limit=self.rescore_limit, cache=True) if self.quantizer else None
+            return Configure.VectorIndex.dynamic(
+                threshold=DYNAMIC_THRESHOLD,
+                hnsw=Configure.VectorIndex.hnsw(max_connections=MAX_CONNECTIONS, quantizer=self._quantizer()),
+                flat=Configure.VectorIndex.flat(quantizer=flat_quantizer),
+            )
+        return Configure.VectorIndex.hnsw(max_connections=MAX_CONNECTIONS, quantizer=self._quantizer())
+
+    def estimated_memory(self, objects: int, dims: int) -> int:
+        """Rough resident bytes for the vector index: in-memory vectors (or codes) plus HNSW links.
+
+        Full vectors of a quantized index stay on disk and are only read for rescoring.
+        """
+        if self.index == "flat" or (self.index == "dynamic" and objects < DYNAMIC_THRESHOLD):
+            # Uncompressed flat search reads vectors from disk; cached BQ codes stay in memory
+            return int(objects * dims * BYTES_PER_DIM["bq"]) if self.quantizer else 0
+        links = objects * 2 * MAX_CONNECTIONS * 8
+        return int(objects * dims * BYTES_PER_DIM[self.quantizer]) + links
+
+
+def wait_for_indexing(client, collection: str, timeout: float = 600) -> dict:
+    """Wait until every shard has drained its vector queue. Returns object count and whether vectors are compressed."""
+    started = time.monotonic()
+    while True:
+        shards = [shard for node in client.cluster.nodes(collection=collection, output="verbose") for shard in node.shards]
+        if all(shard.vector_queue_length == 0 and shard.vector_indexing_status == "READY" for shard in shards):
+            return {
+                "objects": sum(shard.object_count for shard in shards),
+                "compressed": any(shard.compressed for shard in shards),
+            }
+        if time.monotonic() - started > timeout:
+            raise TimeoutError(f"{collection} still indexing after {timeout}s")
+        time.sleep(1)
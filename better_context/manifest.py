@@ -0,0 +1,71 @@
+import hashlib
+import json
+import os
+
+
+MANIFEST_PATH = "./output/index_manifest.json"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IndexManifest:
+    """Per-path record of what is currently in the Chunks collection.
+
+    Each page entry holds the hash of the page text and the hash of every chunk
+    (by chunk_no), so a re-index can skip unchanged pages and chunks and delete
+    the tail of a page that got shorter. Chunks that failed to insert are listed
+    under "failed" until a later run or a failure replay writes them.
+    """
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self.pages: dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.pages = json.load(f)["pages"]
+
+    def page(self, path: str) -> dict | None:
+        return self.pages.get(path)
+
+    def set_page(self, path: str, page_hash: str, chunk_hashes: list[str]):
+        self.pages[path] = {"hash": page_hash, "chunks": chunk_hashes}
+
+    def mark_failed(self, path: str, chunk_no: int):
+        page = self.pages.get(path)
+        if page is not None and chunk_no not in page.setdefault("failed", []):
+            page["failed"].append(chunk_no)
+
+    def is_failed(self, path: str, chunk_no: int, chunk_hash: str) -> bool:
+        """True if this exact chunk is still waiting to be written after a failed insert"""
+        page = self.pages.get(path)
+        return (
+            page is not None
+            and chunk_no in page.get("failed", ())
+            and chunk_no < len(page["chunks"])
+            and page["chunks"][chunk_no] == chunk_hash
+        )
+
+    def clear_failed(self, path: str, chunk_no: int):
+        page = self.pages.get(path)
+        if page is not None and chunk_no in page.get("failed", ()):
+            page["failed"].remove(chunk_no)
+            if not page["failed"]:
+                del page["failed"]
+
+    def remove(self, path: str):
+        self.pages.pop(path, None)
+
+    def paths(self) -> set[str]:
+        return set(self.pages)
+
+    def clear(self):
+        self.pages = {}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"pages": self.pages}, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,152 @@
+# Rebuild the Chunks index into a new vector index profile without downtime.
+#
+#   python migrate_index.py --profile hnsw-rq --rescore-limit 200
+#   python migrate_index.py --status
+#   python migrate_index.py --point-to Chunks_v1      (roll back)
+#
+# Objects are copied with their vectors (no re-embedding) into the next versioned collection
+# (Chunks_v2, ...). Once it has finished indexing and holds every object, the "Chunks" alias
+# is switched to it in one step; the MCP server and 3_check_rag.py query through the alias,
+# so they never see a missing or half-built index. The old collection is kept for roll back
+# unless --drop-old is given. Don't run 2_index_docs.py while a migration is copying.
+#
+# A Chunks collection created before aliases has to give up its name for the alias: it is
+# copied to Chunks_v1 first, then deleted and replaced by the alias straight away. Searches
+# in that sub-second gap fail; every later migration is a single alias update.
+import argparse
+import os
+import time
+
+import weaviate
+from tqdm import tqdm
+
+from docs_index import (
+    CHUNKS_COLLECTION,
+    bump_generation,
+    chunks_target,
+    chunks_versions,
+    create_chunks_collection,
+    next_chunks_version,
+)
+from index_profiles import DEFAULT_PROFILE, IndexProfile, profile_names, wait_for_indexing
+
+
+def count_objects(client, name: str) -> int:
+    return client.collections.use(name).aggregate.over_all(total_count=True).total_count
+
+
+def copy_objects(client, source: str, target: str, batch_size: int) -> tuple[int, int]:
+    """Copy every object with its vectors. Returns (objects copied, vector dimensions)."""
+    source_collection = client.collections.use(source)
+    target_collection = client.collections.use(target)
+    copied = 0
+    dims = 0
+    with target_collection.batch.fixed_size(batch_size=batch_size) as batch:
+        for obj in tqdm(source_collection.iterator(include_vector=True), total=count_objects(client, source)):
+            batch.add_object(properties=obj.properties, uuid=obj.uuid, vector=obj.vector)
+            copied += 1
+            if not dims and obj.vector:
+                dims = len(next(iter(obj.vector.values())))
+    failed = len(target_collection.batch.failed_objects)
+    return copied - failed, dims
+
+
+def switch_alias(client, target: str):
+    """Point the Chunks alias at `target`, turning a pre-alias Chunks collection into the alias if needed"""
+    if client.alias.get(alias_name=CHUNKS_COLLECTION) is not None:
+        client.alias.update(alias_name=CHUNKS_COLLECTION, new_target_collection=target)
+    else:
+        client.collections.delete(CHUNKS_COLLECTION)
+        client.alias.create(alias_name=CHUNKS_COLLECTION, target_collection=target)
+    # Running MCP servers drop search results cached from the old collection
+    bump_generation(client)
+
+
+def status(client):
+    target = chunks_target(client)
+    if target is None:
+        print("No Chunks index; create one with 2_index_docs.py")
+        return
+    is_alias = client.alias.get(alias_name=CHUNKS_COLLECTION) is not None
+    print(f"{CHUNKS_COLLECTION} -> {target}" if is_alias else f"{CHUNKS_COLLECTION} is a collection (created before aliases)")
+    for name in chunks_versions(client):
+        vector_config = client.collections.use(name).config.get().vector_config
+        index_config = next(iter(vector_config.values())).vector_index_config if vector_config else None
+        quantizer = getattr(index_config, "quantizer", None)
+        marker = "*" if name == target else " "
+        print(
+            f" {marker} {name:<14} {count_objects(client, name):>8} objects  "
+            f"{type(index_config).__name__.strip('_')}  quantizer={type(quantizer).__name__.strip('_') if quantizer else 'none'}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the Chunks index into a new vector index profile behind the Chunks alias")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE, help=f"One of: {', '.join(profile_names())}")
+    parser.add_argument("--rescore-limit", type=int, help="Candidates rescored with full vectors (bq, sq and rq profiles)")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--drop-old", action="store_true", help="Delete the previous collection after switching")
+    parser.add_argument("--dry-run", action="store_true", help="Build and verify the new collection, but don't switch to it")
+    parser.add_argument("--status", action="store_true", help="Show the alias and the versioned collections, then exit")
+    parser.add_argument("--point-to", help="Switch the alias to an existing collection (e.g. to roll back), then exit")
+    args = parser.parse_args()
+
+    client = weaviate.connect_to_local(
+        headers={
+            "X-Cohere-Api-Key": os.getenv("COHERE_API_KEY")
+        },
+    )
+    try:
+        if args.status:
+            status(client)
+            return
+        if args.point_to:
+            if not client.collections.exists(args.point_to):
+                raise SystemExit(f"No collection {args.point_to}")
+            switch_alias(client, args.point_to)
+            print(f"{CHUNKS_COLLECTION} -> {args.point_to}")
+            return
+
+        try:
+            profile = IndexProfile.parse(args.profile, args.rescore_limit)
+        except ValueError as e:
+            parser.error(str(e))
+
+        source = chunks_target(client)
+        if source is None:
+            raise SystemExit("No Chunks index to migrate; create one with 2_index_docs.py --profile ...")
+        target = next_chunks_version(client)
+
+        print(f"Copying {source} into {target} ({profile.name})")
+        started = time.monotonic()
+        create_chunks_collection(client, target, profile)
+        copied, dims = copy_objects(client, source, target, args.batch_size)
+        indexed = wait_for_indexing(client, target)
+        expected = count_objects(client, source)
+        print(
+            f"Copied {copied} objects in {time.monotonic() - started:.0f}s; {indexed['objects']} indexed"
+            f"{', compressed' if indexed['compressed'] else ''}"
+        )
+        if indexed["objects"] != expected:
+            # Keep serving the old collection; the new one is left for inspection
+            raise SystemExit(f"{target} has {indexed['objects']} objects, {source} has {expected}; not switching")
+
+        estimate = profile.estimated_memory(indexed["objects"], dims)
+        print(f"Estimated vector index memory for {profile.name}: {estimate / 2**20:.1f} MiB ({dims} dims)")
+        if args.dry_run:
+            print(f"Dry run: {CHUNKS_COLLECTION} still points at {source}; switch with --point-to {target}")
+            return
+
+        switch_alias(client, target)
+        print(f"{CHUNKS_COLLECTION} -> {target}")
+        if args.drop_old and source != CHUNKS_COLLECTION:
+            client.collections.delete(source)
+            print(f"Deleted {source}")
+        elif source != CHUNKS_COLLECTION:
+            print(f"Kept {source}; roll back with: python migrate_index.py --point-to {source}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
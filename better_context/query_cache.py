@@ -0,0 +1,81 @@
+import re
+import time
+from collections import OrderedDict
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation so near-identical queries share a key."""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip("?.! ")
+
+
+class QueryCache:
+    """Size-bounded LRU cache with a TTL for search results, tied to an index generation.
+
+    When the index generation changes, every entry is dropped.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation = None
+        self._entries: OrderedDict[tuple, tuple[float, object]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(query: str, limit: int) -> tuple:
+        return normalize_query(query), limit
+
+    def set_generation(self, generation):
+        if generation != self.generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.generation = generation
+
+    def get(self, query: str, limit: int):
+        key = self.key(query, limit)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, query: str, limit: int, value, generation):
+        """Store `value`, fetched while `generation` was current (read it before querying).
+
+        A result from an older generation, fetched while a reindex was being noticed, is not stored.
+        """
+        if generation != self.generation:
+            return
+        key = self.key(query, limit)
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "generation": self.generation,
+        }
@@ -0,0 +1,233 @@
+# Conditional recrawl of an existing crawl dump.
+#
+# Every known page is re-requested with the ETag / Last-Modified validators saved
+# by the previous run. 304s (and 200s whose body hash is unchanged) are skipped
+# without rendering; only pages whose HTML changed go through crawl4ai for
+# markdown. New pages are discovered from links in changed pages, and 404/410s are
+# dropped. The dump is updated in place and the changed/added/removed URL lists are
+# written for `2_index_docs.py --changes`.
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+
+import httpx
+from crawl4ai import AsyncWebCrawler, CacheMode
+
+from corpus import CRAWL_JSON_PATH, iter_pages, update_corpus
+from crawl_checkpoint import normalize_url
+from crawling import make_page_config
+from manifest import content_hash
+import tracing
+
+
+VALIDATORS_PATH = "./output/recrawl_validators.json"
+CHANGES_PATH = "./output/recrawl_changes.json"
+
+
+class LinkParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.hrefs = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                self.hrefs.append(href)
+
+
+def page_links(url: str, html: str, allowed_domains: list[str]) -> set[str]:
+    parser = LinkParser()
+    parser.feed(html)
+    links = set()
+    for href in parser.hrefs:
+        link = normalize_url(urljoin(url, href))
+        if urlparse(link).scheme in ("http", "https") and urlparse(link).hostname in allowed_domains:
+            links.add(link)
+    return links
+
+
+class ValidatorStore:
+    """Per-URL ETag, Last-Modified and body hash from the last successful fetch"""
+
+    def __init__(self, path: str = VALIDATORS_PATH):
+        self.path = path
+        self.validators: dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.validators = json.load(f)
+
+    def request_headers(self, url: str) -> dict:
+        validators = self.validators.get(url, {})
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        return headers
+
+    def body_hash(self, url: str) -> str | None:
+        return self.validators.get(url, {}).get("body_hash")
+
+    def update(self, url: str, response: httpx.Response, body_hash: str):
+        self.validators[url] = {
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "body_hash": body_hash,
+        }
+
+    def remove(self, url: str):
+        self.validators.pop(url, None)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.tmp", "w") as f:
+            json.dump(self.validators, f)
+        os.replace(f"{self.path}.tmp", self.path)
+
+
+async def recrawl(
+    corpus_path: str,
+    validators_path: str = VALIDATORS_PATH,
+    changes_path: str = CHANGES_PATH,
+    allowed_domains: list[str] | None = None,
+    concurrency: int = 8,
+    max_new_pages: int = 1000,
+    dry_run: bool = False,
+) -> dict:
+    known = {url: content_hash(markdown) for url, markdown in iter_pages(corpus_path)}
+    if not known:
+        raise SystemExit(f"No pages in {corpus_path}; run a full crawl first")
+    allowed_domains = allowed_domains or sorted({urlparse(url).hostname for url in known})
+    store = ValidatorStore(validators_path)
+
+    stats = {"requests": 0, "not_modified": 0, "same_body": 0, "rendered": 0, "render_unchanged": 0, "failed": 0}
+    fetched: dict[str, tuple[httpx.Response, str]] = {}  # url -> (response, body hash) for new bodies
+    removed, failed = set(), {}
+    seen = set(known)
+    started = time.monotonic()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(follow_redirects=True, timeout=30) as http:
+
+        async def check(url: str) -> set[str]:
+            """Conditional GET; returns links to pages we have never seen"""
+            async with semaphore:
+                with tracing.span("recrawl.request") as attrs:
+                    try:
+                        response = await http.get(url, headers=store.request_headers(url))
+                    except httpx.HTTPError as e:
+                        failed[url] = str(e)
+                        return set()
+                    attrs["status"] = response.status_code
+            stats["requests"] += 1
+            tracing.count("recrawl.responses", status=response.status_code)
+
+            if response.status_code == 304:
+                stats["not_modified"] += 1
+                return set()
+            if response.status_code in (404, 410):
+                if url in known:
+                    removed.add(url)
+                store.remove(url)
+                return set()
+            if response.status_code != 200:
+                failed[url] = f"status {response.status_code}"
+                return set()
+
+            body_hash = hashlib.sha256(response.content).hexdigest()
+            if url in known and body_hash == store.body_hash(url):
+                # Server without validators, or one that ignores them
+                stats["same_body"] += 1
+                store.update(url, response, body_hash)
+                return set()
+            fetched[url] = (response, body_hash)
+            return page_links(url, response.text, allowed_domains) - seen
+
+        to_check = set(known)
+        new_pages = 0
+        while to_check:
+            links = set().union(*await asyncio.gather(*(check(url) for url in to_check)))
+            links = set(sorted(links)[:max(0, max_new_pages - new_pages)])
+            new_pages += len(links)
+            seen |= links
+            to_check = links
+
+    updates = {}
+    if fetched:
+        # Only pages whose HTML changed are rendered, refreshing crawl4ai's cache for them
+        with tracing.span("recrawl.render", pages=len(fetched)):
+            async with AsyncWebCrawler() as crawler:
+                async for result in await crawler.arun_many(
+                    list(fetched), config=make_page_config(stream=True, cache_mode=CacheMode.WRITE_ONLY)
+                ):
+                    url = normalize_url(result.url)
+                    if url not in fetched:
+                        continue
+                    if not result.success:
+                        failed[url] = result.error_message or f"status {result.status_code}"
+                        continue
+                    stats["rendered"] += 1
+                    response, body_hash = fetched[url]
+                    # Saved only after a successful render, so a failed one is retried next run
+                    store.update(url, response, body_hash)
+                    markdown = str(result.markdown)
+                    if known.get(url) == content_hash(markdown):
+                        stats["render_unchanged"] += 1
+                    else:
+                        updates[url] = markdown
+
+    changes = {
+        "crawled_at": datetime.now(timezone.utc).isoformat(),
+        "corpus": corpus_path,
+        "changed": sorted(url for url in updates if url in known),
+        "added": sorted(url for url in updates if url not in known),
+        "removed": sorted(removed),
+        "failed": failed,
+        "stats": {**stats, "failed": len(failed), "seconds": round(time.monotonic() - started, 1)},
+    }
+    if not dry_run:
+        if updates or removed:
+            update_corpus(corpus_path, updates, removed)
+        store.save()
+        os.makedirs(os.path.dirname(changes_path) or ".", exist_ok=True)
+        with open(changes_path, "w") as f:
+            json.dump(changes, f, indent=2)
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recrawl only what changed, using ETag/Last-Modified validators")
+    parser.add_argument("--corpus", default=CRAWL_JSON_PATH, help="Crawl dump to refresh (.json, .jsonl or sharded directory)")
+    parser.add_argument("--validators", default=VALIDATORS_PATH)
+    parser.add_argument("--changes", default=CHANGES_PATH, help="Where to write the changed/added/removed URL lists")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--max-new-pages", type=int, default=1000, help="Cap on new pages discovered from changed pages")
+    parser.add_argument("--dry-run", action="store_true", help="Report changes without updating the corpus or validators")
+    args = parser.parse_args()
+
+    changes = asyncio.run(recrawl(
+        args.corpus, args.validators, args.changes,
+        concurrency=args.concurrency, max_new_pages=args.max_new_pages, dry_run=args.dry_run,
+    ))
+    stats = changes["stats"]
+    print(
+        f"{stats['requests']} requests in {stats['seconds']}s: {stats['not_modified']} not modified, "
+        f"{stats['same_body']} same body, {stats['rendered']} rendered ({stats['render_unchanged']} unchanged after rendering)"
+    )
+    print(
+        f"{len(changes['changed'])} changed, {len(changes['added'])} added, "
+        f"{len(changes['removed'])} removed, {stats['failed']} failed"
+    )
+    if not args.dry_run:
+        print(f"Changes written to {args.changes}; index them with: python 2_index_docs.py --input {args.corpus} --changes {args.changes}")
+
+
+if __name__ == "__main__":
+    main()
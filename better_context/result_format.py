@@ -0,0 +1,157 @@
+import json
+import re
+from dataclasses import dataclass, field
+
+
+def approx_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return (len(text) + 3) // 4
+
+
+def _word_spans(text: str) -> list[tuple[int, int, str]]:
+    return [(m.start(), m.end(), m.group()) for m in re.finditer(r"\S+", text)]
+
+
+def stitch(left: str, right: str, min_overlap_words: int = 8) -> str | None:
+    """Join two consecutive chunks, dropping the words `right` repeats from the end of `left`.
+
+    Returns None if they don't overlap by at least `min_overlap_words` words.
+    Compares words rather than characters, as chunk boundaries may differ in whitespace.
+    """
+    left_words = [w for _, _, w in _word_spans(left)]
+    right_spans = _word_spans(right)
+    right_words = [w for _, _, w in right_spans]
+    if not left_words or len(right_words) < min_overlap_words:
+        return None
+
+    # The overlap starts at some occurrence of right's first word near the end of left
+    longest = min(len(left_words), len(right_words))
+    for start in range(len(left_words) - longest, len(left_words)):
+        if left_words[start] != right_words[0]:
+            continue
+        k = len(left_words) - start
+        if k >= min_overlap_words and left_words[start:] == right_words[:k]:
+            if k == len(right_words):
+                return left
+            return left.rstrip() + right[right_spans[k - 1][1]:]
+    return None
+
+
+@dataclass
+class Span:
+    path: str
+    first_chunk: int
+    last_chunk: int
+    text: str
+    rank: int  # best (lowest) search rank among the chunks it covers
+    truncated: bool = False
+    alt_paths: list[str] = field(default_factory=list)  # other pages with the same text (indexed with --dedupe)
+
+
+@dataclass
+class FormattedResults:
+    spans: list[Span] = field(default_factory=list)
+    raw_tokens: int = 0
+    tokens: int = 0
+    duplicates_dropped: int = 0
+    spans_dropped: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.raw_tokens - self.tokens)
+
+    def to_dict(self) -> dict:
+        return {
+            "results": [
+                {
+                    "path": s.path,
+                    "chunks": f"{s.first_chunk}" if s.first_chunk == s.last_chunk else f"{s.first_chunk}-{s.last_chunk}",
+                    "text": s.text,
+                    **({"also_at": s.alt_paths} if s.alt_paths else {}),
+                    **({"truncated": True} if s.truncated else {}),
+                }
+                for s in self.spans
+            ],
+            "tokens": self.tokens,
+            "tokens_saved": self.tokens_saved,
+            **({"omitted_spans": self.spans_dropped} if self.spans_dropped else {}),
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+
+def merge_hits(objs: list[dict]) -> tuple[list[Span], int]:
+    """Group ranked hits by page and stitch consecutive chunks into spans. Returns (spans, duplicates dropped)."""
+    seen_text = set()
+    duplicates = 0
+    by_path: dict[str, dict[int, tuple[str, int, list[str]]]] = {}  # path -> chunk_no -> (text, rank, alt_paths)
+    for rank, obj in enumerate(objs):
+        key = " ".join(obj["chunk"].split()).lower()
+        if key in seen_text:
+            # Same text indexed under several pages (shared snippets, navigation, ...)
+            duplicates += 1
+            continue
+        seen_text.add(key)
+        by_path.setdefault(obj["path"], {})[int(obj.get("chunk_no") or 0)] = (obj["chunk"], rank, obj.get("alt_paths") or [])
+
+    spans = []
+    for path, chunks in by_path.items():
+        span = None
+        for chunk_no in sorted(chunks):
+            text, rank, alt_paths = chunks[chunk_no]
+            if span is not None and chunk_no == span.last_chunk + 1:
+                stitched = stitch(span.text, text)
+                span.text = stitched if stitched is not None else f"{span.text.rstrip()}\n{text.lstrip()}"
+                span.last_chunk = chunk_no
+                span.rank = min(span.rank, rank)
+                span.alt_paths += [p for p in alt_paths if p not in span.alt_paths]
+                continue
+            span = Span(path, chunk_no, chunk_no, text, rank, alt_paths=list(alt_paths))
+            spans.append(span)
+
+    # Pages in order of their best hit; a page's spans stay together, in document order
+    page_rank = {}
+    for span in spans:
+        page_rank[span.path] = min(page_rank.get(span.path, span.rank), span.rank)
+    spans.sort(key=lambda s: (page_rank[s.path], s.first_chunk))
+    return spans, duplicates
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    cut = text[: max_tokens * 4]
+    # Don't end mid-word
+    return cut[: cut.rfind(" ")] if " " in cut and len(cut) < len(text) else cut
+
+
+def format_results(objs: list[dict], max_tokens: int | None = None, min_span_tokens: int = 50) -> FormattedResults:
+    """Merge hits into per-page spans, best-ranked first, and keep them within `max_tokens`.
+
+    The last span that doesn't fit is truncated if at least `min_span_tokens` remain,
+    otherwise it and everything ranked below it are left out.
+    """
+    spans, duplicates = merge_hits(objs)
+    result = FormattedResults(raw_tokens=approx_tokens(str(objs)), duplicates_dropped=duplicates)
+
+    # JSON wrapping: per result (keys, chunk range, quoting) and once for the envelope
+    overhead = 20
+    used = 30
+    for i, span in enumerate(spans):
+        # The also_at paths are sent whether or not the text is truncated
+        paths_cost = approx_tokens(span.path + "".join(span.alt_paths))
+        cost = approx_tokens(span.text) + paths_cost + overhead
+        if max_tokens is None or used + cost <= max_tokens:
+            result.spans.append(span)
+            used += cost
+            continue
+        remaining = max_tokens - used - paths_cost - overhead
+        if remaining >= min_span_tokens:
+            span.text = truncate_to_tokens(span.text, remaining)
+            span.truncated = True
+            result.spans.append(span)
+            i += 1
+        result.spans_dropped = len(spans) - i
+        break
+
+    result.tokens = approx_tokens(result.to_json())
+    return result
@@ -0,0 +1,210 @@
+# Local static doc site for testing the crawler without hitting docs.weaviate.io.
+#
+#   python serve_test_site.py --pages 200 --fanout 5 --port 8765 --regenerate
+#   python 1_get_docs.py --format jsonl --checkpoint --start-url http://localhost:8765/weaviate/index.html
+#
+# For recrawl tests, change the tree while it is served and pick which validators it sends:
+#   python serve_test_site.py --mutate --change 5 --add 3 --remove 2
+#   python serve_test_site.py --validators etag   (etag | last-modified | both | none)
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+
+SITE_DIR = "./output/test_site"
+
+WORDS = (
+    "vector index collection tenant query hybrid search property schema batch import shard replica "
+    "filter module vectorizer embedding generative rerank backup cluster node quantization compression"
+).split()
+
+
+def page_path(n: int) -> str:
+    return "weaviate/index.html" if n == 0 else f"weaviate/section-{n % 7}/page-{n}.html"
+
+
+def generate_site(directory: str = SITE_DIR, pages: int = 200, fanout: int = 5, seed: int = 0) -> list[str]:
+    """Write a tree of `pages` linked HTML pages (page n links to its parent and children). Returns their paths."""
+    rng = random.Random(seed)
+    paths = [page_path(n) for n in range(pages)]
+    for n, path in enumerate(paths):
+        children = [paths[c] for c in range(n * fanout + 1, min(pages, (n + 1) * fanout + 1))]
+        parent = paths[(n - 1) // fanout] if n else None
+        links = [f'<li><a href="/{child}">Page {child}</a></li>' for child in children]
+        if parent:
+            links.append(f'<li><a href="/{parent}#top">Up</a></li>')
+        paragraphs = [
+            "<p>" + " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 120))) + ".</p>"
+            for _ in range(rng.randint(2, 6))
+        ]
+        html = (
+            f"<html><head><title>Page {n}</title></head><body>"
+            f"<h1>Test page {n}</h1>{''.join(paragraphs)}<ul>{''.join(links)}</ul>"
+            f'<a href="https://example.com/external">External</a></body></html>'
+        )
+        full_path = os.path.join(directory, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "w") as f:
+            f.write(html)
+    return paths
+
+
+def mutate_site(directory: str = SITE_DIR, change: int = 5, add: int = 0, remove: int = 0, seed: int = 1) -> dict:
+    """Edit, add and delete pages of a generated site. Returns the URL paths touched, by kind."""
+    rng = random.Random(seed)
+    paths = sorted(
+        os.path.relpath(os.path.join(root, name), directory)
+        for root, _, names in os.walk(directory) for name in names if name.endswith(".html")
+    )
+    pages = [p for p in paths if p != page_path(0)]
+    removed = rng.sample(pages, min(remove, len(pages)))
+    remaining = [p for p in pages if p not in removed]
+    changed = rng.sample(remaining, min(change, len(remaining)))
+    added = []
+
+    def edit(path: str, insert: str):
+        full_path = os.path.join(directory, path)
+        with open(full_path, "r") as f:
+            html = f.read()
+        with open(full_path, "w") as f:
+            f.write(html.replace("</ul>", f"{insert}</ul>", 1))
+        # Last-Modified has one-second resolution; make sure the change is visible to it
+        mtime = os.path.getmtime(full_path) + 2
+        os.utime(full_path, (mtime, mtime))
+
+    for path in changed:
+        edit(path, f"<li>Edited: {' '.join(rng.choice(WORDS) for _ in range(20))}</li>")
+    for i in range(add):
+        path = f"weaviate/new/page-{int(time.time())}-{i}.html"
+        os.makedirs(os.path.join(directory, os.path.dirname(path)), exist_ok=True)
+        with open(os.path.join(directory, path), "w") as f:
+            f.write(f"<html><body><h1>New page {i}</h1><p>{' '.join(rng.choice(WORDS) for _ in range(60))}.</p></body></html>")
+        # A new page is only reachable through a link from a page that therefore changes too
+        parent = rng.choice([page_path(0)] + remaining)
+        edit(parent, f'<li><a href="/{path}">New page {i}</a></li>')
+        changed.append(parent)
+        added.append(path)
+    for path in removed:
+        os.remove(os.path.join(directory, path))
+
+    return {"changed": sorted(set(changed)), "added": added, "removed": removed}
+
+
+class DocSiteHandler(SimpleHTTPRequestHandler):
+    """Static file handler with optional latency, a simple per-second request cap (429 beyond it)
+    and a choice of validators: strong ETags (content hash) and/or Last-Modified (file mtime)"""
+
+    latency = 0.0
+    max_rps = 0
+    validators = "both"
+    _window = [0.0, 0]
+    _lock = threading.Lock()
+
+    def do_GET(self):
+        if self.max_rps:
+            with self._lock:
+                now = time.monotonic()
+                if now - self._window[0] >= 1.0:
+                    self._window[:] = [now, 0]
+                self._window[1] += 1
+                over = self._window[1] > self.max_rps
+            if over:
+                self.send_error(429, "Too Many Requests")
+                return
+        if self.latency:
+            time.sleep(self.latency)
+
+        self._etag = None
+        if self.validators not in ("both", "last-modified"):
+            # SimpleHTTPRequestHandler answers If-Modified-Since with 304 on its own
+            del self.headers["If-Modified-Since"]
+        if self.validators in ("both", "etag"):
+            path = self.translate_path(self.path)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    self._etag = '"' + hashlib.sha256(f.read()).hexdigest()[:16] + '"'
+                if self._etag in self.headers.get("If-None-Match", ""):
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+        super().do_GET()
+
+    def send_header(self, keyword, value):
+        if keyword == "Last-Modified" and self.validators not in ("both", "last-modified"):
+            return
+        super().send_header(keyword, value)
+
+    def end_headers(self):
+        if getattr(self, "_etag", None):
+            super().send_header("ETag", self._etag)
+            self._etag = None
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(
+    directory: str = SITE_DIR,
+    port: int = 8765,
+    latency: float = 0.0,
+    max_rps: int = 0,
+    validators: str = "both",
+    handler=DocSiteHandler,
+) -> ThreadingHTTPServer:
+    """Serve `directory` from a background thread; port 0 picks a free port. Stop with `server.shutdown()`.
+
+    The settings live on `server.handler`, so they can be changed while it runs.
+    """
+    handler = type(handler.__name__, (handler,), {"latency": latency, "max_rps": max_rps, "validators": validators})
+    server = ThreadingHTTPServer(("127.0.0.1", port), partial(handler, directory=directory))
+    server.handler = handler
+    threading.Thread(target=server.serve_forever, name="test-site", daemon=True).start()
+    return server
+
+
+def serve(directory: str = SITE_DIR, port: int = 8765, latency: float = 0.0, max_rps: int = 0, validators: str = "both"):
+    server = start_server(directory, port, latency, max_rps, validators)
+    print(f"Serving {directory} at http://localhost:{server.server_port}/{page_path(0)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and serve a local doc tree for crawler tests")
+    parser.add_argument("--dir", default=SITE_DIR)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--fanout", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--max-rps", type=int, default=0, help="Answer 429 beyond this many requests per second (0: no cap)")
+    parser.add_argument("--validators", choices=["both", "etag", "last-modified", "none"], default="both")
+    parser.add_argument("--regenerate", action="store_true", help="Regenerate the site even if it exists")
+    parser.add_argument("--mutate", action="store_true", help="Edit/add/remove pages of the existing site, then exit")
+    parser.add_argument("--change", type=int, default=5)
+    parser.add_argument("--add", type=int, default=0)
+    parser.add_argument("--remove", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.mutate:
+        touched = mutate_site(args.dir, args.change, args.add, args.remove, args.seed + 1)
+        print(json.dumps(touched, indent=2))
+        return
+
+    if args.regenerate or not os.path.exists(os.path.join(args.dir, page_path(0))):
+        paths = generate_site(args.dir, args.pages, args.fanout, args.seed)
+        print(f"Generated {len(paths)} pages in {args.dir}")
+    serve(args.dir, args.port, args.latency, args.max_rps, args.validators)
+
+
+if __name__ == "__main__":
+    main()
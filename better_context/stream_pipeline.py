@@ -0,0 +1,118 @@
+# Crawl -> chunk -> index in one process, with bounded queues between the stages.
+# Indexing overlaps with crawling, and at most `--queue-size` pages are held in memory
+# per stage, regardless of how big the site is.
+import argparse
+import asyncio
+import os
+import queue
+
+import weaviate
+
+from chunking import make_chunker, chunk_text
+from corpus import CRAWL_JSONL_PATH, open_sink
+from crawling import MAX_DEPTH, START_URL, stream_pages
+from docs_index import CHUNKS_COLLECTION, DOCS_PATH_FILTER, ChunkIndexer, bump_generation, ensure_chunks_collection
+from manifest import IndexManifest
+import tracing
+
+
+_DONE = object()
+
+
+async def crawl_stage(page_queue: asyncio.Queue, sink, start_url: str, max_depth: int, failed: set):
+    try:
+        async for url, markdown in stream_pages(start_url, max_depth, failed):
+            sink.write(url, markdown)
+            # Blocks when the chunker falls behind
+            await page_queue.put((url, markdown))
+    finally:
+        await page_queue.put(_DONE)
+
+
+async def chunk_stage(page_queue: asyncio.Queue, object_queue: queue.Queue, indexer: ChunkIndexer, chunker):
+    try:
+        while True:
+            page = await page_queue.get()
+            if page is _DONE:
+                break
+
+            path, text = page
+            if DOCS_PATH_FILTER not in path or indexer.is_unchanged(path, text):
+                tracing.count("pipeline.pages", result="skipped")
+                continue
+            tracing.count("pipeline.pages", result="chunked")
+
+            chunk_texts = await asyncio.to_thread(chunk_text, chunker, text)
+            objects = indexer.objects_for_page(path, text, chunk_texts)
+            tracing.count("pipeline.objects", len(objects))
+            if objects:
+                # Blocks when Weaviate falls behind
+                await asyncio.to_thread(object_queue.put, objects)
+    finally:
+        await asyncio.to_thread(object_queue.put, _DONE)
+
+
+def index_stage(object_queue: queue.Queue, chunks, batch_size: int):
+    # The sync batcher lives in its own thread so it never blocks the crawler's event loop
+    with chunks.batch.fixed_size(batch_size=batch_size) as batch:
+        while True:
+            objects = object_queue.get()
+            if objects is _DONE:
+                break
+            for obj in objects:
+                batch.add_object(**obj)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Crawl, chunk and index the docs as a streaming pipeline")
+    parser.add_argument("--queue-size", type=int, default=32, help="Max pages buffered between stages")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--incremental", action="store_true")
+    parser.add_argument("--start-url", default=START_URL)
+    parser.add_argument("--max-depth", type=int, default=MAX_DEPTH)
+    parser.add_argument(
+        "--corpus",
+        default=CRAWL_JSONL_PATH,
+        help="Where crawled pages are also kept: a .jsonl file or a sharded corpus directory",
+    )
+    args = parser.parse_args()
+
+    client = weaviate.connect_to_local(
+        headers={
+            "X-Cohere-Api-Key": os.getenv("COHERE_API_KEY")
+        },
+    )
+
+    try:
+        manifest = IndexManifest()
+        if ensure_chunks_collection(client):
+            manifest.clear()
+
+        chunks = client.collections.use(CHUNKS_COLLECTION)
+        indexer = ChunkIndexer(chunks, manifest, incremental=args.incremental)
+
+        page_queue = asyncio.Queue(maxsize=args.queue_size)
+        object_queue = queue.Queue(maxsize=args.queue_size)
+
+        failed_urls = set()
+        with open_sink(args.corpus) as sink:
+            await asyncio.gather(
+                crawl_stage(page_queue, sink, args.start_url, args.max_depth, failed_urls),
+                chunk_stage(page_queue, object_queue, indexer, make_chunker()),
+                asyncio.to_thread(index_stage, object_queue, chunks, args.batch_size),
+            )
+            print(f"Crawled {sink.count} pages in total" + (f", {len(failed_urls)} failed" if failed_urls else ""))
+
+        # A page that failed to crawl this time is not gone; keep its chunks until a crawl says otherwise
+        indexer.keep_pages(failed_urls)
+        changed = indexer.finish(chunks.batch.failed_objects)
+        print(indexer.summary())
+
+        if changed:
+            bump_generation(client)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
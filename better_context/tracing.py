@@ -0,0 +1,188 @@
+# Lightweight stage tracing: timed spans and counters appended to a local JSONL file.
+#
+# Off unless TRACE_PATH is set, e.g. `TRACE_PATH=./trace.jsonl python 2_index_docs.py`.
+# Each record is one line, written as it happens, so worker processes and crashed
+# runs still leave complete records behind. Summarize or export with:
+#   python tracing.py summary ./trace.jsonl
+#   python tracing.py prometheus ./trace.jsonl > metrics.prom
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+TRACE_PATH = os.getenv("TRACE_PATH")
+
+_lock = threading.Lock()
+_file = None
+
+
+def enabled() -> bool:
+    return TRACE_PATH is not None
+
+
+def _write(record: dict):
+    global _file
+    record["ts"] = time.time()
+    record["pid"] = os.getpid()
+    line = json.dumps(record, default=str) + "\n"
+    with _lock:
+        if _file is None:
+            os.makedirs(os.path.dirname(TRACE_PATH) or ".", exist_ok=True)
+            _file = open(TRACE_PATH, "a", buffering=1)
+        _file.write(line)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block as stage `name`. Yields the attrs dict, so the block can add to it (e.g. token counts)."""
+    if not enabled():
+        yield attrs
+        return
+    start = time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        record = {"type": "span", "name": name, "duration_ms": (time.perf_counter() - start) * 1000, "attrs": attrs}
+        if error:
+            record["error"] = error
+        _write(record)
+
+
+def count(name: str, value: float = 1, **attrs):
+    if enabled():
+        _write({"type": "counter", "name": name, "value": value, "attrs": attrs})
+
+
+def record_llm_usage(attrs: dict, response):
+    """Add an Anthropic response's token usage to a span's attrs"""
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        attrs["input_tokens"] = attrs.get("input_tokens", 0) + usage.input_tokens
+        attrs["output_tokens"] = attrs.get("output_tokens", 0) + usage.output_tokens
+
+
+# Span attrs summed in the summary, when present
+SUMMED_ATTRS = ["input_tokens", "output_tokens", "objects", "pages", "chunks", "hits", "misses"]
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(pct / 100 * len(ordered))) - 1]
+
+
+def load(path: str):
+    spans = defaultdict(list)
+    counters = defaultdict(float)
+    with open(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A process killed mid-write can leave a partial last line
+                continue
+            if record["type"] == "span":
+                spans[record["name"]].append(record)
+            else:
+                # Labels stay (key, value) pairs: values may contain "," or "="
+                labels = tuple(sorted((k, str(v)) for k, v in record.get("attrs", {}).items()))
+                counters[(record["name"], labels)] += record["value"]
+    return spans, counters
+
+
+def summary(path: str):
+    spans, counters = load(path)
+    print(f"{'stage':<28} {'calls':>7} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'total s':>9}  totals")
+    for name in sorted(spans):
+        records = spans[name]
+        durations = [r["duration_ms"] for r in records]
+        totals = {
+            attr: sum(r["attrs"].get(attr, 0) for r in records)
+            for attr in SUMMED_ATTRS if any(attr in r["attrs"] for r in records)
+        }
+        print(
+            f"{name:<28} {len(records):>7} {sum('error' in r for r in records):>6} "
+            f"{_percentile(durations, 50):>9.1f} {_percentile(durations, 95):>9.1f} {sum(durations) / 1000:>9.1f}  "
+            + " ".join(f"{attr}={value:g}" for attr, value in totals.items())
+        )
+    if counters:
+        print(f"\n{'counter':<28} {'value':>9}")
+        for (name, labels), value in sorted(counters.items()):
+            label = ",".join(f"{k}={v}" for k, v in labels)
+            print(f"{name + (f' {{{label}}}' if label else ''):<28} {value:>9g}")
+
+
+def _metric_name(name: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in name)
+
+
+def _label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus(path: str) -> str:
+    """Prometheus text exposition of the trace: a summary per stage and a counter per counter name/labels.
+
+    Each metric family is written as one block under its own HELP/TYPE lines, as the format requires.
+    """
+    spans, counters = load(path)
+    stages = {name: _label_value(name) for name in sorted(spans)}
+
+    lines = [
+        "# HELP stage_duration_seconds Duration of traced pipeline stages",
+        "# TYPE stage_duration_seconds summary",
+    ]
+    for name, stage in stages.items():
+        durations = [r["duration_ms"] / 1000 for r in spans[name]]
+        for quantile in (0.5, 0.95, 0.99):
+            lines.append(f'stage_duration_seconds{{stage="{stage}",quantile="{quantile}"}} {_percentile(durations, quantile * 100):.6f}')
+        lines.append(f'stage_duration_seconds_sum{{stage="{stage}"}} {sum(durations):.6f}')
+        lines.append(f'stage_duration_seconds_count{{stage="{stage}"}} {len(durations)}')
+
+    if stages:
+        lines += ["# HELP stage_errors_total Traced stage runs that raised", "# TYPE stage_errors_total counter"]
+        for name, stage in stages.items():
+            lines.append(f'stage_errors_total{{stage="{stage}"}} {sum("error" in r for r in spans[name])}')
+
+    for attr in SUMMED_ATTRS:
+        with_attr = [name for name in stages if any(attr in r["attrs"] for r in spans[name])]
+        if not with_attr:
+            continue
+        lines += [f"# HELP stage_{attr}_total Sum of {attr} over traced stage runs", f"# TYPE stage_{attr}_total counter"]
+        for name in with_attr:
+            total = sum(r["attrs"].get(attr, 0) for r in spans[name])
+            lines.append(f'stage_{attr}_total{{stage="{stages[name]}"}} {total:g}')
+
+    families: dict[str, list[str]] = defaultdict(list)
+    for (name, labels), value in sorted(counters.items()):
+        label = ",".join(f'{_metric_name(k)}="{_label_value(v)}"' for k, v in labels)
+        families[f"{_metric_name(name)}_total"].append(f"{_metric_name(name)}_total{{{label}}} {value:g}")
+    for family, samples in sorted(families.items()):
+        lines += [f"# HELP {family} Traced counter", f"# TYPE {family} counter", *samples]
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize or export a trace file")
+    parser.add_argument("command", choices=["summary", "prometheus"])
+    parser.add_argument("path", nargs="?", default=TRACE_PATH or "./trace.jsonl")
+    args = parser.parse_args()
+
+    if args.command == "summary":
+        summary(args.path)
+    else:
+        print(prometheus(args.path), end="")
+
+
+if __name__ == "__main__":
+    main()
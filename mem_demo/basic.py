@@ -6,13 +6,46 @@ from weaviate.collections import Collection
 import os
 import json
 from uuid import uuid4
-from datetime import datetime, timezone
 import typer
 import questionary
 import textwrap
+import threading
+import time
+
+import shared  # before embedding_cache and tracing, which live in ../better_context
+from consolidation import CONSOLIDATION_STRATEGIES, TurnStats, make_engine
+from embedding_cache import CohereEmbedder, EmbeddingCache
+from extraction_gate import should_extract
+from memory_cache import MemoryCache
+from memory_queue import MemoryWriteQueue
+from tenant_lifecycle import COLD_STATUSES, TenantActivityManager
+import tracing
 
 anthropic_client = anthropic.Anthropic()
 
+# Cohere model for a newly created Memory collection. Local embeddings (--embedding-cache,
+# --memory-cache) use the model of the existing collection, see collection_embed_model()
+MEMORY_EMBED_MODEL = "embed-v4.0"
+
+# Set by main() when --embedding-cache is given
+embedding_cache: EmbeddingCache | None = None
+_embedding_cache_lock = threading.Lock()
+
+# Set by main() with --extraction-gate: skip the extraction call on turns with nothing to remember
+extraction_gate = False
+
+# Set by main() when --memory-cache is given
+memory_cache: MemoryCache | None = None
+
+# Set by main() when --tenant-idle-minutes is given
+tenant_activity: TenantActivityManager | None = None
+
+# Replaced by main() with the configured strategy and concurrency
+consolidation_engine = make_engine()
+
+# Memory-side LLM calls, tokens and wall time, one entry per chat turn
+turn_stats: list[TurnStats] = []
+
 EXTRACTION_PROMPT_TEMPLATE = textwrap.dedent(
     """
     Existing memories: {memories_text}
@@ -42,27 +75,6 @@ EXTRACTION_PROMPT_TEMPLATE = textwrap.dedent(
     """
 )
 
-CONSOLIDATION_PROMPT_TEMPLATE = textwrap.dedent(
-    """
-    New fact: {fact}
-    Existing memories: {existing_memories}
-
-    Choose one action:
-    - ADD: Completely new information not related to existing memories
-    - UPDATE: Refines or adds detail to existing memory without contradicting it
-    - INVALIDATE: Contradicts existing memory (old info is now false/outdated)
-    - NOOP: Information already accurately captured
-
-    For UPDATE: provide updated_content and target_uuid
-    For INVALIDATE: provide target_uuid (old memory will be marked invalid, new fact added)
-
-    Always explain your reasoning for the chosen action. Be succinct when possible.
-
-    Return JSON with your decision.
-    """
-)
-
-
 def connect_to_weaviate():
     return weaviate.connect_to_weaviate_cloud(
         cluster_url=os.getenv("WEAVIATE_URL"),
@@ -83,6 +95,7 @@ def get_or_create_collection(db_client: weaviate.WeaviateClient):
             ],
             multi_tenancy_config=Configure.multi_tenancy(auto_tenant_creation=True),
             vector_config=Configure.Vectors.text2vec_cohere(
+                model=MEMORY_EMBED_MODEL,
                 source_properties=["content"],
                 quantizer=Configure.VectorIndex.Quantizer.rq(),
             ),
@@ -94,73 +107,44 @@ def get_or_create_collection(db_client: weaviate.WeaviateClient):
         return db_client.collections.use("Memory")
 
 
-def extract_and_consolidate(
-    user_id: str,
-    user_message: str,
-    assistant_response: str,
-    memories_text: str,
-    memory_collection: Collection,
-):
-    """Extract facts from conversation and consolidate with existing memories"""
-    user_memories = memory_collection.with_tenant(user_id)
-
-    # STEP 1: Extract - What's worth remembering?
-    extraction = anthropic_client.beta.messages.create(
-        model="claude-sonnet-4-5",
-        max_tokens=1024,
-        betas=["structured-outputs-2025-11-13"],
-        messages=[
-            {
-                "role": "user",
-                "content": EXTRACTION_PROMPT_TEMPLATE.format(
-                    memories_text=memories_text,
-                    user_message=user_message,
-                    assistant_response=assistant_response,
-                ),
-            }
-        ],
-        output_format={
-            "type": "json_schema",
-            "schema": {
-                "type": "object",
-                "properties": {"facts": {"type": "array", "items": {"type": "string"}}},
-                "required": ["facts"],
-                "additionalProperties": False,
-            },
-        },
-    )
-
-    facts = json.loads(extraction.content[0].text)["facts"]
-    if not facts:
-        return
-
-    print(f"Extracted: {facts}")
+def collection_embed_model(memory_collection: Collection) -> str | None:
+    """Cohere model the Memory collection vectorizes with, or None if it is left to the server default"""
+    for named_vector in (memory_collection.config.get().vector_config or {}).values():
+        return (named_vector.vectorizer.model or {}).get("model")
+    return None
 
-    # STEP 2: Consolidate - How does each fact relate to existing memories?
-    for fact in facts:
-        similar = user_memories.query.hybrid(
-            query=fact,
-            limit=10,
-            filters=Filter.by_property("invalidation_time").is_none(True),
-        )
 
-        # Ask LLM: ADD, UPDATE, INVALIDATE, or NOOP?
-        existing_memories = []
+def memory_vector(content: str) -> list[float] | None:
+    """Precomputed vector for a memory, or None to let Weaviate vectorize it"""
+    if embedding_cache is None:
+        return None
+    # Background memory writers may embed for several tenants at once
+    with _embedding_cache_lock:
+        vector = embedding_cache.embed([content])[0]
+        # Memories trickle in one at a time, so persist the index straight away
+        embedding_cache.flush()
+    return vector
 
-        for m in similar.objects:
-            new_m = dict(m.properties)
-            new_m["uuid"] = str(m.uuid)
-            existing_memories.append(new_m)
 
-        decision = anthropic_client.beta.messages.create(
+def extract_facts(
+    user_message: str,
+    assistant_response: str,
+    memories_text: str,
+    stats: TurnStats | None = None,
+) -> list[str]:
+    """Ask the LLM which new or changed facts the exchange contains"""
+    with tracing.span("llm.extract", model="claude-sonnet-4-5") as attrs:
+        extraction = anthropic_client.beta.messages.create(
             model="claude-sonnet-4-5",
             max_tokens=1024,
             betas=["structured-outputs-2025-11-13"],
             messages=[
                 {
                     "role": "user",
-                    "content": CONSOLIDATION_PROMPT_TEMPLATE.format(
-                        fact=fact, existing_memories=existing_memories
+                    "content": EXTRACTION_PROMPT_TEMPLATE.format(
+                        memories_text=memories_text,
+                        user_message=user_message,
+                        assistant_response=assistant_response,
                     ),
                 }
             ],
@@ -168,102 +152,125 @@ def extract_and_consolidate(
                 "type": "json_schema",
                 "schema": {
                     "type": "object",
-                    "properties": {
-                        "action": {
-                            "type": "string",
-                            "enum": ["ADD", "UPDATE", "INVALIDATE", "NOOP"],
-                        },
-                        "reasoning": {"type": "string"},
-                        "target_uuid": {"type": "string"},
-                        "updated_content": {"type": "string"},
-                    },
-                    "required": ["action", "reasoning"],
+                    "properties": {"facts": {"type": "array", "items": {"type": "string"}}},
+                    "required": ["facts"],
                     "additionalProperties": False,
                 },
             },
         )
+        tracing.record_llm_usage(attrs, extraction)
+    if stats is not None:
+        stats.record(extraction)
+    return json.loads(extraction.content[0].text)["facts"]
+
+
+def extract_and_consolidate(
+    user_id: str,
+    user_message: str,
+    assistant_response: str,
+    memories_text: str,
+    memory_collection: Collection,
+):
+    """Extract facts from conversation and consolidate with existing memories"""
+    user_memories = memory_collection.with_tenant(user_id)
+    stats = TurnStats()
+    started = time.perf_counter()
+    turn_stats.append(stats)
+
+    # STEP 0: Gate - Could this turn contain anything worth remembering?
+    if extraction_gate and not should_extract(user_message).extract:
+        stats.extraction_skipped = True
+        tracing.count("extraction.skipped")
+        stats.wall_time = time.perf_counter() - started
+        return
 
-        action_data = json.loads(decision.content[0].text)
-        action = action_data["action"]
-        reasoning = action_data["reasoning"]
-
-        # STEP 3: Execute the consolidation decision
-        if action == "ADD":
-            user_memories.data.insert({"content": fact})
-            print(f"\n  ✓ Added: {fact}")
-            print(f"    Why: {reasoning}")
-
-        elif action == "UPDATE":
-            target_uuid = action_data["target_uuid"]
-            # Fetch the old memory to show what was changed
-            old_memory_obj = user_memories.query.fetch_object_by_id(uuid=target_uuid)
-            old_content = old_memory_obj.properties["content"]
-            updated_content = action_data["updated_content"]
-
-            user_memories.data.update(
-                uuid=target_uuid,
-                properties={"content": updated_content},
-            )
-            print(f"\n  ✓ Updated memory {target_uuid}")
-            print(f"    - From: {old_content}")
-            print(f"    - To:   {updated_content}")
-            print(f"    - Why: {reasoning}")
-
-        elif action == "INVALIDATE":
-            target_uuid = action_data["target_uuid"]
-            # Fetch the memory to show what is being invalidated.
-            invalidated_memory_obj = user_memories.query.fetch_object_by_id(uuid=target_uuid)
-            invalidated_content = invalidated_memory_obj.properties["content"]
-
-            user_memories.data.update(
-                uuid=target_uuid,
-                properties={"invalidation_time": datetime.now(timezone.utc)},
-            )
-            user_memories.data.insert({"content": fact})
-            print(f"\n  ✓ Invalidated memory {target_uuid}: '{invalidated_content}'")
-            print(f"  ✓ Added new memory: {fact}")
-            print(f"  - Why: {reasoning}")
-
-
-def chat(user_id: str, message: str, memory_collection: Collection):
-    """Chat with memory retrieval"""
+    # STEP 1: Extract - What's worth remembering?
+    facts = extract_facts(user_message, assistant_response, memories_text, stats)
+    if not facts:
+        stats.wall_time = time.perf_counter() - started
+        return
+
+    print(f"Extracted: {facts}")
+
+    # STEP 2: Consolidate - How does each fact relate to existing memories?
+    # Lookups and LLM decisions run concurrently; writes are applied in fact order.
+    with tracing.span("memory.consolidate", facts=len(facts)):
+        consolidation_engine.consolidate(user_memories, facts, stats, vector_fn=memory_vector)
+    stats.wall_time = time.perf_counter() - started
+
+
+def chat(
+    user_id: str,
+    message: str,
+    memory_collection: Collection,
+    memory_queue: MemoryWriteQueue | None = None,
+    wait_for_memories: bool = False,
+):
+    """Chat with memory retrieval.
+
+    With a `memory_queue`, extraction and consolidation run in the background after
+    the answer is returned. `wait_for_memories` first waits for this user's queued
+    writes, so retrieval sees memories from the previous turn.
+    """
 
     user_memories = memory_collection.with_tenant(user_id)
 
+    if memory_queue is not None and wait_for_memories:
+        memory_queue.wait_drained(user_id)
+
+    def retrieve() -> list[dict]:
+        if memory_cache is not None:
+            return memory_cache.search(user_memories, message, limit=5)
+        return [
+            m.properties
+            for m in user_memories.query.hybrid(
+                query=message,
+                limit=5,
+                filters=Filter.by_property("invalidation_time").is_none(True),
+            ).objects
+        ]
+
     # STEP 1: Retrieve relevant valid memories
-    relevant = user_memories.query.hybrid(
-        query=message,
-        limit=5,
-        filters=Filter.by_property("invalidation_time").is_none(True),
-    )
+    with tracing.span("memory.retrieve", cached=memory_cache is not None) as attrs:
+        if tenant_activity is not None:
+            # A sweeper, here or in another process, may have made the tenant cold since the last turn
+            relevant = tenant_activity.run(user_id, retrieve)
+        else:
+            relevant = retrieve()
+        attrs["hits"] = len(relevant)
 
     memories_text = "\n".join(
-        [f"- {m.properties['content']}" for m in relevant.objects]
+        [f"- {m['content']}" for m in relevant]
     )
 
     # STEP 2: Generate response with memory context
-    response = anthropic_client.messages.create(
-        model="claude-haiku-4-5",
-        max_tokens=2048,
-        system="You are a helpful assistant that answers questions given the current context and memories about the user. You tend to be succint where possible, without being terse. You are still friendly and engaging, but not overly verbose. You do not always finish your responses with a question. Sometimes you just answer the question directly.",
-        messages=[
-            {
-                "role": "user",
-                "content": f"""
+    with tracing.span("llm.chat", model="claude-haiku-4-5") as attrs:
+        response = anthropic_client.messages.create(
+            model="claude-haiku-4-5",
+            max_tokens=2048,
+            system="You are a helpful assistant that answers questions given the current context and memories about the user. You tend to be succint where possible, without being terse. You are still friendly and engaging, but not overly verbose. You do not always finish your responses with a question. Sometimes you just answer the question directly.",
+            messages=[
+                {
+                    "role": "user",
+                    "content": f"""
             Memories about the user:
             {memories_text}
 
             User: {message}
             Assistant:
         """,
-            }
-        ],
-    )
+                }
+            ],
+        )
+        tracing.record_llm_usage(attrs, response)
 
     answer = response.content[0].text
 
     # STEP 3: Extract and consolidate new memories
-    extract_and_consolidate(user_id, message, answer, memories_text, memory_collection)
+    if memory_queue is not None:
+        memory_queue.submit(user_id, message, answer, memories_text, memory_collection)
+    else:
+        extract_and_consolidate(user_id, message, answer, memories_text, memory_collection)
 
     return answer
 
@@ -272,11 +279,79 @@ app = typer.Typer()
 
 
 @app.command()
-def main():
+def main(
+    embedding_cache_dir: str = typer.Option(
+        None,
+        "--embedding-cache",
+        help="Directory for a local embedding cache; memories are inserted with precomputed vectors",
+    ),
+    consolidation: str = typer.Option(
+        "per-fact",
+        help=f"Consolidation strategy: {', '.join(CONSOLIDATION_STRATEGIES)}. "
+        "'batched' decides all facts of a turn in one LLM call",
+    ),
+    consolidation_concurrency: int = typer.Option(
+        4,
+        help="Max facts consolidated in parallel (similarity lookup + LLM decision)",
+    ),
+    background_memory: bool = typer.Option(
+        True,
+        help="Extract and consolidate memories in the background, after the answer is shown",
+    ),
+    wait_for_memories: bool = typer.Option(
+        False,
+        help="With background memory, wait for the previous turn's writes before retrieving",
+    ),
+    use_memory_cache: bool = typer.Option(
+        False,
+        "--memory-cache",
+        help="Load the user's valid memories at login and search them locally, writing changes through",
+    ),
+    local_search_limit: int = typer.Option(
+        500,
+        help="With --memory-cache, users with more valid memories than this are searched in Weaviate",
+    ),
+    use_extraction_gate: bool = typer.Option(
+        False,
+        "--extraction-gate",
+        help="Skip the extraction LLM call on turns a local check finds nothing personal in",
+    ),
+    tenant_idle_minutes: float = typer.Option(
+        0,
+        help="Make users' tenants cold after this many idle minutes (0 keeps every tenant active)",
+    ),
+    cold_status: str = typer.Option(
+        "inactive",
+        help=f"Status idle tenants are moved to: {', '.join(COLD_STATUSES)}",
+    ),
+):
     """Main chat application"""
+    global embedding_cache, memory_cache, consolidation_engine, extraction_gate, tenant_activity
+    extraction_gate = use_extraction_gate
+
     with connect_to_weaviate() as db_client:
         memory_collection = get_or_create_collection(db_client)
 
+        if use_memory_cache or embedding_cache_dir:
+            # Vectors embedded here must live in the same space, and have the same length, as the collection's
+            embed_model = collection_embed_model(memory_collection)
+            if embed_model is None:
+                print(
+                    "The Memory collection uses the server's default Cohere model, so --embedding-cache and "
+                    "--memory-cache can't embed to match it. Reset it with basic_reset_memory.py first."
+                )
+                return
+            if use_memory_cache:
+                memory_cache = MemoryCache(
+                    query_embedder=CohereEmbedder(model=embed_model, input_type="search_query"),
+                    local_search_limit=local_search_limit,
+                )
+            if embedding_cache_dir:
+                embedding_cache = EmbeddingCache(embedding_cache_dir, CohereEmbedder(model=embed_model))
+        consolidation_engine = make_engine(
+            consolidation, max_concurrency=consolidation_concurrency, memory_cache=memory_cache
+        )
+
         existing_users = list(memory_collection.tenants.get().keys())
 
         if not existing_users:
@@ -309,58 +384,120 @@ def main():
             print(f"Created new user memory store for {user_id}.")
         user_memories = memory_collection.with_tenant(user_id)
 
-        # Simple chat loop
-        print(f"Logged in as {user_id}.")
-        print("💬 Memory Demo (type '/' for commands, e.g., /memories, /invalidated, /quit)\n")
-
-        while True:
-            try:
-                user_input = questionary.text(
-                    "You: ",
-                ).ask()
-            except KeyboardInterrupt:
-                # Handle Ctrl+C gracefully
-                break
-
-            if user_input is None:
-                break
-
-            if user_input[0] == "/":
-                if user_input.lower().strip() == "/quit":
+        memory_queue = MemoryWriteQueue(extract_and_consolidate) if background_memory else None
+        try:
+            if tenant_idle_minutes > 0:
+                tenant_activity = TenantActivityManager(
+                    memory_collection,
+                    idle_timeout=tenant_idle_minutes * 60,
+                    cold_status=cold_status,
+                    is_busy=lambda name: memory_queue is not None and memory_queue.pending(name) > 0,
+                )
+                # Reactivate before the first query, e.g. the memory cache load below
+                tenant_activity.activate(user_id)
+                tenant_activity.start()
+
+            if memory_cache is not None:
+                if memory_cache.load(user_memories):
+                    print("Loaded memories into the local cache.")
+                else:
+                    print(f"More than {local_search_limit} memories; searching them in Weaviate.")
+
+            # Simple chat loop
+            print(f"Logged in as {user_id}.")
+            print("💬 Memory Demo (type '/' for commands, e.g., /memories, /invalidated, /stats, /tenants, /quit)\n")
+
+            while True:
+                if memory_queue is not None:
+                    # Show what background memory writes printed since the last prompt
+                    memory_queue.release_output()
+                try:
+                    user_input = questionary.text(
+                        "You: ",
+                    ).ask()
+                except KeyboardInterrupt:
+                    # Handle Ctrl+C gracefully
                     break
 
-                elif user_input.lower().strip() == "/memories" or user_input.lower().strip() == "/invalidated":
-                    if user_input.lower().strip() == "/memories":
-                        filter = Filter.by_property("invalidation_time").is_none(True)
-                        print("\n📝 Current memories:")
-                    else:
-                        filter = Filter.by_property("invalidation_time").is_none(False)
-                        print("\n🗂️ Invalidated memories:")
-
-                    retrieved_memories = user_memories.query.fetch_objects(
-                        filters=filter,
-                        limit=50,
-                        return_metadata=MetadataQuery(
-                            creation_time=True, last_update_time=True
-                        ),
-                    )
-                    for m in retrieved_memories.objects:
-                        print(f"\n  - UUID: {m.uuid}")
-                        print(f"    Content: {m.properties['content']}")
-                        print(f"    Created: {m.metadata.creation_time}")
-                        print(f"    Updated: {m.metadata.last_update_time}")
-                        if m.properties["invalidation_time"]:
-                            print(f"    Invalidated: {m.properties['invalidation_time']}")
-
-                    print()
-                    continue
+                if user_input is None:
+                    break
 
-                else:
-                    print(f"Unknown command: {user_input}")
-                    continue
+                if user_input[0] == "/":
+                    if user_input.lower().strip() == "/quit":
+                        break
+
+                    elif user_input.lower().strip() == "/memories" or user_input.lower().strip() == "/invalidated":
+                        if memory_queue is not None:
+                            # Show memories including the ones still being written
+                            memory_queue.wait_drained(user_id)
+                            memory_queue.release_output()
+                        if user_input.lower().strip() == "/memories":
+                            filter = Filter.by_property("invalidation_time").is_none(True)
+                            print("\n📝 Current memories:")
+                        else:
+                            filter = Filter.by_property("invalidation_time").is_none(False)
+                            print("\n🗂️ Invalidated memories:")
+
+                        def fetch():
+                            return user_memories.query.fetch_objects(
+                                filters=filter,
+                                limit=50,
+                                return_metadata=MetadataQuery(
+                                    creation_time=True, last_update_time=True
+                                ),
+                            )
+
+                        # Like chat(): the tenant may have been made cold while idle
+                        retrieved_memories = tenant_activity.run(user_id, fetch) if tenant_activity is not None else fetch()
+                        for m in retrieved_memories.objects:
+                            print(f"\n  - UUID: {m.uuid}")
+                            print(f"    Content: {m.properties['content']}")
+                            print(f"    Created: {m.metadata.creation_time}")
+                            print(f"    Updated: {m.metadata.last_update_time}")
+                            if m.properties["invalidation_time"]:
+                                print(f"    Invalidated: {m.properties['invalidation_time']}")
+
+                        print()
+                        continue
+
+                    elif user_input.lower().strip() == "/stats":
+                        print(f"\n📊 Memory cost ({consolidation}, {len(turn_stats)} turns):")
+                        for i, t in enumerate(turn_stats, 1):
+                            print(
+                                f"  Turn {i}: {t.llm_calls} LLM calls, "
+                                f"{t.input_tokens} in / {t.output_tokens} out tokens, {t.wall_time:.1f}s"
+                                + (" (extraction skipped)" if t.extraction_skipped else "")
+                            )
+                        print()
+                        continue
+
+                    elif user_input.lower().strip() == "/tenants":
+                        if tenant_activity is None:
+                            print("Tenant lifecycle is off; start with --tenant-idle-minutes.\n")
+                        else:
+                            print(f"\n🏘️ {tenant_activity.report()}\n")
+                        continue
 
-            response = chat(user_id, user_input, memory_collection)
-            print(f"\nAssistant: {response}\n")
+                    else:
+                        print(f"Unknown command: {user_input}")
+                        continue
+
+                response = chat(
+                    user_id,
+                    user_input,
+                    memory_collection,
+                    memory_queue=memory_queue,
+                    wait_for_memories=wait_for_memories,
+                )
+                print(f"\nAssistant: {response}\n")
+        finally:
+            # Also on an unexpected error: finish the queued memory writes rather than drop them
+            if memory_queue is not None:
+                if memory_queue.pending():
+                    print("Saving memories...")
+                memory_queue.close()
+            if tenant_activity is not None:
+                tenant_activity.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,269 @@
+import gzip
+import json
+import os
+import statistics
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+import typer
+from weaviate.classes.query import Filter, MetadataQuery
+from weaviate.classes.tenants import Tenant, TenantActivityStatus
+from weaviate.collections import Collection
+
+from extraction_gate import split_sentences
+from memory_cache import cosine
+from tenant_lifecycle import status_name
+
+ARCHIVE_DIR = "./memory_archive"
+
+
+@dataclass
+class CompactionStats:
+    tenant: str
+    valid_before: int = 0
+    invalidated_before: int = 0
+    archived: int = 0
+    merged: int = 0
+    bytes_removed: int = 0
+    search_ms_before: float = 0.0
+    search_ms_after: float = 0.0
+    clusters: list[list[str]] = field(default_factory=list)
+
+    @property
+    def removed(self) -> int:
+        return self.archived + self.merged
+
+
+def fetch_memories(user_memories: Collection, include_vector: bool = False) -> list:
+    return list(user_memories.iterator(
+        include_vector=include_vector,
+        return_metadata=MetadataQuery(creation_time=True, last_update_time=True),
+    ))
+
+
+def object_bytes(obj) -> int:
+    """Rough size of a memory: its content plus a float32 vector when one was fetched"""
+    vector = (obj.vector or {}).get("default") or []
+    return len(obj.properties["content"].encode()) + 4 * len(vector)
+
+
+def archive_record(obj, reason: str, **extra) -> dict:
+    invalidation_time = obj.properties.get("invalidation_time")
+    return {
+        "uuid": str(obj.uuid),
+        "content": obj.properties["content"],
+        "invalidation_time": invalidation_time.isoformat() if invalidation_time else None,
+        "created": obj.metadata.creation_time.isoformat() if obj.metadata.creation_time else None,
+        "updated": obj.metadata.last_update_time.isoformat() if obj.metadata.last_update_time else None,
+        "reason": reason,
+        **extra,
+    }
+
+
+def write_archive(tenant: str, records: list[dict], archive_dir: str = ARCHIVE_DIR):
+    """Append to the tenant's gzipped JSONL archive; each run adds a gzip member"""
+    os.makedirs(archive_dir, exist_ok=True)
+    with gzip.open(os.path.join(archive_dir, f"{tenant}.jsonl.gz"), "at") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def delete_in_batches(user_memories: Collection, uuids: list[str], batch_size: int, pause: float):
+    for start in range(0, len(uuids), batch_size):
+        batch = uuids[start:start + batch_size]
+        user_memories.data.delete_many(where=Filter.by_id().contains_any(batch))
+        # Leave room for live chat traffic between batches
+        time.sleep(pause)
+
+
+def near_duplicate_clusters(memories: list, threshold: float) -> list[list]:
+    """Groups of valid memories whose vectors are at least `threshold` cosine-similar (single link)"""
+    memories = [m for m in memories if (m.vector or {}).get("default")]
+    parent = list(range(len(memories)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(len(memories)):
+        for j in range(i + 1, len(memories)):
+            if cosine(memories[i].vector["default"], memories[j].vector["default"]) >= threshold:
+                parent[find(j)] = find(i)
+
+    groups: dict[int, list] = {}
+    for i, m in enumerate(memories):
+        groups.setdefault(find(i), []).append(m)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def merged_content(kept, duplicates: list) -> str:
+    """The kept memory's content plus any sentences only the duplicates state, so no fact is lost"""
+    sentences = split_sentences(kept.properties["content"])
+    seen = {s.rstrip(".!?").lower() for s in sentences}
+    for m in sorted(duplicates, key=lambda m: m.metadata.last_update_time or m.metadata.creation_time, reverse=True):
+        for sentence in split_sentences(m.properties["content"]):
+            if sentence.rstrip(".!?").lower() not in seen:
+                seen.add(sentence.rstrip(".!?").lower())
+                sentences.append(sentence if sentence[-1] in ".!?" else sentence + ".")
+    return " ".join(sentences)
+
+
+def search_latency_ms(user_memories: Collection, queries: list[str]) -> float:
+    """Median latency of the chat's retrieval query over `queries`"""
+    if not queries:
+        return 0.0
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        user_memories.query.hybrid(
+            query=query,
+            limit=5,
+            filters=Filter.by_property("invalidation_time").is_none(True),
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies)
+
+
+def compact_tenant(
+    user_memories: Collection,
+    retention: timedelta,
+    similarity: float = 0.95,
+    archive: bool = True,
+    merge: bool = True,
+    dry_run: bool = False,
+    batch_size: int = 100,
+    pause: float = 0.1,
+    latency_queries: int = 20,
+) -> CompactionStats:
+    """Archive (or delete) old invalidated memories and merge near-duplicate valid ones.
+
+    Of each cluster of near-duplicates, the most recently updated memory is kept,
+    as the consolidation step treats the latest statement of a fact as current.
+    Sentences only the others state are appended to it, then the others are
+    archived with a pointer to it and deleted.
+    """
+    stats = CompactionStats(tenant=user_memories.tenant)
+    memories = fetch_memories(user_memories, include_vector=True)
+    valid = [m for m in memories if m.properties.get("invalidation_time") is None]
+    invalidated = [m for m in memories if m.properties.get("invalidation_time") is not None]
+    stats.valid_before = len(valid)
+    stats.invalidated_before = len(invalidated)
+
+    queries = [m.properties["content"] for m in valid[:latency_queries]]
+    stats.search_ms_before = search_latency_ms(user_memories, queries)
+
+    cutoff = datetime.now(timezone.utc) - retention
+    expired = [m for m in invalidated if m.properties["invalidation_time"] < cutoff]
+    records = [archive_record(m, "invalidated") for m in expired]
+    to_delete = [str(m.uuid) for m in expired]
+    to_update = {}  # kept memory uuid -> merged content
+    stats.archived = len(expired)
+    stats.bytes_removed += sum(object_bytes(m) for m in expired)
+
+    if merge:
+        for cluster in near_duplicate_clusters(valid, similarity):
+            newest = max(cluster, key=lambda m: m.metadata.last_update_time or m.metadata.creation_time)
+            duplicates = [m for m in cluster if m is not newest]
+            content = merged_content(newest, duplicates)
+            if content != newest.properties["content"]:
+                to_update[str(newest.uuid)] = content
+            stats.clusters.append([content] + [m.properties["content"] for m in duplicates])
+            records.extend(archive_record(m, "merged", merged_into=str(newest.uuid)) for m in duplicates)
+            to_delete.extend(str(m.uuid) for m in duplicates)
+            stats.merged += len(duplicates)
+            stats.bytes_removed += sum(object_bytes(m) for m in duplicates)
+
+    if dry_run or not to_delete:
+        stats.search_ms_after = stats.search_ms_before
+        return stats
+
+    # Archive first, so a failed delete never loses a memory
+    if archive:
+        write_archive(user_memories.tenant, records)
+    # And merge before deleting, so the duplicates' facts are never only in the archive
+    for uuid, content in to_update.items():
+        # No vector: Weaviate re-embeds the new content
+        user_memories.data.update(uuid=uuid, properties={"content": content})
+    delete_in_batches(user_memories, to_delete, batch_size, pause)
+
+    stats.search_ms_after = search_latency_ms(user_memories, queries)
+    return stats
+
+
+app = typer.Typer()
+
+
+@app.command()
+def main(
+    tenants: list[str] = typer.Argument(None, help="Tenants to compact (default: all active tenants)"),
+    retention_days: float = typer.Option(30, help="Keep invalidated memories this long before archiving them"),
+    similarity: float = typer.Option(0.95, help="Cosine similarity at or above which valid memories are merged"),
+    archive: bool = typer.Option(True, help=f"Write removed memories to {ARCHIVE_DIR}/<tenant>.jsonl.gz; --no-archive just deletes"),
+    merge: bool = typer.Option(True, help="Merge near-duplicate valid memories"),
+    include_cold: bool = typer.Option(False, help="Also compact inactive tenants; they are reactivated and left for the tenant sweeper to make cold again"),
+    dry_run: bool = typer.Option(False, help="Report what would be removed without changing anything"),
+    batch_size: int = typer.Option(100, help="Deletes per request"),
+    pause: float = typer.Option(0.1, help="Seconds to sleep between delete batches and between tenants"),
+):
+    """Compact the Memory collection tenant by tenant, in small throttled batches alongside live chat"""
+    from basic import connect_to_weaviate, get_or_create_collection
+
+    with connect_to_weaviate() as db_client:
+        memory_collection = get_or_create_collection(db_client)
+        all_tenants = memory_collection.tenants.get()
+        names = tenants or list(all_tenants)
+
+        results = []
+        for name in names:
+            tenant = all_tenants.get(name)
+            if tenant is None:
+                print(f"{name}: no such tenant")
+                continue
+            cold = tenant.activity_status != TenantActivityStatus.ACTIVE
+            if cold and not include_cold:
+                print(f"{name}: skipped ({status_name(tenant.activity_status)})")
+                continue
+            if cold:
+                # Left ACTIVE afterwards: a user may log in meanwhile, and freezing the tenant under
+                # them would break their chat. The tenant sweeper makes it cold again once idle.
+                memory_collection.tenants.update(
+                    tenants=[Tenant(name=name, activity_status=TenantActivityStatus.ACTIVE)]
+                )
+
+            stats = compact_tenant(
+                memory_collection.with_tenant(name),
+                retention=timedelta(days=retention_days),
+                similarity=similarity,
+                archive=archive,
+                merge=merge,
+                dry_run=dry_run,
+                batch_size=batch_size,
+                pause=pause,
+            )
+            results.append(stats)
+
+            print(
+                f"{name}: {stats.valid_before} valid, {stats.invalidated_before} invalidated -> "
+                f"archived {stats.archived}, merged {stats.merged} ({stats.bytes_removed / 1024:.1f} KiB); "
+                f"search p50 {stats.search_ms_before:.1f}ms -> {stats.search_ms_after:.1f}ms"
+            )
+            for cluster in stats.clusters:
+                print(f"  kept:   {cluster[0]}")
+                for content in cluster[1:]:
+                    print(f"  merged: {content}")
+            time.sleep(pause)
+
+    before = sum(r.valid_before + r.invalidated_before for r in results)
+    removed = sum(r.removed for r in results)
+    print(
+        f"\n{'Would remove' if dry_run else 'Removed'} {removed}/{before} memories "
+        f"({removed / max(before, 1):.0%}, {sum(r.bytes_removed for r in results) / 1024:.1f} KiB) "
+        f"across {len(results)} tenants"
+    )
+
+
+if __name__ == "__main__":
+    app()
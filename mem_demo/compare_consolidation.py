@@ -0,0 +1,51 @@
+import typer
+from uuid import uuid4
+
+import basic
+from basic import chat, connect_to_weaviate, get_or_create_collection
+from consolidation import CONSOLIDATION_STRATEGIES, make_engine
+from transcript import load_turns
+
+
+app = typer.Typer()
+
+
+@app.command()
+def main(script: str = "script_example.md", concurrency: int = 4):
+    """Run the same script through each consolidation strategy and compare LLM calls, tokens and time per turn"""
+    turns = load_turns(script)
+
+    with connect_to_weaviate() as db_client:
+        memory_collection = get_or_create_collection(db_client)
+        results = {}
+
+        for strategy in CONSOLIDATION_STRATEGIES:
+            # A throwaway tenant per strategy, so both start from an empty memory
+            user_id = f"compare-{strategy}-{uuid4().hex[:8]}"
+            memory_collection.tenants.create(tenants=[user_id])
+            basic.consolidation_engine = make_engine(strategy, max_concurrency=concurrency)
+            basic.turn_stats.clear()
+
+            print(f"\n=== {strategy} ({user_id}) ===")
+            try:
+                for turn in turns:
+                    print(f"\nYou: {turn}")
+                    chat(user_id, turn, memory_collection)
+            finally:
+                memory_collection.tenants.remove([user_id])
+
+            results[strategy] = list(basic.turn_stats)
+
+    print(f"\n{'strategy':<10} {'turn':>4} {'calls':>6} {'in tok':>8} {'out tok':>8} {'wall s':>7}")
+    for strategy, stats in results.items():
+        for i, t in enumerate(stats, 1):
+            print(f"{strategy:<10} {i:>4} {t.llm_calls:>6} {t.input_tokens:>8} {t.output_tokens:>8} {t.wall_time:>7.1f}")
+        print(
+            f"{strategy:<10} {'all':>4} {sum(t.llm_calls for t in stats):>6} "
+            f"{sum(t.input_tokens for t in stats):>8} {sum(t.output_tokens for t in stats):>8} "
+            f"{sum(t.wall_time for t in stats):>7.1f}"
+        )
+
+
+if __name__ == "__main__":
+    app()
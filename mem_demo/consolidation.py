@@ -0,0 +1,394 @@
+import anthropic
+import asyncio
+import json
+import textwrap
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from weaviate.classes.query import Filter
+from weaviate.collections import Collection
+
+import shared  # before tracing, which lives in ../better_context
+import tracing
+
+CONSOLIDATION_MODEL = "claude-sonnet-4-5"
+
+CONSOLIDATION_PROMPT_TEMPLATE = textwrap.dedent(
+    """
+    New fact: {fact}
+    Existing memories: {existing_memories}
+
+    Choose one action:
+    - ADD: Completely new information not related to existing memories
+    - UPDATE: Refines or adds detail to existing memory without contradicting it
+    - INVALIDATE: Contradicts existing memory (old info is now false/outdated)
+    - NOOP: Information already accurately captured
+
+    For UPDATE: provide updated_content and target_uuid
+    For INVALIDATE: provide target_uuid (old memory will be marked invalid, new fact added)
+
+    Always explain your reasoning for the chosen action. Be succinct when possible.
+
+    Return JSON with your decision.
+    """
+)
+
+BATCH_CONSOLIDATION_PROMPT_TEMPLATE = textwrap.dedent(
+    """
+    New facts:
+    {facts}
+
+    Existing memories: {existing_memories}
+
+    For EACH new fact, choose one action:
+    - ADD: Completely new information not related to existing memories
+    - UPDATE: Refines or adds detail to existing memory without contradicting it
+    - INVALIDATE: Contradicts existing memory (old info is now false/outdated)
+    - NOOP: Information already accurately captured
+
+    For UPDATE: provide updated_content and target_uuid
+    For INVALIDATE: provide target_uuid (old memory will be marked invalid, new fact added)
+
+    Return exactly one decision per fact, with its fact_index.
+    Do not target the same existing memory from more than one fact.
+
+    Always explain your reasoning for the chosen action. Be succinct when possible.
+
+    Return JSON with your decisions.
+    """
+)
+
+DECISION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "action": {
+            "type": "string",
+            "enum": ["ADD", "UPDATE", "INVALIDATE", "NOOP"],
+        },
+        "reasoning": {"type": "string"},
+        "target_uuid": {"type": "string"},
+        "updated_content": {"type": "string"},
+    },
+    "required": ["action", "reasoning"],
+    "additionalProperties": False,
+}
+
+
+BATCH_DECISION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "decisions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "fact_index": {"type": "integer"},
+                    **DECISION_SCHEMA["properties"],
+                },
+                "required": ["fact_index", "action", "reasoning"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["decisions"],
+    "additionalProperties": False,
+}
+
+
+@dataclass
+class TurnStats:
+    """LLM calls, tokens and wall time spent on memory for one chat turn"""
+
+    llm_calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    wall_time: float = 0.0
+    extraction_skipped: bool = False
+
+    def record(self, response):
+        self.llm_calls += 1
+        self.input_tokens += response.usage.input_tokens
+        self.output_tokens += response.usage.output_tokens
+
+
+@dataclass
+class Decision:
+    fact: str
+    action: str
+    reasoning: str
+    target_uuid: str | None = None
+    updated_content: str | None = None
+    # uuid -> content of the memories the LLM was shown for this fact
+    candidates: dict[str, str] = field(default_factory=dict)
+    # INVALIDATE also adds the fact, unless an earlier fact this turn already added it
+    add_fact: bool = True
+
+
+def find_similar(user_memories: Collection, fact: str) -> list[dict]:
+    """Valid memories most similar to `fact`, as dicts with a `uuid` key"""
+    similar = user_memories.query.hybrid(
+        query=fact,
+        limit=10,
+        filters=Filter.by_property("invalidation_time").is_none(True),
+    )
+
+    existing_memories = []
+    for m in similar.objects:
+        new_m = dict(m.properties)
+        new_m["uuid"] = str(m.uuid)
+        existing_memories.append(new_m)
+    return existing_memories
+
+
+async def decide(llm: anthropic.AsyncAnthropic, fact: str, existing_memories: list[dict], stats: TurnStats) -> Decision:
+    """Ask the LLM: ADD, UPDATE, INVALIDATE, or NOOP?"""
+    with tracing.span("llm.consolidate", model=CONSOLIDATION_MODEL, facts=1) as attrs:
+        response = await llm.beta.messages.create(
+            model=CONSOLIDATION_MODEL,
+            max_tokens=1024,
+            betas=["structured-outputs-2025-11-13"],
+            messages=[
+                {
+                    "role": "user",
+                    "content": CONSOLIDATION_PROMPT_TEMPLATE.format(
+                        fact=fact, existing_memories=existing_memories
+                    ),
+                }
+            ],
+            output_format={"type": "json_schema", "schema": DECISION_SCHEMA},
+        )
+        tracing.record_llm_usage(attrs, response)
+    stats.record(response)
+
+    action_data = json.loads(response.content[0].text)
+    return Decision(
+        fact=fact,
+        action=action_data["action"],
+        reasoning=action_data["reasoning"],
+        target_uuid=action_data.get("target_uuid"),
+        updated_content=action_data.get("updated_content"),
+        candidates={m["uuid"]: m["content"] for m in existing_memories},
+    )
+
+
+def resolve_conflicts(decisions: list[Decision]) -> list[Decision]:
+    """Make concurrently-made decisions safe to apply in fact order.
+
+    Each decision was made without seeing the others, so:
+    - an UPDATE without updated_content is treated as ADD, so the fact is kept
+    - a target_uuid the LLM was not shown is treated as ADD
+    - only the first UPDATE of a memory applies; later ones become ADD so no refinement is lost
+    - a memory invalidated by an earlier fact is not updated or invalidated again; the fact is added
+    - repeated ADDs of the same content collapse into one, and an INVALIDATE of a fact
+      already added only invalidates
+    """
+    resolved = []
+    touched: dict[str, str] = {}  # target_uuid -> action already applied to it
+    added = set()
+
+    for d in decisions:
+        if d.action == "UPDATE" and not (d.updated_content or "").strip():
+            d = Decision(d.fact, "ADD", f"{d.reasoning} (UPDATE without updated_content, added instead)")
+
+        if d.action in ("UPDATE", "INVALIDATE"):
+            if d.target_uuid not in d.candidates:
+                d = Decision(d.fact, "ADD", f"{d.reasoning} (unknown target {d.target_uuid}, added instead)")
+            elif d.target_uuid in touched and (d.action == "UPDATE" or touched[d.target_uuid] == "INVALIDATE"):
+                d = Decision(
+                    d.fact, "ADD",
+                    f"{d.reasoning} (memory {d.target_uuid} already changed by another fact this turn, added instead)",
+                )
+            else:
+                touched[d.target_uuid] = d.action
+
+        if d.action in ("ADD", "INVALIDATE"):
+            key = d.fact.strip().lower()
+            if key in added:
+                if d.action == "ADD":
+                    d = Decision(d.fact, "NOOP", "Same fact already added this turn")
+                else:
+                    d = replace(d, add_fact=False, reasoning=f"{d.reasoning} (fact already added this turn)")
+            added.add(key)
+
+        resolved.append(d)
+    return resolved
+
+
+def _drop_if_deleted(user_memories: Collection, uuid: str, memory_cache=None) -> bool:
+    """After a failed write: True if the memory no longer exists (e.g. compaction.py merged it away
+    while the chat ran), in which case it is also dropped from `memory_cache`"""
+    if user_memories.query.fetch_object_by_id(uuid) is not None:
+        return False
+    if memory_cache is not None:
+        memory_cache.invalidated(user_memories, uuid)
+    return True
+
+
+def apply_decision(user_memories: Collection, d: Decision, vector_fn=lambda content: None, memory_cache=None):
+    """Execute one consolidation decision, writing through to `memory_cache` if given"""
+    tracing.count("consolidation.action", action=d.action)
+    if d.action == "ADD":
+        vector = vector_fn(d.fact)
+        uuid = user_memories.data.insert({"content": d.fact}, vector=vector)
+        if memory_cache is not None:
+            memory_cache.added(user_memories, uuid, d.fact, vector)
+        print(f"\n  ✓ Added: {d.fact}")
+        print(f"    Why: {d.reasoning}")
+
+    elif d.action == "UPDATE":
+        # The LLM was shown the old memory, so no need to fetch it to show what changed
+        old_content = d.candidates[d.target_uuid]
+
+        vector = vector_fn(d.updated_content)
+        try:
+            user_memories.data.update(
+                uuid=d.target_uuid,
+                properties={"content": d.updated_content},
+                vector=vector,
+            )
+        except Exception:
+            if not _drop_if_deleted(user_memories, d.target_uuid, memory_cache):
+                raise
+            # Keep the refined fact rather than lose it with the memory
+            apply_decision(
+                user_memories,
+                Decision(d.updated_content, "ADD", f"{d.reasoning} (memory {d.target_uuid} no longer exists, added instead)"),
+                vector_fn,
+                memory_cache,
+            )
+            return
+        if memory_cache is not None:
+            memory_cache.updated(user_memories, d.target_uuid, d.updated_content, vector)
+        print(f"\n  ✓ Updated memory {d.target_uuid}")
+        print(f"    - From: {old_content}")
+        print(f"    - To:   {d.updated_content}")
+        print(f"    - Why: {d.reasoning}")
+
+    elif d.action == "INVALIDATE":
+        invalidated_content = d.candidates[d.target_uuid]
+
+        try:
+            user_memories.data.update(
+                uuid=d.target_uuid,
+                properties={"invalidation_time": datetime.now(timezone.utc)},
+            )
+        except Exception:
+            # Already gone is as good as invalidated
+            if not _drop_if_deleted(user_memories, d.target_uuid, memory_cache):
+                raise
+        if memory_cache is not None:
+            memory_cache.invalidated(user_memories, d.target_uuid)
+        print(f"\n  ✓ Invalidated memory {d.target_uuid}: '{invalidated_content}'")
+        if d.add_fact:
+            vector = vector_fn(d.fact)
+            uuid = user_memories.data.insert({"content": d.fact}, vector=vector)
+            if memory_cache is not None:
+                memory_cache.added(user_memories, uuid, d.fact, vector)
+            print(f"  ✓ Added new memory: {d.fact}")
+        print(f"  - Why: {d.reasoning}")
+
+
+class ConsolidationEngine:
+    """Runs the similarity lookup and LLM decision for every fact concurrently,
+    then applies the writes one by one, in fact order, after resolving conflicts."""
+
+    def __init__(self, max_concurrency: int = 4, memory_cache=None):
+        self.max_concurrency = max_concurrency
+        self.memory_cache = memory_cache
+
+    def find_similar(self, user_memories: Collection, fact: str) -> list[dict]:
+        if self.memory_cache is not None:
+            return self.memory_cache.search(user_memories, fact, limit=10)
+        return find_similar(user_memories, fact)
+
+    async def decide_all(self, user_memories: Collection, facts: list[str], stats: TurnStats) -> list[Decision]:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        # A fresh async client per run, as its connection pool is tied to this event loop
+        async with anthropic.AsyncAnthropic() as llm:
+
+            async def one(fact: str) -> Decision:
+                async with semaphore:
+                    # The sync Weaviate client is safe to call from worker threads
+                    existing_memories = await asyncio.to_thread(self.find_similar, user_memories, fact)
+                    return await decide(llm, fact, existing_memories, stats)
+
+            # gather keeps results in fact order, whatever order they finish in
+            return await asyncio.gather(*(one(fact) for fact in facts))
+
+    def consolidate(self, user_memories: Collection, facts: list[str], stats: TurnStats, vector_fn=lambda content: None):
+        decisions = asyncio.run(self.decide_all(user_memories, facts, stats))
+        for d in resolve_conflicts(decisions):
+            apply_decision(user_memories, d, vector_fn, self.memory_cache)
+
+
+class BatchedConsolidationEngine(ConsolidationEngine):
+    """Runs all similarity lookups, then decides every fact in one structured-output call.
+
+    Candidate memories are deduplicated across facts, so each one is sent once
+    instead of once per fact. Facts the LLM leaves out are decided individually.
+    """
+
+    async def decide_all(self, user_memories: Collection, facts: list[str], stats: TurnStats) -> list[Decision]:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def lookup(fact: str) -> list[dict]:
+            async with semaphore:
+                return await asyncio.to_thread(self.find_similar, user_memories, fact)
+
+        similar_per_fact = await asyncio.gather(*(lookup(fact) for fact in facts))
+
+        union = {}
+        for similar in similar_per_fact:
+            for m in similar:
+                union.setdefault(m["uuid"], m)
+        existing_memories = list(union.values())
+        candidates = {m["uuid"]: m["content"] for m in existing_memories}
+
+        async with anthropic.AsyncAnthropic() as llm:
+            with tracing.span("llm.consolidate", model=CONSOLIDATION_MODEL, facts=len(facts)) as attrs:
+                response = await llm.beta.messages.create(
+                    model=CONSOLIDATION_MODEL,
+                    max_tokens=1024 + 256 * len(facts),
+                    betas=["structured-outputs-2025-11-13"],
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": BATCH_CONSOLIDATION_PROMPT_TEMPLATE.format(
+                                facts="\n".join(f"{i}. {fact}" for i, fact in enumerate(facts)),
+                                existing_memories=existing_memories,
+                            ),
+                        }
+                    ],
+                    output_format={"type": "json_schema", "schema": BATCH_DECISION_SCHEMA},
+                )
+                tracing.record_llm_usage(attrs, response)
+            stats.record(response)
+
+            by_index = {}
+            for action_data in json.loads(response.content[0].text)["decisions"]:
+                i = action_data["fact_index"]
+                if 0 <= i < len(facts) and i not in by_index:
+                    by_index[i] = Decision(
+                        fact=facts[i],
+                        action=action_data["action"],
+                        reasoning=action_data["reasoning"],
+                        target_uuid=action_data.get("target_uuid"),
+                        updated_content=action_data.get("updated_content"),
+                        candidates=candidates,
+                    )
+
+            missing = [i for i in range(len(facts)) if i not in by_index]
+            fallbacks = await asyncio.gather(*(decide(llm, facts[i], similar_per_fact[i], stats) for i in missing))
+            by_index.update(zip(missing, fallbacks))
+
+        return [by_index[i] for i in range(len(facts))]
+
+
+CONSOLIDATION_STRATEGIES = {
+    "per-fact": ConsolidationEngine,
+    "batched": BatchedConsolidationEngine,
+}
+
+
+def make_engine(strategy: str = "per-fact", max_concurrency: int = 4, memory_cache=None) -> ConsolidationEngine:
+    return CONSOLIDATION_STRATEGIES[strategy](max_concurrency=max_concurrency, memory_cache=memory_cache)
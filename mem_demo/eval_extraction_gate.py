@@ -0,0 +1,77 @@
+import json
+import os
+import typer
+
+from extraction_gate import should_extract
+from transcript import load_turns
+
+REFERENCE_PATH = "./extraction_reference.json"
+
+app = typer.Typer()
+
+
+def load_reference(path: str) -> dict[str, list[str]]:
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {}
+
+
+@app.command()
+def main(
+    scripts: list[str] = typer.Argument(None, help="script_example.md-style transcripts"),
+    threshold: float = typer.Option(1.5, help="Gate score needed to run extraction"),
+    reference: str = typer.Option(REFERENCE_PATH, help="Cache of the LLM extractor's facts per turn"),
+    offline: bool = typer.Option(False, help="Only use cached reference facts; turns without one are left out"),
+):
+    """Compare the extraction gate with the LLM extractor: skip rate versus missed facts"""
+    scripts = scripts or ["script_example.md"]
+    facts_by_turn = load_reference(reference)
+
+    turns = [turn for script in scripts for turn in load_turns(script)]
+    missing = [turn for turn in turns if turn not in facts_by_turn]
+    if missing and not offline:
+        # The extractor is the reference: whatever it pulls out of a turn is what the gate must not lose.
+        # Each turn is judged on its own, without prior memories or an assistant reply.
+        from basic import extract_facts
+
+        for i, turn in enumerate(missing, 1):
+            print(f"Extracting reference facts {i}/{len(missing)}")
+            facts_by_turn[turn] = extract_facts(turn, "", "None")
+        with open(reference, "w") as f:
+            json.dump(facts_by_turn, f, indent=2)
+    turns = [turn for turn in turns if turn in facts_by_turn]
+    if not turns:
+        print("No turns with reference facts")
+        raise typer.Exit(1)
+
+    skipped = missed_turns = missed_facts = total_facts = wasted_calls = 0
+    misses = []
+    for turn in turns:
+        decision = should_extract(turn, threshold)
+        facts = facts_by_turn[turn]
+        total_facts += len(facts)
+        if decision.extract:
+            wasted_calls += not facts
+            continue
+        skipped += 1
+        if facts:
+            missed_turns += 1
+            missed_facts += len(facts)
+            misses.append((turn, decision, facts))
+
+    turns_with_facts = sum(bool(facts_by_turn[turn]) for turn in turns)
+    print(f"\nTurns:               {len(turns)} ({turns_with_facts} with facts)")
+    print(f"Skipped:             {skipped} ({skipped / len(turns):.0%} of extraction calls saved)")
+    print(f"Missed turns:        {missed_turns}/{turns_with_facts}")
+    print(f"Missed facts:        {missed_facts}/{total_facts} ({missed_facts / max(total_facts, 1):.0%})")
+    print(f"Calls with no facts: {wasted_calls} (gate let through, extractor found nothing)")
+
+    for turn, decision, facts in misses:
+        print(f"\nMissed (score {decision.score:.1f}, {decision.reason}): {turn}")
+        for fact in facts:
+            print(f"  - {fact}")
+
+
+if __name__ == "__main__":
+    app()
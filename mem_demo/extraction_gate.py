@@ -0,0 +1,77 @@
+import re
+from dataclasses import dataclass
+
+# A turn that is only one of these has nothing to remember
+GREETING_RE = re.compile(
+    r"^(hi|hello|hey|hiya|yo|thanks|thank you|thx|cheers|ok|okay|cool|great|nice|awesome|"
+    r"got it|sounds good|bye|goodbye|see you|good (morning|afternoon|evening|night))"
+    r"( there| so much| a lot)?[\s!.,:)]*$",
+    re.IGNORECASE,
+)
+
+FIRST_PERSON_RE = re.compile(r"\b(i|i'm|im|i've|ive|i'd|i'll|my|me|mine|myself|we|we're|we've|our|us)\b", re.IGNORECASE)
+
+# Verbs and phrases that usually carry a preference, personal fact or plan
+SIGNAL_RE = re.compile(
+    r"\b(like|love|enjoy|hate|dislike|prefer|favou?rite|want|wish|hope|plan|planning|going to|gonna|"
+    r"will|decided|started|stopped|quit|moved|moving|live|living|work|working|job|study|studying|"
+    r"allergic|vegetarian|vegan|married|kids|children|wife|husband|partner|born|age|years old|"
+    r"training|race|schedule|goal|budget|sick of|tired of|now|currently|next|since|used to)\b",
+    re.IGNORECASE,
+)
+
+# First person inside a generic ask ("how do I", "can I") is about the task, not the user
+GENERIC_ASK_RE = re.compile(
+    r"^(how (do|can|should|would) (i|we)|can (i|we)|should (i|we)|could (i|we)|what('s| is| are)|"
+    r"why|when|where|who|which|is it|are there|do you|can you|could you|would you|please)\b",
+    re.IGNORECASE,
+)
+
+# Weights of the features below; a turn is sent to extraction when the score reaches the threshold
+WEIGHTS = {
+    "first_person_statement": 2.0,
+    "signal_word": 1.5,
+    "first_person_question": 0.5,
+    "long_message": 0.5,
+}
+
+
+@dataclass
+class GateDecision:
+    extract: bool
+    score: float
+    reason: str
+
+
+def split_sentences(text: str) -> list[str]:
+    return [s.strip() for s in re.split(r"(?<=[.!?])\s+|\n+", text) if s.strip()]
+
+
+def should_extract(user_message: str, threshold: float = 1.5) -> GateDecision:
+    """Cheap local check for whether a turn may contain new personal facts, preferences or plans.
+
+    Deliberately lenient: a false "extract" only costs an LLM call, a false "skip" loses a memory.
+    """
+    message = user_message.strip()
+    if not message:
+        return GateDecision(False, 0.0, "empty")
+    if GREETING_RE.match(message):
+        return GateDecision(False, 0.0, "greeting")
+
+    features = set()
+    for sentence in split_sentences(message):
+        has_first_person = bool(FIRST_PERSON_RE.search(sentence))
+        is_question = sentence.endswith("?") or bool(GENERIC_ASK_RE.match(sentence))
+        if has_first_person and not is_question:
+            features.add("first_person_statement")
+        elif has_first_person:
+            features.add("first_person_question")
+        if SIGNAL_RE.search(sentence) and (has_first_person or not is_question):
+            features.add("signal_word")
+    if len(message.split()) > 25:
+        features.add("long_message")
+
+    score = sum((WEIGHTS[f] for f in features), 0.0)
+    if score >= threshold:
+        return GateDecision(True, score, ", ".join(sorted(features)))
+    return GateDecision(False, score, ", ".join(sorted(features)) or "no personal statements")
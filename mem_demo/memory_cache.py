@@ -0,0 +1,202 @@
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+
+from weaviate.classes.query import Filter, MetadataQuery
+from weaviate.collections import Collection
+
+
+def tokenize(text: str) -> list[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def cosine(a: list[float], b: list[float]) -> float:
+    if len(a) != len(b):
+        raise ValueError(f"Vectors of different lengths ({len(a)} and {len(b)}) come from different embedding models")
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def _normalize(scores: dict[str, float]) -> dict[str, float]:
+    """Min-max scale to [0, 1], like Weaviate's relativeScoreFusion"""
+    if not scores:
+        return {}
+    low, high = min(scores.values()), max(scores.values())
+    if high == low:
+        return {key: 1.0 for key in scores}
+    return {key: (score - low) / (high - low) for key, score in scores.items()}
+
+
+@dataclass
+class CachedMemory:
+    uuid: str
+    content: str
+    vector: list[float] | None
+    creation_time: datetime | None = None
+    last_update_time: datetime | None = None
+
+
+class TenantMemories:
+    """Every valid memory of one tenant, searchable locally"""
+
+    def __init__(self, memories: list[CachedMemory]):
+        self.memories = {m.uuid: m for m in memories}
+
+    def __len__(self) -> int:
+        return len(self.memories)
+
+    def _bm25(self, query: str, k1: float = 1.2, b: float = 0.75) -> dict[str, float]:
+        docs = {uuid: tokenize(m.content) for uuid, m in self.memories.items()}
+        avg_len = sum(len(tokens) for tokens in docs.values()) / len(docs)
+        doc_freq = Counter(term for tokens in docs.values() for term in set(tokens))
+
+        scores = {}
+        for uuid, tokens in docs.items():
+            counts = Counter(tokens)
+            score = 0.0
+            for term in set(tokenize(query)):
+                if term not in counts:
+                    continue
+                idf = math.log(1 + (len(docs) - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+                tf = counts[term]
+                score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(tokens) / avg_len))
+            if score > 0:
+                scores[uuid] = score
+        return scores
+
+    def hybrid(self, query: str, query_vector: list[float] | None, limit: int, alpha: float = 0.7) -> list[CachedMemory]:
+        """Keyword + vector search with relative score fusion; keyword only without a query vector"""
+        if not self.memories:
+            return []
+
+        keyword = _normalize(self._bm25(query))
+        if query_vector is None:
+            combined = keyword
+        else:
+            vector = _normalize({
+                uuid: cosine(query_vector, m.vector)
+                for uuid, m in self.memories.items() if m.vector is not None
+            })
+            combined = {
+                uuid: alpha * vector.get(uuid, 0.0) + (1 - alpha) * keyword.get(uuid, 0.0)
+                for uuid in vector.keys() | keyword.keys()
+            }
+
+        ranked = sorted(combined, key=combined.get, reverse=True)[:limit]
+        return [self.memories[uuid] for uuid in ranked]
+
+
+class MemoryCache:
+    """In-process, write-through cache of each tenant's valid memories.
+
+    A tenant is loaded once (at login) with vectors and timestamps. Searches for
+    tenants with at most `local_search_limit` memories are served locally; larger
+    tenants, and tenants that were never loaded, go to Weaviate as before. Loaded
+    tenants are evicted least-recently-used beyond `max_tenants`.
+    """
+
+    def __init__(self, query_embedder=None, max_tenants: int = 100, local_search_limit: int = 500):
+        self.query_embedder = query_embedder
+        self.max_tenants = max_tenants
+        self.local_search_limit = local_search_limit
+        self._tenants: OrderedDict[str, TenantMemories] = OrderedDict()
+        self._lock = threading.RLock()
+
+        self.local_searches = 0
+        self.remote_searches = 0
+
+    def load(self, user_memories: Collection) -> bool:
+        """Load a tenant's valid memories. Returns False if it is too big to serve locally."""
+        memories = []
+        for obj in user_memories.iterator(
+            include_vector=True,
+            return_metadata=MetadataQuery(creation_time=True, last_update_time=True),
+        ):
+            if obj.properties.get("invalidation_time") is not None:
+                continue
+            memories.append(CachedMemory(
+                uuid=str(obj.uuid),
+                content=obj.properties["content"],
+                vector=obj.vector.get("default"),
+                creation_time=obj.metadata.creation_time,
+                last_update_time=obj.metadata.last_update_time,
+            ))
+            if len(memories) > self.local_search_limit:
+                return False
+
+        with self._lock:
+            self._tenants[user_memories.tenant] = TenantMemories(memories)
+            self._tenants.move_to_end(user_memories.tenant)
+            while len(self._tenants) > self.max_tenants:
+                self._tenants.popitem(last=False)
+        return True
+
+    def _get(self, tenant: str) -> TenantMemories | None:
+        tenant_memories = self._tenants.get(tenant)
+        if tenant_memories is not None:
+            self._tenants.move_to_end(tenant)
+        return tenant_memories
+
+    def search(self, user_memories: Collection, query: str, limit: int) -> list[dict]:
+        """Valid memories most similar to `query`, as dicts with `content` and `uuid`"""
+        with self._lock:
+            tenant_memories = self._get(user_memories.tenant)
+            local = tenant_memories is not None and len(tenant_memories) <= self.local_search_limit
+
+        if local:
+            query_vector = self.query_embedder.embed([query])[0] if self.query_embedder else None
+            with self._lock:
+                self.local_searches += 1
+                return [
+                    {"content": m.content, "uuid": m.uuid}
+                    for m in tenant_memories.hybrid(query, query_vector, limit)
+                ]
+
+        self.remote_searches += 1
+        response = user_memories.query.hybrid(
+            query=query,
+            limit=limit,
+            filters=Filter.by_property("invalidation_time").is_none(True),
+        )
+        return [{**m.properties, "uuid": str(m.uuid)} for m in response.objects]
+
+    def _vector(self, user_memories: Collection, uuid: str, vector: list[float] | None) -> list[float] | None:
+        if vector is not None:
+            return vector
+        # Weaviate vectorized it; read the vector back so local search can use it
+        obj = user_memories.query.fetch_object_by_id(uuid, include_vector=True)
+        return obj.vector.get("default") if obj else None
+
+    def _is_loaded(self, user_memories: Collection) -> bool:
+        with self._lock:
+            return user_memories.tenant in self._tenants
+
+    def added(self, user_memories: Collection, uuid, content: str, vector: list[float] | None = None):
+        if not self._is_loaded(user_memories):
+            return
+        vector = self._vector(user_memories, uuid, vector)
+        with self._lock:
+            tenant_memories = self._get(user_memories.tenant)
+            if tenant_memories is not None:
+                tenant_memories.memories[str(uuid)] = CachedMemory(uuid=str(uuid), content=content, vector=vector)
+
+    def updated(self, user_memories: Collection, uuid, content: str, vector: list[float] | None = None):
+        if not self._is_loaded(user_memories):
+            return
+        vector = self._vector(user_memories, uuid, vector)
+        with self._lock:
+            tenant_memories = self._get(user_memories.tenant)
+            memory = tenant_memories.memories.get(str(uuid)) if tenant_memories is not None else None
+            if memory is not None:
+                memory.content = content
+                memory.vector = vector
+
+    def invalidated(self, user_memories: Collection, uuid):
+        with self._lock:
+            tenant_memories = self._get(user_memories.tenant)
+            if tenant_memories is not None:
+                tenant_memories.memories.pop(str(uuid), None)
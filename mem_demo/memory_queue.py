@@ -0,0 +1,143 @@
+import contextvars
+import sys
+import threading
+import traceback
+from collections import deque
+from queue import Queue
+
+
+# Set while a memory job runs; also seen by threads it starts through asyncio.to_thread
+_in_memory_job = contextvars.ContextVar("in_memory_job", default=False)
+
+
+class HeldOutput:
+    """Stand-in for sys.stdout that holds what memory jobs print until `release()`.
+
+    Background writes would otherwise land in the middle of the chat prompt.
+    Everything else is written straight through.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._held = []
+        self._lock = threading.Lock()
+
+    def write(self, text: str) -> int:
+        if _in_memory_job.get():
+            with self._lock:
+                self._held.append(text)
+            return len(text)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def release(self):
+        with self._lock:
+            held, self._held = self._held, []
+        if held:
+            self.stream.write("".join(held))
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class MemoryWriteQueue:
+    """Background memory writes, kept in order per tenant.
+
+    `submit()` returns immediately. Worker threads pick up tenants with pending
+    work; a tenant is only ever handled by one worker at a time, so its turns are
+    processed in the order they were submitted, while different tenants proceed
+    in parallel.
+
+    With `hold_output`, what jobs print is held back and shown by `release_output()`,
+    e.g. just before the next prompt.
+    """
+
+    def __init__(self, process, workers: int = 2, hold_output: bool = True):
+        self.process = process
+        self._output = None
+        if hold_output:
+            self._output = HeldOutput(sys.stdout)
+            sys.stdout = self._output
+        self._pending: dict[str, deque] = {}
+        self._scheduled = set()  # tenants queued or being processed
+        self._ready = Queue()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._workers = [
+            threading.Thread(target=self._run, name=f"memory-writer-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, user_id: str, *args):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Memory write queue is closed")
+            self._pending.setdefault(user_id, deque()).append(args)
+            if user_id not in self._scheduled:
+                self._scheduled.add(user_id)
+                self._ready.put(user_id)
+
+    def _run(self):
+        while True:
+            user_id = self._ready.get()
+            if user_id is None:
+                return
+
+            with self._cond:
+                args = self._pending[user_id][0]
+
+            token = _in_memory_job.set(True)
+            try:
+                self.process(user_id, *args)
+            except Exception:
+                print(f"\n  ✗ Memory write failed for {user_id}:\n{traceback.format_exc()}")
+            finally:
+                _in_memory_job.reset(token)
+
+            with self._cond:
+                self._pending[user_id].popleft()
+                if self._pending[user_id]:
+                    # Back of the line, so one busy tenant can't starve the others
+                    self._ready.put(user_id)
+                else:
+                    del self._pending[user_id]
+                    self._scheduled.discard(user_id)
+                self._cond.notify_all()
+
+    def release_output(self):
+        """Print what jobs have printed since the last call"""
+        if self._output is not None:
+            self._output.release()
+
+    def pending(self, user_id: str | None = None) -> int:
+        with self._cond:
+            if user_id is not None:
+                return len(self._pending.get(user_id, ()))
+            return sum(len(jobs) for jobs in self._pending.values())
+
+    def wait_drained(self, user_id: str | None = None, timeout: float | None = None) -> bool:
+        """Block until `user_id`'s (or everyone's) queued writes are done. Returns False on timeout."""
+        with self._cond:
+            if user_id is not None:
+                return self._cond.wait_for(lambda: user_id not in self._pending, timeout)
+            return self._cond.wait_for(lambda: not self._pending, timeout)
+
+    def close(self, timeout: float | None = None) -> bool:
+        """Stop accepting work, finish what is queued and stop the workers."""
+        with self._cond:
+            self._closed = True
+        drained = self.wait_drained(timeout=timeout)
+        for _ in self._workers:
+            self._ready.put(None)
+        for worker in self._workers:
+            worker.join(timeout)
+        if self._output is not None:
+            self._output.release()
+            sys.stdout = self._output.stream
+            self._output = None
+        return drained
@@ -0,0 +1,10 @@
+# embedding_cache and tracing live in ../better_context and are shared with the docs pipeline.
+# Import this module before them: it puts that directory on sys.path, once, for every entry point.
+import os
+import sys
+
+BETTER_CONTEXT_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "better_context"))
+
+if BETTER_CONTEXT_DIR not in sys.path:
+    # Appended, so modules of this project always win over same-named ones there
+    sys.path.append(BETTER_CONTEXT_DIR)
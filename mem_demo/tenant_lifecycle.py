@@ -0,0 +1,252 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+import typer
+from weaviate.classes.tenants import Tenant, TenantActivityStatus
+from weaviate.collections import Collection
+from weaviate.exceptions import WeaviateBaseError
+
+ACTIVITY_PATH = "./tenant_activity.json"
+
+COLD_STATUSES = {
+    "inactive": TenantActivityStatus.INACTIVE,
+    "offloaded": TenantActivityStatus.OFFLOADED,
+}
+
+
+# How Weaviate words errors for queries against a tenant that isn't ACTIVE
+NOT_ACTIVE_ERRORS = ("not active", "inactive", "offloaded", "frozen")
+
+
+def status_name(status) -> str:
+    return getattr(status, "value", str(status))
+
+
+def is_not_active_error(error: Exception) -> bool:
+    return isinstance(error, WeaviateBaseError) and any(text in str(error).lower() for text in NOT_ACTIVE_ERRORS)
+
+
+class TenantActivityManager:
+    """Keeps only recently used tenants of the Memory collection resident.
+
+    Last-access times are tracked per tenant and persisted to `path`, which every chat
+    process and the `sweep` command share: reads and saves merge it, keeping the latest
+    time per tenant. A background sweeper moves ACTIVE tenants idle for longer than
+    `idle_timeout` seconds to `cold_status` (INACTIVE frees memory; OFFLOADED also moves
+    the data to cloud storage and needs the offload module). `activate()` brings a tenant
+    back before it is queried, and `run()` also recovers when another process made it
+    cold after that.
+    """
+
+    def __init__(
+        self,
+        memory_collection: Collection,
+        idle_timeout: float = 1800,
+        cold_status: str = "inactive",
+        sweep_interval: float = 60,
+        path: str = ACTIVITY_PATH,
+        is_busy=lambda user_id: False,
+    ):
+        self.memory_collection = memory_collection
+        self.idle_timeout = idle_timeout
+        self.cold_status = COLD_STATUSES[cold_status]
+        self.sweep_interval = sweep_interval
+        self.path = path
+        # Tenants with work still queued for them are never made cold
+        self.is_busy = is_busy
+
+        self.last_access: dict[str, float] = self._read()
+        self._active = set()  # tenants this process activated or saw active, so touch() needs no lookup
+        self._deactivating = set()  # tenants a sweep is making cold right now
+        self._lock = threading.Lock()
+        self._deactivated = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._sweeper: threading.Thread | None = None
+
+        self.activations = 0
+        self.deactivations = 0
+
+    def _read(self) -> dict[str, float]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            return {}
+
+    def _merge_saved(self):
+        """Take in accesses other processes have saved since we last looked"""
+        saved = self._read()
+        with self._lock:
+            for name, last_access in saved.items():
+                self.last_access[name] = max(last_access, self.last_access.get(name, 0.0))
+
+    def touch(self, user_id: str):
+        with self._lock:
+            self.last_access[user_id] = time.time()
+
+    def activate(self, user_id: str, timeout: float = 300):
+        """Make sure a tenant is ACTIVE before it is read or written, waiting while it onloads"""
+        self.touch(user_id)
+        # Saved straight away, so sweeps in other processes (and compaction) see the tenant in use
+        self.save()
+        with self._lock:
+            # A sweep may be making this tenant cold right now; let it finish, then bring it back
+            self._deactivated.wait_for(lambda: user_id not in self._deactivating)
+            if user_id in self._active:
+                return
+
+        tenant = self.memory_collection.tenants.get_by_name(user_id)
+        if tenant is not None and tenant.activity_status != TenantActivityStatus.ACTIVE:
+            print(f"Activating {user_id} ({status_name(tenant.activity_status)})...")
+            self.memory_collection.tenants.update(
+                tenants=[Tenant(name=user_id, activity_status=TenantActivityStatus.ACTIVE)]
+            )
+            self.activations += 1
+
+            # Offloaded tenants go through ONLOADING first
+            deadline = time.monotonic() + timeout
+            while tenant.activity_status != TenantActivityStatus.ACTIVE:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Tenant {user_id} did not become active within {timeout}s")
+                time.sleep(1)
+                tenant = self.memory_collection.tenants.get_by_name(user_id)
+
+        with self._lock:
+            self._active.add(user_id)
+
+    def run(self, user_id: str, query):
+        """Call `query()` on an ACTIVE tenant.
+
+        `_active` only knows what this process did, so another process (or the `sweep`
+        command) may have made the tenant cold since. Then the tenant is reactivated and
+        `query()` is retried once.
+        """
+        self.activate(user_id)
+        try:
+            return query()
+        except Exception as e:
+            if not is_not_active_error(e):
+                raise
+        with self._lock:
+            self._active.discard(user_id)
+        self.activate(user_id)
+        return query()
+
+    def sweep(self) -> list[str]:
+        """Move idle ACTIVE tenants to the cold status. Returns the tenants moved."""
+        # Network call and file read outside the lock, so touch() and activate() aren't held up by them
+        tenants = self.memory_collection.tenants.get()
+        self._merge_saved()
+        now = time.time()
+        idle = []
+        with self._lock:
+            for name, tenant in tenants.items():
+                if tenant.activity_status != TenantActivityStatus.ACTIVE:
+                    self._active.discard(name)
+                    continue
+                # Tenants never seen before start their idle clock now
+                last_access = self.last_access.setdefault(name, now)
+                if now - last_access >= self.idle_timeout and not self.is_busy(name):
+                    idle.append(name)
+            # Decided under the lock: from here on activate() waits for the update instead of
+            # trusting _active, so a tenant it is about to use can't be made cold under it
+            self._active.difference_update(idle)
+            self._deactivating.update(idle)
+
+        if idle:
+            try:
+                self.memory_collection.tenants.update(
+                    tenants=[Tenant(name=name, activity_status=self.cold_status) for name in idle]
+                )
+            finally:
+                with self._lock:
+                    self._deactivating.difference_update(idle)
+                    self._deactivated.notify_all()
+            with self._lock:
+                self.deactivations += len(idle)
+        self.save()
+        return idle
+
+    def resident_counts(self) -> dict[str, int]:
+        """Tenants per activity status; ACTIVE ones are the ones using node memory"""
+        counts = Counter(status_name(t.activity_status) for t in self.memory_collection.tenants.get().values())
+        return dict(counts)
+
+    def report(self) -> str:
+        counts = self.resident_counts()
+        total = sum(counts.values())
+        active = counts.get(status_name(TenantActivityStatus.ACTIVE), 0)
+        by_status = ", ".join(f"{status}={n}" for status, n in sorted(counts.items()))
+        return (
+            f"{active}/{total} tenants resident ({by_status}); "
+            f"activated {self.activations}, made {status_name(self.cold_status)} {self.deactivations} this session"
+        )
+
+    def save(self):
+        # Other processes save to the same file; keep their later accesses
+        self._merge_saved()
+        with self._lock:
+            data = dict(self.last_access)
+        # Per writer, as several processes and threads save
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                idle = self.sweep()
+                if idle:
+                    print(f"\n  Tenants made {status_name(self.cold_status)}: {', '.join(idle)}")
+            except Exception as e:
+                print(f"\n  ✗ Tenant sweep failed: {e}")
+
+    def start(self):
+        self._sweeper = threading.Thread(target=self._run, name="tenant-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._sweeper is not None:
+            self._sweeper.join()
+        self.save()
+
+
+app = typer.Typer()
+
+
+@app.command()
+def sweep(
+    idle_minutes: float = typer.Option(30, help="Make tenants cold after this many minutes without access"),
+    cold_status: str = typer.Option("inactive", help=f"One of: {', '.join(COLD_STATUSES)}"),
+):
+    """One sweep over all tenants, e.g. from cron, using the access times recorded by basic.py"""
+    from basic import connect_to_weaviate, get_or_create_collection
+
+    with connect_to_weaviate() as db_client:
+        manager = TenantActivityManager(
+            get_or_create_collection(db_client), idle_timeout=idle_minutes * 60, cold_status=cold_status
+        )
+        idle = manager.sweep()
+        print(f"Made {len(idle)} tenants {cold_status}")
+        print(manager.report())
+
+
+@app.command()
+def status():
+    """Resident tenant counts, for sizing nodes by concurrent rather than registered users"""
+    from basic import connect_to_weaviate, get_or_create_collection
+
+    with connect_to_weaviate() as db_client:
+        manager = TenantActivityManager(get_or_create_collection(db_client))
+        print(manager.report())
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,7 @@
+# Transcript loading with no Anthropic or Weaviate imports, so offline tools can use it on their own
+
+
+def load_turns(path: str) -> list[str]:
+    """User turns from a script_example.md-style transcript: every non-heading paragraph is one turn"""
+    with open(path, "r") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]